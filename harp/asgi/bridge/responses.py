@@ -3,6 +3,7 @@ from typing import TYPE_CHECKING
 from asgiref.typing import ASGISendCallable
 from multidict import CIMultiDictProxy
 
+from harp.http import HttpStreamingResponse
 from harp.utils.bytes import ensure_bytes
 
 if TYPE_CHECKING:
@@ -10,14 +11,23 @@ if TYPE_CHECKING:
 
 
 class HttpResponseAsgiBridge:  # todo protocol HttpResponseBridge
-    """Implements the ability of sending our HttpResponse object over the asgi protocol. This is still early impl. and
-    it will need to support streaming responses in the future."""
+    """Implements the ability of sending our HttpResponse object over the asgi protocol. Streaming responses (see
+    :class:`HttpStreamingResponse <harp.http.HttpStreamingResponse>`) are sent chunk by chunk, using `more_body`."""
 
     def __init__(self, response: "HttpResponse", send: ASGISendCallable):
         self.response = response
         self.asgi_send = send
 
     async def send(self):
+        try:
+            await self._send()
+        finally:
+            # if the response was not sent entirely (client went away, ...), the stream is not exhausted and must be
+            # released explicitely.
+            if isinstance(self.response, HttpStreamingResponse):
+                await self.response.aclose()
+
+    async def _send(self):
         # set the headers as read only
         self.response._headers = CIMultiDictProxy(self.response._headers)
 
@@ -33,6 +43,9 @@ class HttpResponseAsgiBridge:  # todo protocol HttpResponseBridge
             }
         )
 
+        if isinstance(self.response, HttpStreamingResponse):
+            return await self.send_stream()
+
         # send the body
         await self.asgi_send(
             {
@@ -40,3 +53,8 @@ class HttpResponseAsgiBridge:  # todo protocol HttpResponseBridge
                 "body": ensure_bytes(self.response.body),
             }
         )
+
+    async def send_stream(self):
+        async for chunk in self.response.stream():
+            await self.asgi_send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await self.asgi_send({"type": "http.response.body", "body": b"", "more_body": False})
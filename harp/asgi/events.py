@@ -56,6 +56,18 @@ class ResponseEvent(RequestEvent):
 EVENT_CORE_RESPONSE = ResponseEvent.name
 
 
+class TerminateEvent(ResponseEvent):
+    """
+    The terminate event is dispatched once the response has been sent to the client, which makes it the right place
+    for any work that should not delay the response.
+    """
+
+    name = "core.terminate"
+
+
+EVENT_CORE_TERMINATE = TerminateEvent.name
+
+
 class ControllerViewEvent(RequestEvent):
     """
     The view event allows to transform controller return values into response objects.
@@ -86,6 +98,10 @@ class TransactionEvent(Event):
 
 
 class MessageEvent(TransactionEvent):
-    def __init__(self, transaction: Transaction, message: BaseMessage):
+    def __init__(self, transaction: Transaction, message: BaseMessage, *, max_body_size: Optional[int] = None):
         super().__init__(transaction)
         self.message = message
+
+        #: Maximum size of the message body that should be captured by listeners (storage, ...), or None if the whole
+        #: body should be captured. Zero means the body should not be captured at all.
+        self.max_body_size = max_body_size
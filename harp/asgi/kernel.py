@@ -7,7 +7,7 @@ from whistle import AsyncEventDispatcher, Event, IAsyncEventDispatcher
 
 from harp import get_logger
 from harp.controllers import DefaultControllerResolver
-from harp.http import AlreadyHandledHttpResponse, HttpRequest, HttpResponse
+from harp.http import AlreadyHandledHttpResponse, HttpRequest, HttpResponse, HttpStreamingResponse
 
 from .bridge.requests import HttpRequestAsgiBridge
 from .bridge.responses import HttpResponseAsgiBridge
@@ -17,10 +17,12 @@ from .events import (
     EVENT_CORE_REQUEST,
     EVENT_CORE_RESPONSE,
     EVENT_CORE_STARTED,
+    EVENT_CORE_TERMINATE,
     ControllerEvent,
     ControllerViewEvent,
     RequestEvent,
     ResponseEvent,
+    TerminateEvent,
 )
 
 logger = get_logger(__name__)
@@ -41,10 +43,15 @@ class ASGIKernel:
         asgi_type = scope.get("type", None)
 
         if asgi_type == "http":
-            response = await self.handle_http(scope, receive, send)
-            if isinstance(response, AlreadyHandledHttpResponse):
-                return
-            return await HttpResponseAsgiBridge(response, send).send()
+            request = HttpRequest(HttpRequestAsgiBridge(scope, receive))
+            response = await self.handle_http(request, send)
+            try:
+                if not isinstance(response, AlreadyHandledHttpResponse):
+                    await HttpResponseAsgiBridge(response, send).send()
+            finally:
+                # even if sending failed (upstream stream error, client gone ...), so that the transaction is finished
+                await self.terminate_http(request, response)
+            return
 
         if asgi_type == "lifespan":
             await receive()
@@ -125,13 +132,17 @@ class ASGIKernel:
             )
 
         # the core response event may want to filter the response, for example to add some headers, etc.
-        await self.dispatcher.adispatch(EVENT_CORE_RESPONSE, ResponseEvent(request, response))
+        try:
+            await self.dispatcher.adispatch(EVENT_CORE_RESPONSE, ResponseEvent(request, response))
+        except BaseException:
+            # the response will not be sent, its stream (an upstream connection, ...) must be released.
+            if isinstance(response, HttpStreamingResponse):
+                await response.aclose()
+            raise
 
         return response
 
-    async def handle_http(self, scope: Scope, receive: ASGIReceiveCallable, send: ASGISendCallable):
-        request = HttpRequest(HttpRequestAsgiBridge(scope, receive))
-
+    async def handle_http(self, request: HttpRequest, send: ASGISendCallable):
         if not self.started:
             return HttpResponse(
                 "Unhandled server error: Cannot access service provider, the lifespan.startup asgi event "
@@ -158,6 +169,16 @@ class ASGIKernel:
                 )
             return HttpResponse("Internal Server Error", status=500, content_type="text/plain")
 
+    async def terminate_http(self, request: HttpRequest, response: HttpResponse):
+        """Dispatches the terminate event, once the response has been sent. The client already got its response, so
+        errors cannot be reported to it anymore, and are only logged."""
+        try:
+            await self.dispatcher.adispatch(EVENT_CORE_TERMINATE, TerminateEvent(request, response))
+        except Exception:
+            if not self.handle_errors:
+                raise
+            logger.exception()
+
     async def do_handle_http(self, request: HttpRequest, send: ASGISendCallable):
         event = RequestEvent(request)
         await self.dispatcher.adispatch(EVENT_CORE_REQUEST, event)
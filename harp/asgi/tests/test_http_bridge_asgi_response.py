@@ -0,0 +1,61 @@
+from unittest.mock import AsyncMock
+
+import pytest
+
+from harp.asgi.bridge.responses import HttpResponseAsgiBridge
+from harp.http import HttpResponse, HttpStreamingResponse
+
+
+async def _aiter(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+class TestHttpResponseAsgiBridge:
+    async def test_send(self):
+        send = AsyncMock()
+        await HttpResponseAsgiBridge(HttpResponse("Hello.", content_type="text/plain"), send).send()
+
+        assert [call.args[0] for call in send.call_args_list] == [
+            {"type": "http.response.start", "status": 200, "headers": ((b"content-type", b"text/plain"),)},
+            {"type": "http.response.body", "body": b"Hello."},
+        ]
+
+    async def test_send_streaming(self):
+        send = AsyncMock()
+        response = HttpStreamingResponse(_aiter(b"foo", b"bar"), content_type="text/event-stream")
+        await HttpResponseAsgiBridge(response, send).send()
+
+        assert [call.args[0] for call in send.call_args_list] == [
+            {"type": "http.response.start", "status": 200, "headers": ((b"content-type", b"text/event-stream"),)},
+            {"type": "http.response.body", "body": b"foo", "more_body": True},
+            {"type": "http.response.body", "body": b"bar", "more_body": True},
+            {"type": "http.response.body", "body": b"", "more_body": False},
+        ]
+        assert response.body == b"foobar"
+
+    async def test_send_streaming_client_gone(self):
+        send = AsyncMock(side_effect=[None, None, OSError("client disconnected")])
+        close = AsyncMock()
+        response = HttpStreamingResponse(_aiter(b"foo", b"bar", b"baz"), close=close)
+
+        with pytest.raises(OSError):
+            await HttpResponseAsgiBridge(response, send).send()
+
+        # upstream is released, and whatever went through is available
+        close.assert_awaited_once()
+        await response.join()
+        assert response.body == b"foobar"
+
+    async def test_send_streaming_start_fails(self):
+        send = AsyncMock(side_effect=OSError("client disconnected"))
+        close = AsyncMock()
+        response = HttpStreamingResponse(_aiter(b"foo"), close=close)
+
+        with pytest.raises(OSError):
+            await HttpResponseAsgiBridge(response, send).send()
+
+        # the stream was never started, but upstream is released anyway
+        close.assert_awaited_once()
+        await response.join()
+        assert response.body == b""
@@ -72,12 +72,13 @@ if IS_DEVELOPMENT_ENVIRONMENT:
     entrypoint.add_command(install_dev)
 
 if check_packages("alembic"):
-    from harp.commandline.migrations import create_migration, feature, history, migrate, reset
+    from harp.commandline.migrations import create_migration, feature, history, migrate, recompress, reset
 
     entrypoint.add_command(migrate)
     entrypoint.add_command(feature)
     entrypoint.add_command(history)
     entrypoint.add_command(reset)
+    entrypoint.add_command(recompress)
 
     if IS_DEVELOPMENT_ENVIRONMENT:
         entrypoint.add_command(create_migration)
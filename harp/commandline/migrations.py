@@ -7,6 +7,7 @@ from alembic import command
 from click import BaseCommand
 from pyheck import upper_camel
 from sqlalchemy.ext.asyncio import create_async_engine
+from whistle import AsyncEventDispatcher
 
 from harp import get_logger
 from harp.commandline.options.server import add_harp_server_click_options
@@ -94,6 +95,30 @@ def history(**kwargs):
 history = cast(BaseCommand, history)
 
 
+@click.command("db:recompress")
+@add_harp_server_click_options
+@click.option("--batch-size", type=int, default=500, help="Number of blobs compressed per database transaction.")
+def recompress(*, batch_size, **kwargs):
+    """Compresses existing blobs, using the configured blob compression (storage.blobs.compression)."""
+    from harp_apps.sqlalchemy_storage.compression import recompress_blobs
+    from harp_apps.sqlalchemy_storage.settings import SqlAlchemyStorageSettings
+    from harp_apps.sqlalchemy_storage.storage import SqlAlchemyStorage
+
+    config = create_harp_config_with_sqlalchemy_storage_from_command_line_options(kwargs)
+    storage = SqlAlchemyStorage(AsyncEventDispatcher(), SqlAlchemyStorageSettings(**config.settings.get("storage", {})))
+
+    async def _recompress():
+        try:
+            return await recompress_blobs(storage, batch_size=batch_size)
+        finally:
+            await storage.finalize()
+
+    logger.info(f"🛢 [db:recompress] {asyncio.run(_recompress())} blobs compressed.")
+
+
+recompress = cast(BaseCommand, recompress)
+
+
 @click.command("db:reset")
 @add_harp_server_click_options
 def reset(**kwargs):
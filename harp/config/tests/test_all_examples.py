@@ -25,6 +25,7 @@ def test_documentation_examples_list():
         "docs/apps/dashboard/examples/main.yml",
         "docs/apps/http_client/examples/full.yml",
         "docs/apps/http_client/examples/simple.yml",
+        "docs/apps/janitor/examples/retention.yml",
         "docs/apps/proxy/examples/swapi.yml",
     ]
 
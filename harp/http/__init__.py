@@ -1,6 +1,6 @@
 from .errors import HttpError
 from .requests import HttpRequest
-from .responses import AlreadyHandledHttpResponse, HttpResponse, JsonHttpResponse
+from .responses import AlreadyHandledHttpResponse, HttpResponse, HttpStreamingResponse, JsonHttpResponse
 from .serializers import HttpRequestSerializer, get_serializer_for
 from .typing import BaseHttpMessage, BaseMessage, HttpRequestBridge, HttpResponseBridge
 
@@ -16,6 +16,7 @@ __all__ = [
     "HttpRequestSerializer",
     "HttpResponse",
     "HttpResponseBridge",
+    "HttpStreamingResponse",
     "JsonHttpResponse",
     "get_serializer_for",
 ]
@@ -1,7 +1,7 @@
 import binascii
 from base64 import b64decode
 from functools import cached_property
-from typing import TYPE_CHECKING, MutableMapping, cast
+from typing import TYPE_CHECKING, AsyncIterator, MutableMapping, Optional, cast
 
 from multidict import CIMultiDict, CIMultiDictProxy, MultiDictProxy
 
@@ -19,6 +19,9 @@ class HttpRequest(BaseHttpMessage):
         self._impl = impl
         self._body = []
         self._closed = False
+        self._max_body_size = None
+        self._captured_size = 0
+        self._size = 0
 
     @cached_property
     def server_ipaddr(self) -> str:
@@ -85,14 +88,54 @@ class HttpRequest(BaseHttpMessage):
             raise RuntimeError("Request body has not been read yet, please await `read()` first.")
         return b"".join(self._body)
 
+    @property
+    def body_size(self) -> int:
+        """Returns the total size of the body read so far (which may be larger than `body`, if it was truncated while
+        streamed, see `stream()`)."""
+        return self._size
+
+    async def stream(self, *, max_body_size: Optional[int] = None) -> AsyncIterator[bytes]:
+        """Iterate over the request body chunks, as they are received from the implementation bridge. Chunks are kept
+        along the way (tee), so that the complete body is available using `body` once the stream is exhausted. Chunks
+        that were already read (by `join()` or a previous, maybe partial, iteration) are yielded first.
+
+        If `max_body_size` is given, only a prefix of this size is kept (all chunks are still yielded, and the limit
+        also applies to the chunks read later by `join()`), which bounds the memory used by large bodies. A truncated
+        body cannot be streamed again."""
+        if max_body_size is not None:
+            self._max_body_size = max_body_size
+
+        if self._size > self._captured_size:
+            raise RuntimeError("Request body was truncated while streamed, it cannot be streamed again.")
+
+        for chunk in list(self._body):
+            yield chunk
+
+        async for chunk in self._read():
+            yield chunk
+
     async def join(self):
-        """Read all chunks from request. We may want to be able to read partial body later, but for now it's all or
-        nothing. This method does nothing if the body has already been read."""
+        """Read all chunks from request. This method does nothing if the body has already been read, and reads the
+        remaining chunks if it has only been partially streamed."""
+        async for _ in self._read():
+            pass
+
+    async def _read(self) -> AsyncIterator[bytes]:
         if not self._closed:
             async for chunk in self._impl.stream():
-                self._body.append(chunk)
+                self._size += len(chunk)
+                self._capture(chunk)
+                yield chunk
             self._closed = True
 
+    def _capture(self, chunk: bytes):
+        if self._max_body_size is not None:
+            chunk = chunk[: max(self._max_body_size - self._captured_size, 0)]
+            if not chunk:
+                return
+        self._captured_size += len(chunk)
+        self._body.append(chunk)
+
 
 class WrappedHttpRequest(HttpRequest):
     def __init__(self, wrapped: HttpRequest, /):
@@ -111,5 +154,19 @@ class WrappedHttpRequest(HttpRequest):
     def headers(self) -> MutableMapping:
         return MultiChainMap(self._headers, cast(MutableMapping, self._wrapped.headers))
 
+    @property
+    def body(self) -> bytes:
+        return self._wrapped.body
+
+    @property
+    def body_size(self) -> int:
+        return self._wrapped.body_size
+
+    def stream(self, *, max_body_size: Optional[int] = None) -> AsyncIterator[bytes]:
+        return self._wrapped.stream(max_body_size=max_body_size)
+
+    async def join(self):
+        await self._wrapped.join()
+
     def __getattr__(self, item):
         return getattr(self._wrapped, item)
@@ -1,3 +1,6 @@
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable
+
 import orjson
 from multidict import CIMultiDict
 
@@ -36,6 +39,93 @@ class HttpResponse(BaseHttpMessage):
         return self._headers.get("content-type", "text/plain")
 
 
+class HttpStreamingResponse(HttpResponse):
+    """
+    Response whose body is produced by an asynchronous iterator, and sent chunk by chunk over the wire. Chunks are kept
+    along the way (tee), so that the complete body is available using `body` once the stream is exhausted, which means
+    anything interested in the body (storage, ...) can wait for it using `join()` while the response is being sent.
+
+    If `max_body_size` is given, only a prefix of this size is kept (the whole stream is still sent), which bounds the
+    memory used by long or endless streams. The total size that went through is available using `body_size`.
+
+    The stream can only be consumed once, by whatever sends the response (see
+    :class:`HttpResponseAsgiBridge <harp.asgi.bridge.responses.HttpResponseAsgiBridge>`).
+
+    """
+
+    def __init__(
+        self,
+        stream: AsyncIterator[bytes],
+        /,
+        *,
+        status: int = 200,
+        headers: dict = None,
+        content_type=None,
+        close: Callable[[], Awaitable] = None,
+        max_body_size: int = None,
+    ):
+        super().__init__(b"", status=status, headers=headers, content_type=content_type)
+
+        self._stream = stream
+        self._close = close
+        self._chunks = []
+        self._streamed = asyncio.Event()
+        self._max_body_size = max_body_size
+        self._captured_size = 0
+        self._size = 0
+
+    @property
+    def body(self) -> bytes:
+        """Returns the body (or its prefix, if `max_body_size` was given) that went through the stream. Raises a
+        RuntimeError if the stream is not exhausted yet, you must await `join()` first."""
+        if not self._streamed.is_set():
+            raise RuntimeError("Response body has not been streamed yet, please await `join()` first.")
+        return b"".join(self._chunks)
+
+    @property
+    def body_size(self) -> int:
+        """Returns the total size of the body that went through the stream so far."""
+        return self._size
+
+    async def stream(self) -> AsyncIterator[bytes]:
+        """Iterate over the response body chunks, keeping a copy of each. Can only be called once."""
+        if self._streamed.is_set():
+            raise RuntimeError("Response body has already been streamed.")
+
+        try:
+            async for chunk in self._stream:
+                if chunk:
+                    self._size += len(chunk)
+                    self._capture(chunk)
+                    yield chunk
+        finally:
+            await self.aclose()
+
+    def _capture(self, chunk: bytes):
+        if self._max_body_size is not None:
+            chunk = chunk[: max(self._max_body_size - self._captured_size, 0)]
+            if not chunk:
+                return
+        self._captured_size += len(chunk)
+        self._chunks.append(chunk)
+
+    async def aclose(self):
+        """Release the underlying stream (for example if the client went away before the end of it), and mark the
+        body as complete, with whatever went through."""
+        if self._streamed.is_set():
+            return
+
+        try:
+            if self._close:
+                await self._close()
+        finally:
+            self._streamed.set()
+
+    async def join(self):
+        """Wait for the stream to be exhausted (or closed)."""
+        await self._streamed.wait()
+
+
 class JsonHttpResponse(HttpResponse):
     def __init__(self, body: dict, /, *, status: int = 200, headers: dict = None):
         super().__init__(orjson.dumps(body), status=status, headers=headers, content_type="application/json")
@@ -30,6 +30,11 @@ class BaseHttpMessageSerializer(MessageSerializer):
     def body(self) -> bytes:
         return self.wrapped.body
 
+    @cached_property
+    def body_size(self) -> int:
+        """Size of the body that went through, which may be larger than `body` if only a prefix of it was kept."""
+        return getattr(self.wrapped, "body_size", None) or len(self.body)
+
 
 class HttpRequestSerializer(BaseHttpMessageSerializer):
     """
@@ -27,7 +27,7 @@ class HttpRequestStubBridge(HttpRequestBridge):
         if isinstance(body, bytes):
             self._body = [body]
         elif isinstance(body, list):
-            self._body = body
+            self._body = list(body)
         else:
             self._body = []
         self._closed = False
@@ -59,7 +59,8 @@ class HttpRequestStubBridge(HttpRequestBridge):
         if self._closed:
             raise RuntimeError("Request body has already been read.")
 
-        for chunk in self._body:
-            yield chunk
+        # chunks are consumed, like they would be from a real transport
+        while self._body:
+            yield self._body.pop(0)
 
         self._closed = True
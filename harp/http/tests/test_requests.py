@@ -187,3 +187,42 @@ class TestHttpRequestBody(BaseHttpRequestTest):
         await request.join()
         await request.join()
         assert request.body == b"foobarbaz"
+
+    async def test_body_streamed(self):
+        request = self.create_request(body=[b"foo", b"bar", b"baz"])
+        assert [chunk async for chunk in request.stream()] == [b"foo", b"bar", b"baz"]
+        assert request.body == b"foobarbaz"
+
+    async def test_body_streamed_more_than_once(self):
+        request = self.create_request(body=[b"foo", b"bar", b"baz"])
+        await request.join()
+        assert [chunk async for chunk in request.stream()] == [b"foo", b"bar", b"baz"]
+        assert request.body == b"foobarbaz"
+
+    async def test_body_partially_streamed_then_joined(self):
+        request = self.create_request(body=[b"foo", b"bar", b"baz"])
+        async for chunk in request.stream():
+            assert chunk == b"foo"
+            break
+
+        with pytest.raises(RuntimeError):
+            assert request.body
+
+        await request.join()
+        assert request.body == b"foobarbaz"
+
+    async def test_body_streamed_with_max_body_size(self):
+        request = self.create_request(body=[b"foo", b"bar", b"baz"])
+        async for chunk in request.stream(max_body_size=4):
+            if chunk == b"bar":
+                break
+
+        # the limit also applies to the remaining chunks
+        await request.join()
+        assert request.body == b"foob"
+        assert request.body_size == 9
+
+        # only a prefix was kept, it cannot be streamed again
+        with pytest.raises(RuntimeError):
+            async for _ in request.stream():
+                pass
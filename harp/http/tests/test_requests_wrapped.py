@@ -81,3 +81,17 @@ class TestWrappedHttpRequest(BaseHttpRequestTest):
         wrapped.headers["host"] = "example.com"
         assert wrapped.headers.pop("host") == "example.com"
         assert "host" not in wrapped.headers
+
+
+class TestWrappedHttpRequestBody(BaseHttpRequestTest):
+    async def test_join(self):
+        request = WrappedHttpRequest(self.create_request(body=[b"foo", b"bar"]))
+        await request.join()
+        assert request.body == b"foobar"
+        assert request._wrapped.body == b"foobar"
+
+    async def test_stream(self):
+        request = WrappedHttpRequest(self.create_request(body=[b"foo", b"bar"]))
+        assert [chunk async for chunk in request.stream()] == [b"foo", b"bar"]
+        assert request.body == b"foobar"
+        assert request._wrapped.body == b"foobar"
@@ -0,0 +1,68 @@
+import asyncio
+from unittest.mock import AsyncMock
+
+import pytest
+
+from harp.http import HttpResponse, HttpStreamingResponse
+
+
+async def _aiter(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+class TestHttpResponse:
+    def test_body(self):
+        response = HttpResponse("Hello.", status=201, content_type="text/html")
+        assert response.body == b"Hello."
+        assert response.status == 201
+        assert response.content_type == "text/html"
+
+
+class TestHttpStreamingResponse:
+    async def test_stream(self):
+        response = HttpStreamingResponse(_aiter(b"foo", b"", b"bar"))
+        with pytest.raises(RuntimeError):
+            response.body
+
+        assert [chunk async for chunk in response.stream()] == [b"foo", b"bar"]
+        assert response.body == b"foobar"
+
+    async def test_stream_only_once(self):
+        response = HttpStreamingResponse(_aiter(b"foo"))
+        assert [chunk async for chunk in response.stream()] == [b"foo"]
+
+        with pytest.raises(RuntimeError):
+            async for _ in response.stream():
+                pass
+
+    async def test_join_waits_for_stream(self):
+        response = HttpStreamingResponse(_aiter(b"foo", b"bar"))
+        join = asyncio.create_task(response.join())
+        await asyncio.sleep(0)
+        assert not join.done()
+
+        async for _ in response.stream():
+            pass
+
+        await asyncio.wait_for(join, 1)
+        assert response.body == b"foobar"
+
+    async def test_stream_bounded_capture(self):
+        response = HttpStreamingResponse(_aiter(b"foo", b"bar", b"baz"), max_body_size=4)
+
+        assert [chunk async for chunk in response.stream()] == [b"foo", b"bar", b"baz"]
+        assert response.body == b"foob"
+        assert response.body_size == 9
+
+    async def test_close_before_end(self):
+        close = AsyncMock()
+        response = HttpStreamingResponse(_aiter(b"foo", b"bar"), close=close)
+
+        async for _ in response.stream():
+            break
+        await response.aclose()
+
+        close.assert_awaited_once()
+        await asyncio.wait_for(response.join(), 1)
+        assert response.body == b"foo"
@@ -13,3 +13,7 @@ class MessageSerializer(Protocol):
     @property
     def body(self) -> bytes:
         return ...
+
+    @property
+    def body_size(self) -> int:
+        return ...
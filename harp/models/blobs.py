@@ -15,20 +15,41 @@ class Blob(Entity):
     data: bytes
     content_type: str = None
 
+    #: Size of the source data, only set if the blob only contains a truncated prefix of it.
+    original_size: int = None
+
     @classmethod
-    def from_data(cls, data, /, *, content_type=None):
+    def from_data(cls, data, /, *, content_type=None, max_size=None, original_size=None):
+        """Creates a blob from source data. If `max_size` is given, only the `max_size` first bytes are kept. If the
+        data was already truncated before, `original_size` is the size of the source data. Truncated blobs record
+        the original size, which is also part of the hash, so they cannot be mistaken for complete ones."""
         content_type = ensure_str(content_type) if content_type else None
         if content_type and ";" in content_type:
             # xxx hack, we should parse the rest of the content type
             content_type = content_type.split(";", 1)[0].strip()
 
         data = ensure_bytes(data)
+        original_size = max(original_size or 0, len(data))
+        if max_size is not None and len(data) > max_size:
+            data = data[:max_size]
+
+        key = (content_type.encode("utf-8") if content_type else b"") + b"\n"
+        if original_size > len(data):
+            key += str(original_size).encode("utf-8") + b"\n"
+        else:
+            original_size = None
+
         return cls(
-            id=hashlib.sha1((content_type.encode("utf-8") if content_type else b"") + b"\n" + data).hexdigest(),
+            id=hashlib.sha1(key + data).hexdigest(),
             data=data,
             content_type=content_type,
+            original_size=original_size,
         )
 
+    @property
+    def truncated(self) -> bool:
+        return self.original_size is not None
+
     def __len__(self):
         return len(self.data)
 
@@ -41,7 +62,8 @@ class Blob(Entity):
                 data = orjson.loads(self.data)
             except orjson.JSONDecodeError:
                 try:
-                    data = json.loads(self.data)
+                    # data may be a buffer (memory mapped by external blob backends), that only orjson accepts
+                    data = json.loads(self.data if isinstance(self.data, (bytes, str)) else bytes(self.data))
                 except json.JSONDecodeError as exc:
                     raise ValueError("Could not decode json data.") from exc
             try:
@@ -3,9 +3,10 @@ from unittest.mock import AsyncMock
 import pytest
 
 from harp.asgi.bridge.requests import HttpRequestAsgiBridge
+from harp.asgi.events import EVENT_CORE_RESPONSE, EVENT_CORE_TERMINATE, TerminateEvent
 from harp.asgi.kernel import ASGIKernel
 from harp.controllers import DefaultControllerResolver
-from harp.http import HttpRequest, HttpResponse
+from harp.http import HttpRequest, HttpResponse, HttpStreamingResponse
 from harp.http.tests.stubs import HttpRequestStubBridge
 
 
@@ -49,3 +50,82 @@ class TestAsgiKernel:
         assert response.status == 200
         assert response.body == b"Hello, world!"
         assert response.headers == {"content-type": "text/plain"}
+
+    async def test_terminate_event_after_response_sent(self):
+        sent = []
+
+        async def send(message):
+            sent.append(message["type"])
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        kernel = ASGIKernel(resolver=DefaultControllerResolver(default_controller=mock_controller))
+        kernel.started = True
+
+        terminated = []
+
+        async def on_terminate(event: TerminateEvent):
+            terminated.append((event.response.status, list(sent)))
+
+        kernel.dispatcher.add_listener(EVENT_CORE_TERMINATE, on_terminate)
+
+        await kernel(
+            {"type": "http", "method": "GET", "path": "/", "query_string": b"", "headers": []},
+            receive,
+            send,
+        )
+
+        assert terminated == [(200, ["http.response.start", "http.response.body"])]
+
+    async def test_streaming_response_closed_on_response_event_error(self):
+        close = AsyncMock()
+
+        async def chunks():
+            yield b"foo"
+
+        async def controller(request):
+            return HttpStreamingResponse(chunks(), close=close)
+
+        async def on_response(event):
+            raise ValueError("nope")
+
+        kernel = ASGIKernel(resolver=DefaultControllerResolver(default_controller=controller))
+        kernel.started = True
+        kernel.dispatcher.add_listener(EVENT_CORE_RESPONSE, on_response)
+
+        response = await kernel.handle_http(HttpRequest(HttpRequestStubBridge()), AsyncMock())
+
+        # the error response replaces the streaming one, that must not leak its stream
+        assert response.status == 500
+        close.assert_awaited_once()
+
+    async def test_terminate_event_when_sending_fails(self):
+        async def chunks():
+            yield b"foo"
+            raise OSError("Upstream connection lost.")
+
+        async def controller(request):
+            return HttpStreamingResponse(chunks())
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        kernel = ASGIKernel(resolver=DefaultControllerResolver(default_controller=controller))
+        kernel.started = True
+
+        terminated = []
+
+        async def on_terminate(event: TerminateEvent):
+            terminated.append(event.response.status)
+
+        kernel.dispatcher.add_listener(EVENT_CORE_TERMINATE, on_terminate)
+
+        with pytest.raises(OSError):
+            await kernel(
+                {"type": "http", "method": "GET", "path": "/", "query_string": b"", "headers": []},
+                receive,
+                AsyncMock(),
+            )
+
+        assert terminated == [200]
@@ -9,6 +9,25 @@ class TransactionsGroupedByTimeBucket(TypedDict):
     meanDuration: float
 
 
+class LatencyPercentiles(TypedDict):
+    datetime: Optional[datetime]
+    count: int
+    p50: Optional[float]
+    p95: Optional[float]
+    p99: Optional[float]
+
+
+class LatencyPercentilesByTimeBucket(TypedDict):
+    overall: LatencyPercentiles
+    data: List[LatencyPercentiles]
+
+
+class FacetCount(TypedDict):
+    datetime: datetime
+    value: Optional[str]
+    count: int
+
+
 class Storage(Protocol):
     async def get_transaction_list(
         self,
@@ -19,8 +38,14 @@ class Storage(Protocol):
         page: int = 1,
         cursor: str = "",
         text_search: str = "",
+        after: str = "",
+        before: str = "",
+        total: str = "exact",
     ):
-        """Find transactions, using optional filters, for example to be displayed in the dashboard."""
+        """Find transactions, using optional filters, for example to be displayed in the dashboard. Results are
+        paginated either by page number, or using the opaque `after` / `before` cursors returned in the results meta
+        (``next`` and ``prev``). The `total` mode ("exact", "capped", "estimated" or "none") tells how the total
+        number of results is computed, the kind of total actually returned is in the ``total_kind`` meta."""
         ...
 
     async def get_transaction(
@@ -43,6 +68,11 @@ class Storage(Protocol):
         """Retrieve a facet's metadata, by name."""
         ...
 
+    async def get_facet_counts(self, name: str, *, since: datetime, username: Optional[str] = None) -> List[FacetCount]:
+        """Retrieve transaction counts by facet value and by hour, for transactions started since the given datetime.
+        Flag counts are specific to a user."""
+        ...
+
     async def transactions_grouped_by_time_bucket(
         self,
         *,
@@ -51,6 +81,17 @@ class Storage(Protocol):
         start_datetime: Optional[datetime],
     ) -> List[TransactionsGroupedByTimeBucket]: ...
 
+    async def latency_percentiles_by_time_bucket(
+        self,
+        *,
+        endpoint=None,
+        time_bucket: Optional[str],
+        start_datetime: Optional[datetime],
+    ) -> LatencyPercentilesByTimeBucket:
+        """Latency (elapsed time, in milliseconds) percentiles of finished transactions, by time bucket (data) and for
+        the whole period (overall)."""
+        ...
+
     async def set_user_flag(self, *, transaction_id: str, username: str, flag: int, value=True):
         """Sets or unsets a user flag on a transaction."""
         ...
@@ -1,4 +1,4 @@
-from collections import ChainMap
+from collections import ChainMap, OrderedDict
 
 from multidict import CIMultiDict
 
@@ -60,3 +60,33 @@ class MultiChainMap(ChainMap):
 
     def popitem(self):
         raise NotImplementedError()
+
+
+class LRUCache(OrderedDict):
+    """
+    A dict that holds at most `maxsize` items, and evicts the least recently used ones when it's full. Reads (using
+    either `cache[key]` or `cache.get(key)`) and writes mark the item as recently used. Membership tests do not.
+
+    """
+
+    def __init__(self, maxsize=1024, /):
+        super().__init__()
+        self.maxsize = maxsize
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        self.move_to_end(key)
+        return value
+
+    def __setitem__(self, key, value):
+        if key in self:
+            self.move_to_end(key)
+        super().__setitem__(key, value)
+        while len(self) > self.maxsize:
+            self.popitem(last=False)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
@@ -1,7 +1,7 @@
 import pytest
 from multidict import MultiDict
 
-from harp.utils.collections import MultiChainMap
+from harp.utils.collections import LRUCache, MultiChainMap
 
 
 class TestMultiChainMap:
@@ -82,3 +82,27 @@ class TestMultiChainMap:
 
         # "b" source was not touched
         assert "b" in c.maps[1]
+
+
+class TestLRUCache:
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(2)
+        cache["a"] = 1
+        cache["b"] = 2
+        assert cache["a"] == 1
+
+        cache["c"] = 3
+        assert list(cache) == ["a", "c"]
+
+        assert cache.get("c") == 3
+        cache["d"] = 4
+        assert list(cache) == ["c", "d"]
+        assert cache.get("a") is None
+
+    def test_overwrite(self):
+        cache = LRUCache(2)
+        cache["a"] = 1
+        cache["b"] = 2
+        cache["a"] = 3
+        cache["c"] = 4
+        assert dict(cache) == {"a": 3, "c": 4}
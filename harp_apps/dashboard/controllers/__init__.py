@@ -5,6 +5,7 @@ from asgi_middleware_static_file import ASGIMiddlewareStaticFile
 from asgiref.typing import ASGISendCallable
 from http_router import NotFoundError
 from httpx import AsyncClient
+from whistle import IAsyncEventDispatcher
 
 from harp import ROOT_DIR, get_logger
 from harp.controllers import RoutingController
@@ -13,8 +14,11 @@ from harp.http import AlreadyHandledHttpResponse, HttpRequest, HttpResponse
 from harp.typing.global_settings import GlobalSettings
 from harp.typing.storage import Storage
 from harp_apps.proxy.controllers import HttpProxyController
+from harp_apps.proxy.events import EVENT_TRANSACTION_ENDED, EVENT_TRANSACTION_STARTED
 
+from ..filters import FacetCounters
 from ..settings import DashboardAuthBasicSetting, DashboardSettings
+from ..utils.cache import ResponseCache
 from .blobs import BlobsController
 from .overview import OverviewController
 from .system import SystemController
@@ -48,6 +52,7 @@ class DashboardController:
         all_settings: GlobalSettings,
         local_settings: DashboardSettings,
         http_client: AsyncClient,
+        dispatcher: IAsyncEventDispatcher,
     ):
         # context for usage in handlers
         self.http_client = http_client
@@ -55,6 +60,15 @@ class DashboardController:
         self.global_settings = all_settings
         self.settings = local_settings
 
+        # aggregates are cached for a short time, and marked stale when transactions end
+        self.cache = ResponseCache()
+        dispatcher.add_listener(EVENT_TRANSACTION_ENDED, self.cache.on_transaction_ended)
+
+        # transaction list filters show counts over the last 24 hours, maintained from transaction events
+        self.facet_counters = FacetCounters(storage=self.storage)
+        dispatcher.add_listener(EVENT_TRANSACTION_STARTED, self.facet_counters.on_transaction_started)
+        dispatcher.add_listener(EVENT_TRANSACTION_ENDED, self.facet_counters.on_transaction_ended)
+
         # create users if they don't exist
         if isinstance(self.settings.auth, DashboardAuthBasicSetting):
             asyncio.create_task(self.storage.create_users_once_ready(self.settings.auth.users))
@@ -101,8 +115,8 @@ class DashboardController:
         self.children = [
             BlobsController(storage=self.storage, router=root.router),
             SystemController(storage=self.storage, settings=self.global_settings, router=root.router),
-            TransactionsController(storage=self.storage, router=root.router),
-            OverviewController(storage=self.storage, router=root.router),
+            TransactionsController(storage=self.storage, counters=self.facet_counters, router=root.router),
+            OverviewController(storage=self.storage, cache=self.cache, router=root.router),
         ]
 
         return root
@@ -1,7 +1,15 @@
 from harp.controllers import GetHandler, RouterPrefix, RoutingController
-from harp.http import HttpResponse
+from harp.http import HttpResponse, HttpStreamingResponse
 from harp.typing.storage import Storage
 
+#: Size of the chunks used to send blobs that are not loaded in memory.
+CHUNK_SIZE = 64 * 1024
+
+
+async def _iter_chunks(data: memoryview):
+    for offset in range(0, len(data), CHUNK_SIZE):
+        yield bytes(data[offset : offset + CHUNK_SIZE])
+
 
 @RouterPrefix("/api/blobs")
 class BlobsController(RoutingController):
@@ -22,4 +30,16 @@ class BlobsController(RoutingController):
         except (ValueError, NotImplementedError):
             data = blob.data
 
-        return HttpResponse(data, content_type=content_type)
+        # truncated blobs only contain a prefix of the original data, let the client know about the real size.
+        headers = {"x-harp-original-size": str(blob.original_size)} if blob.truncated else {}
+
+        # memory mapped data (from external blob backends) is sent chunk by chunk, without loading it all in memory.
+        if isinstance(data, memoryview):
+            return HttpStreamingResponse(
+                _iter_chunks(data),
+                content_type=content_type,
+                headers={**headers, "content-length": str(len(data))},
+                max_body_size=0,
+            )
+
+        return HttpResponse(data, content_type=content_type, headers=headers)
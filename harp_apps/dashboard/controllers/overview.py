@@ -8,6 +8,7 @@ from harp.typing.storage import Storage
 from harp.views import json
 from harp_apps.sqlalchemy_storage.constants import TimeBucket
 
+from ..utils.cache import ResponseCache
 from ..utils.dates import generate_continuous_time_range, get_start_datetime_from_range
 
 time_bucket_for_range = {
@@ -49,14 +50,39 @@ def _format_aggregate(items, count, key, *, default=None):
     }
 
 
+def _round(value, ndigits=2):
+    return round(value, ndigits) if value is not None else None
+
+
+def _format_latency_percentiles(latency, datetimes):
+    """Formats latency percentiles, with one data point per datetime (None where there is no data)."""
+    by_datetime = {t["datetime"]: t for t in latency["data"]}
+    return {
+        **{key: _round(latency["overall"][key]) for key in ("p50", "p95", "p99")},
+        "data": [
+            {"datetime": dt, **{key: _round(by_datetime.get(dt, {}).get(key)) for key in ("p50", "p95", "p99")}}
+            for dt in datetimes
+        ],
+    }
+
+
 @RouterPrefix("/api/overview")
 class OverviewController(RoutingController):
-    def __init__(self, *, storage: Storage, handle_errors=True, router=None):
+    def __init__(self, *, storage: Storage, cache: ResponseCache = None, handle_errors=True, router=None):
         self.storage = storage
+        self.cache = cache
         super().__init__(handle_errors=handle_errors, router=router)
 
+    async def _get_or_compute(self, key, compute):
+        if self.cache is None:
+            return await compute()
+        return await self.cache.get_or_compute(key, compute)
+
     @GetHandler("/summary")
     async def get_summary_data(self, request: HttpRequest):
+        return await self._get_or_compute(("summary",), self._compute_summary_data)
+
+    async def _compute_summary_data(self):
         time_span = "24h"
         time_bucket = time_bucket_for_range[time_span]
         now = datetime.now(UTC)
@@ -104,6 +130,12 @@ class OverviewController(RoutingController):
 
         # time buckets and start_datetime accordingly
         time_bucket = time_bucket_for_range.get(range, "day")
+        return await self._get_or_compute(
+            ("overview", endpoint, range, time_bucket),
+            lambda: self._compute_overview_data(endpoint, range, time_bucket),
+        )
+
+    async def _compute_overview_data(self, endpoint, range, time_bucket):
         start_datetime = get_start_datetime_from_range(range)
 
         transactions_by_date_list = await self.storage.transactions_grouped_by_time_bucket(
@@ -120,6 +152,9 @@ class OverviewController(RoutingController):
         transactions_by_date_list = generate_continuous_time_range(
             discontinuous_transactions=transactions_by_date_list, time_bucket=time_bucket, start_datetime=start_datetime
         )
+        latency = await self.storage.latency_percentiles_by_time_bucket(
+            endpoint=endpoint, start_datetime=start_datetime, time_bucket=time_bucket
+        )
 
         try:
             mean_tpdex = mean(filter(None, [t["meanTpdex"] for t in transactions_by_date_list]))
@@ -133,6 +168,7 @@ class OverviewController(RoutingController):
                 "count": transactions_count,
                 "meanDuration": mean_duration,
                 "meanTpdex": mean_tpdex,
+                "latency": _format_latency_percentiles(latency, [t["datetime"] for t in transactions_by_date_list]),
                 "timeRange": range,
             }
         )
@@ -10,24 +10,33 @@ from harp.views.json import json
 from harp_apps.sqlalchemy_storage.models.flags import FLAGS_BY_NAME
 
 from ..filters import (
+    FacetCounters,
     TransactionEndpointFacet,
     TransactionFlagFacet,
     TransactionMethodFacet,
     TransactionStatusFacet,
     TransactionTpdexFacet,
 )
+from ..filters.base import AbstractChoicesFacet
 
 logger = get_logger(__name__)
 
+#: Kind of total computed for transaction lists, unless asked otherwise ("exact", "capped", "estimated" or "none").
+#: Exact totals require to count all matching rows, which gets slow on large databases, the dashboard frontend asks
+#: for capped totals.
+DEFAULT_TOTAL = "exact"
+
 
 @RouterPrefix("/api/transactions")
 class TransactionsController(RoutingController):
-    def __init__(self, *, storage: Storage, handle_errors=True, router=None):
+    def __init__(self, *, storage: Storage, counters: FacetCounters = None, handle_errors=True, router=None):
         self.storage = storage
+        # without events to update counters, counts will be the ones seeded from storage
+        self.counters = counters or FacetCounters(storage=storage)
         self.facets = {
             facet.name: facet
             for facet in (
-                TransactionEndpointFacet(storage=self.storage),
+                TransactionEndpointFacet(),
                 TransactionMethodFacet(),
                 TransactionStatusFacet(),
                 TransactionFlagFacet(),
@@ -39,7 +48,16 @@ class TransactionsController(RoutingController):
 
     @GetHandler("/filters")
     async def filters(self, request: HttpRequest):
-        await self.facets["endpoint"].refresh()
+        username = request.context.get("user") or "anonymous"
+        counts = {
+            name: await self.counters.get_counts(name, username=username)
+            for name, facet in self.facets.items()
+            if isinstance(facet, AbstractChoicesFacet)
+        }
+
+        # no await from here, as facets are shared between requests (and flag counts are specific to a user)
+        for name, facet_counts in counts.items():
+            self.facets[name].set_counts(facet_counts)
 
         return json(
             {name: facet.filter_from_query(request.query) for name, facet in self.facets.items()},
@@ -53,21 +71,31 @@ class TransactionsController(RoutingController):
 
         cursor = str(request.query.get("cursor", ""))
 
-        results = await self.storage.get_transaction_list(
-            with_messages=True,
-            filters={name: facet.get_filter_from_query(request.query) for name, facet in self.facets.items()},
-            page=page,
-            cursor=cursor,
-            username=request.context.get("user") or "anonymous",
-            text_search=request.query.get("search", ""),
-        )
+        try:
+            results = await self.storage.get_transaction_list(
+                with_messages=True,
+                filters={name: facet.get_filter_from_query(request.query) for name, facet in self.facets.items()},
+                page=page,
+                cursor=cursor,
+                username=request.context.get("user") or "anonymous",
+                text_search=request.query.get("search", ""),
+                after=str(request.query.get("after", "")),
+                before=str(request.query.get("before", "")),
+                total=str(request.query.get("total", DEFAULT_TOTAL)),
+            )
+        except ValueError as exc:
+            return JsonHttpResponse({"error": str(exc)}, status=400)
 
+        total = results.meta.get("total", 0)
         return json(
             {
                 "items": list(map(Transaction.to_dict, results.items)),
-                "pages": math.ceil(results.meta.get("total", 0) / PAGE_SIZE),
-                "total": results.meta.get("total", 0),
+                "pages": math.ceil(total / PAGE_SIZE) if total is not None else None,
+                "total": total,
+                "totalKind": results.meta.get("total_kind", "exact"),
                 "perPage": PAGE_SIZE,
+                "next": results.meta.get("next"),
+                "prev": results.meta.get("prev"),
             }
         )
 
@@ -91,5 +119,6 @@ class TransactionsController(RoutingController):
         await self.storage.set_user_flag(
             transaction_id=id, username=username, flag=flag_id, value=False if request.method == "DELETE" else True
         )
+        self.counters.forget_flags(username)
 
         return JsonHttpResponse({"success": True})
@@ -1,3 +1,4 @@
+from .counters import FacetCounters, WindowedCounter
 from .transaction_endpoint import TransactionEndpointFacet
 from .transaction_flag import TransactionFlagFacet
 from .transaction_method import TransactionMethodFacet
@@ -6,6 +7,8 @@ from .transaction_tpdex import TransactionTpdexFacet
 from .utils import flatten_facet_value
 
 __all__ = [
+    "FacetCounters",
+    "WindowedCounter",
     "TransactionMethodFacet",
     "TransactionStatusFacet",
     "TransactionEndpointFacet",
@@ -37,6 +37,10 @@ class AbstractChoicesFacet(AbstractFacet):
     def values(self):
         return [{"name": choice, "count": self.meta.get(choice, {}).get("count", None)} for choice in self.choices]
 
+    def set_counts(self, counts: dict):
+        """Sets the number of transactions for each choice (choices without count have none)."""
+        self.meta = {choice: {"count": counts.get(choice, 0)} for choice in self.choices}
+
     def get_filter(self, raw_data: list):
         query_endpoints = set(self.choices).intersection(raw_data)
         return list(query_endpoints) if len(query_endpoints) else None
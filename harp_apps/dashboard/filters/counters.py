@@ -0,0 +1,144 @@
+import asyncio
+from collections import Counter
+from datetime import UTC, datetime, timedelta
+from typing import Optional
+
+from harp import get_logger
+from harp.asgi.events import TransactionEvent
+from harp.typing.storage import Storage
+
+logger = get_logger(__name__)
+
+#: Default window for facet counts.
+DEFAULT_WINDOW = timedelta(hours=24)
+
+#: Counts are kept by slot of this duration (seeded counts are grouped by hour in storage).
+SLOT = timedelta(hours=1)
+
+#: Facets counted from transaction events (flags are set from the dashboard, and counted by user).
+EVENT_FACETS = ("endpoint", "method", "status")
+
+
+def _as_utc(value: datetime) -> datetime:
+    # naive datetimes are UTC
+    return value if value.tzinfo else value.replace(tzinfo=UTC)
+
+
+class WindowedCounter:
+    """
+    Counts values over a sliding time window. Counts are kept by time slot, and the running total is updated as slots
+    are added or leave the window, so reading counts does not depend on the number of counted items. The window is
+    rounded to whole slots (the current slot is always included).
+    """
+
+    def __init__(self, *, window: timedelta = DEFAULT_WINDOW, slot: timedelta = SLOT):
+        self._slot = slot.total_seconds()
+        self._size = int(window / slot)
+        self._slots: dict[int, Counter] = {}
+        self._total = Counter()
+
+    def _get_slot(self, at: datetime) -> int:
+        return int(_as_utc(at).timestamp() // self._slot)
+
+    def _expire(self, now: datetime):
+        oldest = self._get_slot(now) - self._size
+        for index in [index for index in self._slots if index < oldest]:
+            self._total.subtract(self._slots.pop(index))
+
+    def add(self, value, *, at: datetime, count=1):
+        index = self._get_slot(at)
+        if index < self._get_slot(datetime.now(UTC)) - self._size:
+            return
+        self._slots.setdefault(index, Counter())[value] += count
+        self._total[value] += count
+
+    def counts(self, *, now: Optional[datetime] = None) -> dict:
+        self._expire(now or datetime.now(UTC))
+        return {value: count for value, count in self._total.items() if count > 0}
+
+
+class FacetCounters:
+    """
+    Transaction counts by facet value (endpoint, method, status and flags) over a sliding window, for the transaction
+    list filters.
+
+    Counts are seeded from storage the first time they are needed, then updated from transaction events, without
+    reading the transactions table again. Transactions are counted from their start (and status from their end), only
+    if they started after seeding, as older ones are counted by the seeding queries. Flags are set from the dashboard,
+    so flag counts are seeded for each user, and seeded again when the user changes a flag.
+
+    """
+
+    def __init__(self, *, storage: Storage, window: timedelta = DEFAULT_WINDOW):
+        self.storage = storage
+        self.window = window
+
+        self.counters = {name: WindowedCounter(window=window) for name in EVENT_FACETS}
+        self.flag_counters: dict[str, WindowedCounter] = {}
+
+        self.seeded_at: Optional[datetime] = None
+        self._seeding: Optional[asyncio.Task] = None
+
+    async def seed(self):
+        """Seeds the counts from storage, once (or again on next call, if seeding failed)."""
+        if self._seeding is None:
+            self._seeding = asyncio.ensure_future(self._seed())
+        seeding = self._seeding
+        try:
+            await asyncio.shield(seeding)
+        except Exception:
+            if self._seeding is seeding:
+                self._seeding = None
+            raise
+
+    async def _seed(self):
+        seeded_at = datetime.now(UTC)
+        # counters are only replaced once all of them are seeded, a failure leaves them as they were
+        counters = {name: WindowedCounter(window=self.window) for name in EVENT_FACETS}
+        for name in EVENT_FACETS:
+            for row in await self.storage.get_facet_counts(name, since=self._get_since(seeded_at)):
+                counters[name].add(row["value"], at=row["datetime"], count=row["count"])
+        self.counters = counters
+        # transactions started from now on are counted from events
+        self.seeded_at = seeded_at
+        logger.debug(f"📊 Seeded facet counters (window: {self.window}).")
+
+    async def get_counts(self, name: str, *, username: str = None) -> dict:
+        """Returns the counts of the given facet, by value (flag counts are for the given user)."""
+        await self.seed()
+        if name == "flag":
+            counts = (await self._get_flag_counter(username or "anonymous")).counts()
+            counts["NULL"] = max(0, sum(self.counters["endpoint"].counts().values()) - sum(counts.values()))
+            return counts
+        return self.counters[name].counts()
+
+    def forget_flags(self, username: str):
+        """Forgets the flag counts of a user (seeded again when needed)."""
+        self.flag_counters.pop(username, None)
+
+    async def _get_flag_counter(self, username: str) -> WindowedCounter:
+        if username not in self.flag_counters:
+            counter = WindowedCounter(window=self.window)
+            since = self._get_since(datetime.now(UTC))
+            for row in await self.storage.get_facet_counts("flag", since=since, username=username):
+                counter.add(row["value"], at=row["datetime"], count=row["count"])
+            self.flag_counters[username] = counter
+        return self.flag_counters[username]
+
+    def _get_since(self, now: datetime) -> datetime:
+        # start of the oldest slot in the window
+        return (now - self.window).replace(minute=0, second=0, microsecond=0)
+
+    def _is_counted(self, event: TransactionEvent) -> bool:
+        return self.seeded_at is not None and _as_utc(event.transaction.started_at) >= self.seeded_at
+
+    async def on_transaction_started(self, event: TransactionEvent):
+        if self._is_counted(event):
+            transaction = event.transaction
+            self.counters["endpoint"].add(transaction.endpoint or None, at=transaction.started_at)
+            self.counters["method"].add(transaction.extras.get("method"), at=transaction.started_at)
+
+    async def on_transaction_ended(self, event: TransactionEvent):
+        if self._is_counted(event):
+            transaction = event.transaction
+            self.counters["status"].add(transaction.extras.get("status_class"), at=transaction.started_at)
@@ -6,7 +6,16 @@ import { Transaction } from "Models/Transaction"
 import { Filters, FilterValue, MinMaxFilter } from "Types/filters"
 
 function getQueryStringFromRecord(
-  filters: Record<string, FilterValue> | { page: number; cursor?: string | null; search?: string | null },
+  filters:
+    | Record<string, FilterValue>
+    | {
+        page: number
+        total?: string
+        cursor?: string | null
+        search?: string | null
+        after?: string | null
+        before?: string | null
+      },
 ) {
   const searchParams = new URLSearchParams()
 
@@ -35,18 +44,40 @@ export function useTransactionsListQuery({
   cursor = undefined,
   filters = undefined,
   search = undefined,
+  after = undefined,
+  before = undefined,
 }: {
   filters?: Filters
   page?: number
   cursor?: string | null
   search?: string | null
+  after?: string | null
+  before?: string | null
 }) {
   const api = useApi()
   const qs = filters
-    ? getQueryStringFromRecord({ ...filters, page, cursor: page == 1 ? undefined : cursor, search })
+    ? getQueryStringFromRecord({
+        ...filters,
+        page,
+        // exact totals get slow on large databases, a lower bound is enough to paginate
+        total: "capped",
+        cursor: page == 1 ? undefined : cursor,
+        search,
+        after: page == 1 ? undefined : after,
+        before: page == 1 ? undefined : before,
+      })
     : ""
 
-  return useQuery<ItemList<Transaction> & { total: number; pages: number; perPage: number }>(
+  return useQuery<
+    ItemList<Transaction> & {
+      total: number | null
+      totalKind?: "exact" | "capped" | "estimated" | "none"
+      pages: number | null
+      perPage: number
+      next: string | null
+      prev: string | null
+    }
+  >(
     ["transactions", qs],
     () => api.fetch("/transactions" + (qs ? `?${qs}` : "")).then((r) => r.json()),
     {
@@ -25,7 +25,9 @@ export function TransactionListOnQuerySuccess({
   query,
   filters,
 }: {
-  query: QueryObserverSuccessResult<ItemList<Transaction> & { total: number; pages: number; perPage: number }>
+  query: QueryObserverSuccessResult<
+    ItemList<Transaction> & { total: number | null; pages: number | null; perPage: number }
+  >
   filters: Filters
 }) {
   const location = useLocation()
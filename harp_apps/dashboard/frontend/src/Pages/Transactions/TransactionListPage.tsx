@@ -51,8 +51,18 @@ export default function TransactionListPage() {
   const [cursor, setCursor] = useState<string>(cursorFromSearchParams || "")
   const search = searchParams.get("search")
   const page = searchParams.get("page") ? parseInt(searchParams.get("page")!) : 1
+  // keyset pagination cursors, used when moving to the next or previous page
+  const after = searchParams.get("after")
+  const before = searchParams.get("before")
 
-  const query = useTransactionsListQuery({ filters, page, cursor, search })
+  const query = useTransactionsListQuery({ filters, page, cursor, search, after, before })
+
+  // capped totals are lower bounds, estimated totals are approximations
+  const total = query.isSuccess ? query.data.total : undefined
+  const totalLabel =
+    total == null
+      ? total
+      : `${query.data?.totalKind == "estimated" ? "~" : ""}${total}${query.data?.totalKind == "capped" ? "+" : ""}`
 
   // Keep refs of filters and search to reset page when a change is detected
   const prevSearchRef = useRef<string | null>(null)
@@ -92,7 +102,7 @@ export default function TransactionListPage() {
       prevFiltersRef.current = filters
       prevSearchRef.current = search
       if (page !== 1) {
-        updateQueryParams({ page: undefined, cursor: undefined })
+        updateQueryParams({ page: undefined, cursor: undefined, after: undefined, before: undefined })
       }
     }
   }, [filters, page, search, updateQueryParams])
@@ -120,19 +130,24 @@ export default function TransactionListPage() {
               <div className="flex flex-col items-end">
                 <OptionalPaginator
                   current={page}
-                  setPage={(page) => {
-                    if (page > 1) {
-                      updateQueryParams({ page: page.toString(), cursor: cursor })
+                  setPage={(newPage) => {
+                    if (newPage > 1) {
+                      updateQueryParams({
+                        page: newPage.toString(),
+                        cursor: cursor,
+                        after: newPage == page + 1 && query.data.next ? query.data.next : undefined,
+                        before: newPage == page - 1 && query.data.prev ? query.data.prev : undefined,
+                      })
                     } else {
-                      updateQueryParams({ page: undefined, cursor: undefined })
+                      updateQueryParams({ page: undefined, cursor: undefined, after: undefined, before: undefined })
                     }
                   }}
-                  total={query.data.total}
-                  pages={query.data.pages}
+                  total={query.data.total ?? undefined}
+                  pages={query.data.pages ?? undefined}
                   perPage={query.data.perPage}
                 />
                 <div className="px-4 sm:px-6 text-sm text-secondary-400">
-                  Showing {query.data.items.length} of {query.data.total} transactions
+                  Showing {query.data.items.length} of {totalLabel} transactions
                 </div>
               </div>
             ) : (
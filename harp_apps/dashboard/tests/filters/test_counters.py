@@ -0,0 +1,45 @@
+from datetime import UTC, datetime, timedelta
+
+import pytest
+from freezegun import freeze_time
+
+from harp_apps.dashboard.filters import FacetCounters, WindowedCounter
+
+
+@freeze_time("2024-01-02 12:30:00")
+def test_windowed_counter():
+    now = datetime.now(UTC)
+    counter = WindowedCounter(window=timedelta(hours=2))
+
+    counter.add("GET", at=now)
+    counter.add("GET", at=now - timedelta(hours=1), count=2)
+    counter.add("POST", at=now - timedelta(hours=2))
+    # before the window, ignored
+    counter.add("PUT", at=now - timedelta(hours=3))
+    assert counter.counts() == {"GET": 3, "POST": 1}
+
+    # slots leave the window as time goes on
+    assert counter.counts(now=now + timedelta(hours=1)) == {"GET": 3}
+    assert counter.counts(now=now + timedelta(hours=2)) == {"GET": 1}
+    assert counter.counts(now=now + timedelta(hours=3)) == {}
+
+
+async def test_failed_seeding_is_retried():
+    calls = []
+
+    class Storage:
+        async def get_facet_counts(self, name, *, since, username=None):
+            calls.append(name)
+            if len(calls) == 2:
+                raise ConnectionError("Database unavailable.")
+            return [{"value": "GET" if name == "method" else "api", "datetime": datetime.now(UTC), "count": 2}]
+
+    counters = FacetCounters(storage=Storage())
+    with pytest.raises(ConnectionError):
+        await counters.get_counts("endpoint")
+    assert counters.seeded_at is None
+
+    # seeded from scratch, without counting the rows of the failed attempt twice
+    assert await counters.get_counts("endpoint") == {"api": 2}
+    assert await counters.get_counts("method") == {"GET": 2}
+    assert calls == ["endpoint", "method", "endpoint", "method", "status"]
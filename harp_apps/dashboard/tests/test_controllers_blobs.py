@@ -1,7 +1,10 @@
 import pytest
 
+from harp.http import HttpStreamingResponse
+from harp.models import Blob as BlobModel
 from harp.utils.testing.communicators import ASGICommunicator
 from harp.utils.testing.mixins import ControllerThroughASGIFixtureMixin
+from harp_apps.sqlalchemy_storage.blob_backends import FilesystemBlobBackend
 from harp_apps.sqlalchemy_storage.models import Blob
 from harp_apps.sqlalchemy_storage.utils.testing.mixins import SqlalchemyStorageTestFixtureMixin
 
@@ -39,6 +42,37 @@ class TestBlobsController(
         assert response.status == 404
         assert response.content_type == "text/plain"
 
+    async def test_get_truncated(self, controller, storage):
+        blob = await self.create_blob(storage, b"hello, world", content_type="text/plain", max_size=5)
+
+        response = await controller.get(blob.id)
+        assert response.status == 200
+        assert response.body == b"hello"
+        assert response.headers["x-harp-original-size"] == "12"
+
+    async def test_get_from_filesystem(self, controller, storage, tmp_path):
+        storage.blob_backend = storage.writer.blob_backend = FilesystemBlobBackend(tmp_path)
+        blob = BlobModel.from_data(b"hello, world" * 10000)
+        storage.writer.add_blob(blob)
+        await storage.writer.flush()
+
+        response = await controller.get(blob.id)
+        assert isinstance(response, HttpStreamingResponse)
+        assert response.headers["content-length"] == "120000"
+        assert b"".join([chunk async for chunk in response.stream()]) == b"hello, world" * 10000
+
+    async def test_get_truncated_json_from_filesystem(self, controller, storage, tmp_path):
+        storage.blob_backend = storage.writer.blob_backend = FilesystemBlobBackend(tmp_path)
+        blob = BlobModel.from_data(b'{"hello": "world"}', content_type="application/json", max_size=10)
+        storage.writer.add_blob(blob)
+        await storage.writer.flush()
+
+        # cannot be prettified, sent as is
+        response = await controller.get(blob.id)
+        assert response.status == 200
+        assert response.headers["x-harp-original-size"] == "18"
+        assert b"".join([chunk async for chunk in response.stream()]) == b'{"hello": '
+
 
 class TestBlobsControllerThroughASGI(
     BlobsControllerTestFixtureMixin,
@@ -50,3 +84,13 @@ class TestBlobsControllerThroughASGI(
 
         assert response["status"] == 404
         assert response["headers"] == ((b"content-type", b"text/plain"),)
+
+    async def test_get_from_filesystem(self, client: ASGICommunicator, storage, tmp_path):
+        storage.blob_backend = storage.writer.blob_backend = FilesystemBlobBackend(tmp_path)
+        blob = BlobModel.from_data(b"hello, world", content_type="text/plain")
+        storage.writer.add_blob(blob)
+        await storage.writer.flush()
+
+        response = await client.http_get(f"/api/blobs/{blob.id}")
+        assert response["status"] == 200
+        assert response["body"] == b"hello, world"
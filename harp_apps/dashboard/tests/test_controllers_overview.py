@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import UTC, datetime, timedelta
 from unittest.mock import Mock
 
 import freezegun
@@ -7,9 +7,11 @@ import pytest
 from multidict import MultiDict
 
 from harp.http import HttpRequest
+from harp.models import Transaction as TransactionModel
 from harp.utils.testing.communicators import ASGICommunicator
 from harp.utils.testing.mixins import ControllerThroughASGIFixtureMixin
 from harp_apps.dashboard.controllers import OverviewController
+from harp_apps.dashboard.utils.cache import ResponseCache
 from harp_apps.sqlalchemy_storage.storage import SqlAlchemyStorage
 from harp_apps.sqlalchemy_storage.utils.testing.mixins import SqlalchemyStorageTestFixtureMixin
 
@@ -73,6 +75,45 @@ class TestOverviewController(OverviewControllerTestFixtureMixin, SqlalchemyStora
             "transactions": {"data": Any24IntegerValues, "period": "day", "rate": 3},
         }
 
+    async def test_get_overview_data_latency(self, controller: OverviewController, storage: SqlAlchemyStorage):
+        with freezegun.freeze_time(datetime(2023, 6, 21, 12, 10, 0)):
+            for i, elapsed in enumerate((10.0, 20.0, 1000.0)):
+                transaction = TransactionModel(
+                    id=f"t{i}", type="http", endpoint="api", started_at=datetime.now(UTC) - timedelta(hours=i)
+                )
+                storage.writer.add_transaction(transaction)
+                transaction.finished_at, transaction.elapsed = datetime.now(UTC), elapsed
+                storage.writer.add_transaction_update(transaction)
+            await storage.writer.flush()
+
+            response = await controller.get_overview_data(Mock(spec=HttpRequest, query=MultiDict()))
+
+        latency = response["latency"]
+        assert latency["p50"] == pytest.approx(20.0, rel=0.02)
+        # rank of p99 among three values is 1.98, still within the second one
+        assert latency["p99"] == pytest.approx(20.0, rel=0.02)
+        assert max(t["p99"] or 0 for t in latency["data"]) == pytest.approx(1000.0, rel=0.02)
+        assert len(latency["data"]) == len(response["transactions"]) == 25
+        assert [t["p50"] is not None for t in latency["data"][-3:]] == [True, True, True]
+        assert latency["data"][0] == {
+            "datetime": response["transactions"][0]["datetime"],
+            "p50": None,
+            "p95": None,
+            "p99": None,
+        }
+
+    async def test_cached_responses(self, storage: SqlAlchemyStorage):
+        controller = OverviewController(storage=storage, cache=ResponseCache(min_age=0), handle_errors=False)
+        request = Mock(spec=HttpRequest, query=MultiDict({"timeRange": "24h"}))
+        assert (await controller.get_overview_data(request))["count"] == 0
+
+        await self.create_transaction(storage)
+        assert (await controller.get_overview_data(request))["count"] == 0
+        assert (await controller.get_summary_data(request))["transactions"]["rate"] == 1
+
+        await controller.cache.on_transaction_ended(None)
+        assert (await controller.get_overview_data(request))["count"] == 1
+
 
 class TestOverviewControllerThroughASGI(
     OverviewControllerTestFixtureMixin,
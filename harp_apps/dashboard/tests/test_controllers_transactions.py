@@ -1,3 +1,4 @@
+from datetime import UTC, datetime
 from unittest.mock import ANY, Mock
 
 import orjson
@@ -5,7 +6,10 @@ import pytest
 from freezegun import freeze_time
 from multidict import MultiDict
 
+from harp.asgi.events import TransactionEvent
 from harp.http import HttpRequest
+from harp.models import Transaction as TransactionModel
+from harp.utils.guids import generate_transaction_id_ksuid
 from harp.utils.testing.communicators import ASGICommunicator
 from harp.utils.testing.mixins import ControllerThroughASGIFixtureMixin
 from harp_apps.sqlalchemy_storage.utils.testing.mixins import SqlalchemyStorageTestFixtureMixin
@@ -21,7 +25,7 @@ class TransactionsControllerTestFixtureMixin:
 
 class TestTransactionsController(TransactionsControllerTestFixtureMixin, SqlalchemyStorageTestFixtureMixin):
     async def test_filters_using_handler(self, controller: TransactionsController):
-        request = Mock(spec=HttpRequest, query=MultiDict())
+        request = Mock(spec=HttpRequest, query=MultiDict(), context={})
         response = await controller.filters(request)
 
         # todo this format may/will change, but we add this test to ensure we start to be meticulous about quality
@@ -34,29 +38,59 @@ class TestTransactionsController(TransactionsControllerTestFixtureMixin, Sqlalch
         }
 
     async def test_filters_meta_updated(self, controller: TransactionsController):
+        request = Mock(spec=HttpRequest, query=MultiDict(), context={})
         with freeze_time("2024-01-01 12:00:00"):
-            await self.create_transaction(controller.storage, endpoint="foo")
+            await self.create_transaction(controller.storage, endpoint="foo", extras={"method": "GET"})
 
-            request = Mock(spec=HttpRequest, query=MultiDict())
+            # counts are seeded from storage
             response = await controller.filters(request)
-
             assert response["endpoint"]["values"] == [{"count": 1, "name": "foo"}]
+            assert response["method"]["values"][:2] == [{"count": 1, "name": "GET"}, {"count": 0, "name": "POST"}]
 
-            # Create two more transactions
-            await self.create_transaction(controller.storage, endpoint="foo")
-            await self.create_transaction(controller.storage, endpoint="foo")
-
-        # Check the count again
         with freeze_time("2024-01-01 12:00:20"):
-            # Check the count again
-            response = await controller.filters(request)
-            assert response["endpoint"]["values"] == [{"count": 1, "name": "foo"}]
+            # then updated from transaction events, without reading storage again
+            for _ in range(2):
+                transaction = TransactionModel(
+                    id=generate_transaction_id_ksuid(),
+                    type="http",
+                    endpoint="foo",
+                    started_at=datetime.now(UTC),
+                    extras={"method": "POST"},
+                )
+                await controller.counters.on_transaction_started(TransactionEvent(transaction))
+                transaction.extras["status_class"] = "5xx"
+                await controller.counters.on_transaction_ended(TransactionEvent(transaction))
 
-        # Move forward in time by 2 minutes
-        with freeze_time("2024-01-01 12:02:00"):
-            # Check the count again
             response = await controller.filters(request)
             assert response["endpoint"]["values"] == [{"count": 3, "name": "foo"}]
+            assert response["method"]["values"][:2] == [{"count": 1, "name": "GET"}, {"count": 2, "name": "POST"}]
+            assert response["status"]["values"][3] == {"count": 2, "name": "5xx"}
+            assert response["flag"]["values"] == [{"count": 0, "name": "favorite"}, {"count": 3, "name": "NULL"}]
+
+        # counts leave the window after 24 hours
+        with freeze_time("2024-01-02 13:00:00"):
+            response = await controller.filters(request)
+            assert response["endpoint"]["values"] == []
+            assert response["method"]["values"][:2] == [{"count": 0, "name": "GET"}, {"count": 0, "name": "POST"}]
+
+    async def test_filters_flag_counts(self, controller: TransactionsController):
+        transaction = await self.create_transaction(controller.storage, endpoint="foo")
+        await self.create_transaction(controller.storage, endpoint="foo")
+        request = Mock(spec=HttpRequest, query=MultiDict(), context={"user": "alice"})
+        await controller.storage.create_users(["alice"])
+
+        response = await controller.filters(request)
+        assert response["flag"]["values"] == [{"count": 0, "name": "favorite"}, {"count": 2, "name": "NULL"}]
+
+        await controller.set_user_flag(
+            Mock(spec=HttpRequest, method="PUT", context={"user": "alice"}), transaction.id, "favorite"
+        )
+        response = await controller.filters(request)
+        assert response["flag"]["values"] == [{"count": 1, "name": "favorite"}, {"count": 1, "name": "NULL"}]
+
+        # flags are counted by user
+        response = await controller.filters(Mock(spec=HttpRequest, query=MultiDict(), context={}))
+        assert response["flag"]["values"] == [{"count": 0, "name": "favorite"}, {"count": 2, "name": "NULL"}]
 
 
 class TestTransactionsControllerThroughASGI(
@@ -81,3 +115,37 @@ class TestTransactionsControllerThroughASGI(
             "status": {"current": None, "values": ANY},
             "tpdex": {"current": {"min": ANY, "max": ANY}, "values": ANY},
         }
+
+    async def test_list_with_cursors(self, client: ASGICommunicator, storage, monkeypatch):
+        monkeypatch.setattr("harp_apps.sqlalchemy_storage.storage.PAGE_SIZE", 2)
+        for _ in range(3):
+            await self.create_transaction(storage, endpoint="foo")
+
+        first = orjson.loads((await client.http_get("/api/transactions"))["body"])
+        assert len(first["items"]) == 2
+        assert first["prev"] is None
+
+        response = await client.http_get(f"/api/transactions?after={first['next']}")
+        second = orjson.loads(response["body"])
+        assert len(second["items"]) == 1
+        assert (second["total"], second["totalKind"]) == (3, "exact")
+        assert second["next"] is None
+        assert second["prev"] is not None
+
+        response = await client.http_get("/api/transactions?after=invalid")
+        assert response["status"] == 400
+
+    async def test_list_totals(self, client: ASGICommunicator, storage, monkeypatch):
+        monkeypatch.setattr("harp_apps.sqlalchemy_storage.storage.TOTAL_COUNT_CAP", 2)
+        for _ in range(3):
+            await self.create_transaction(storage, endpoint="foo")
+
+        # exact by default
+        response = orjson.loads((await client.http_get("/api/transactions"))["body"])
+        assert (response["total"], response["totalKind"]) == (3, "exact")
+
+        response = orjson.loads((await client.http_get("/api/transactions?total=capped"))["body"])
+        assert (response["total"], response["totalKind"]) == (2, "capped")
+
+        response = orjson.loads((await client.http_get("/api/transactions?total=none"))["body"])
+        assert (response["total"], response["totalKind"], response["pages"]) == (None, "none", None)
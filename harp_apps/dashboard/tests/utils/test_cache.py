@@ -0,0 +1,94 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
+from harp_apps.dashboard.utils.cache import ResponseCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    clock = Clock()
+    with patch("harp_apps.dashboard.utils.cache.time.monotonic", clock):
+        yield clock
+
+
+def counting(value="value"):
+    async def compute():
+        compute.calls += 1
+        return f"{value}{compute.calls}"
+
+    compute.calls = 0
+    return compute
+
+
+async def test_ttl(clock):
+    cache, compute = ResponseCache(ttl=10, min_age=1), counting()
+
+    assert await cache.get_or_compute("key", compute) == "value1"
+    clock.now += 9
+    assert await cache.get_or_compute("key", compute) == "value1"
+    assert await cache.get_or_compute("other", compute) == "value2"
+    clock.now += 1
+    assert await cache.get_or_compute("key", compute) == "value3"
+
+
+async def test_invalidation_after_min_age(clock):
+    cache, compute = ResponseCache(ttl=10, min_age=1), counting()
+
+    assert await cache.get_or_compute("key", compute) == "value1"
+    await cache.on_transaction_ended(None)
+    # stale, but recent enough
+    clock.now += 0.5
+    assert await cache.get_or_compute("key", compute) == "value1"
+    clock.now += 0.5
+    assert await cache.get_or_compute("key", compute) == "value2"
+    # no transaction since last computation
+    clock.now += 5
+    assert await cache.get_or_compute("key", compute) == "value2"
+
+
+async def test_concurrent_requests_are_collapsed(clock):
+    cache, calls = ResponseCache(), []
+    release = asyncio.Event()
+
+    async def compute():
+        calls.append(None)
+        await release.wait()
+        return len(calls)
+
+    tasks = [asyncio.create_task(cache.get_or_compute("key", compute)) for _ in range(5)]
+    await asyncio.sleep(0)
+    # a cancelled request does not cancel the computation others wait for
+    tasks.pop().cancel()
+    release.set()
+    assert await asyncio.gather(*tasks) == [1, 1, 1, 1]
+    assert len(calls) == 1
+
+
+async def test_errors_are_not_cached(clock):
+    cache, compute = ResponseCache(), counting()
+
+    async def fail():
+        raise RuntimeError("database unavailable")
+
+    with pytest.raises(RuntimeError):
+        await cache.get_or_compute("key", fail)
+    assert await cache.get_or_compute("key", compute) == "value1"
+
+
+async def test_expired_entries_are_forgotten(clock):
+    cache, compute = ResponseCache(ttl=10), counting()
+    for i in range(3):
+        await cache.get_or_compute(i, compute)
+    clock.now += 10
+    await cache.get_or_compute("key", compute)
+    assert list(cache._entries) == ["key"]
@@ -1,6 +1,7 @@
 from datetime import UTC, datetime, timedelta
 from typing import List
 from unittest.mock import patch
+from zoneinfo import ZoneInfo
 
 import pytest
 
@@ -75,3 +76,51 @@ def test_generate_continuous_time_range_from_empty_discontinuous():
         result = generate_continuous_time_range(discontinuous_transactions, start_datetime, time_bucket)
 
     assert len(result) == 8
+
+
+def test__truncate_datetime_for_time_bucket_week_and_timezone():
+    paris = ZoneInfo("Europe/Paris")
+    # a sunday, in paris time (saturday in UTC)
+    dt = datetime(2024, 3, 31, 0, 30, tzinfo=paris)
+    assert _truncate_datetime_for_time_bucket(dt, "week") == datetime(2024, 3, 25, tzinfo=paris)
+    assert _truncate_datetime_for_time_bucket(dt, "day") == datetime(2024, 3, 31, tzinfo=paris)
+    assert _truncate_datetime_for_time_bucket(dt.astimezone(UTC), "day") == datetime(2024, 3, 30, tzinfo=UTC)
+    with pytest.raises(ValueError):
+        _truncate_datetime_for_time_bucket(dt, "fortnight")
+
+
+def test_generate_continuous_time_range_across_daylight_saving_time():
+    paris = ZoneInfo("Europe/Paris")
+    start_datetime = datetime(2024, 3, 30, 12, tzinfo=paris)
+    discontinuous_transactions = [
+        # naive datetimes are UTC, this is midnight in paris
+        {"datetime": datetime(2024, 3, 31, 22), "count": 10, "errors": 0, "meanDuration": 1.0},
+    ]
+    with patch("harp_apps.dashboard.utils.dates.datetime") as mock_datetime:
+        mock_datetime.now.return_value = datetime(2024, 4, 1, 12, tzinfo=UTC)
+        days = generate_continuous_time_range(discontinuous_transactions, start_datetime, "day")
+        hours = generate_continuous_time_range([], start_datetime, "hour")
+
+    # days start at midnight, paris time, although march 31st only lasts 23 hours
+    assert [t["datetime"] for t in days[:2]] == [
+        datetime(2024, 3, 30, tzinfo=paris),
+        datetime(2024, 3, 31, tzinfo=paris),
+    ]
+    assert days[2] is discontinuous_transactions[0]
+    assert len(days) == 3
+    # hours are one hour apart, and 2am does not exist on march 31st in paris
+    assert len(hours) == 49 + 1
+    instants = [t["datetime"].astimezone(UTC) for t in hours]
+    assert all(b - a == timedelta(hours=1) for a, b in zip(instants, instants[1:]))
+    assert datetime(2024, 3, 31, 3, tzinfo=paris) in [t["datetime"] for t in hours]
+
+
+def test_generate_continuous_time_range_weeks():
+    with patch("harp_apps.dashboard.utils.dates.datetime") as mock_datetime:
+        mock_datetime.now.return_value = datetime(2024, 1, 31, tzinfo=UTC)
+        result = generate_continuous_time_range([], datetime(2024, 1, 3, tzinfo=UTC), "week")
+    assert [t["datetime"].day for t in result] == [1, 8, 15, 22, 29]
+
+    with pytest.raises(ValueError):
+        generate_continuous_time_range([], datetime(2024, 1, 3, tzinfo=UTC), "fortnight")
+    assert generate_continuous_time_range([], None, "day") == []
@@ -0,0 +1,74 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Hashable
+
+#: How long a computed response can be served, in seconds.
+DEFAULT_TTL = 10.0
+
+#: How long a computed response is served even if transactions ended since, in seconds.
+DEFAULT_MIN_AGE = 1.0
+
+
+class ResponseCache:
+    """
+    In-process cache for computed dashboard responses, keyed by any hashable (for example the handler name and its
+    query parameters).
+
+    Each transaction end makes the current entries stale, but stale entries are still served until they are `min_age`
+    seconds old, so a busy proxy does not trigger one computation per dashboard poll. Without new transactions,
+    entries are served until they are `ttl` seconds old.
+
+    Concurrent requests for a missing or stale key share one computation.
+
+    """
+
+    def __init__(self, *, ttl: float = DEFAULT_TTL, min_age: float = DEFAULT_MIN_AGE):
+        self.ttl = ttl
+        self.min_age = min_age
+
+        #: Incremented each time the cached data may have changed.
+        self.generation = 0
+
+        self._entries: dict[Hashable, tuple[float, int, Any]] = {}
+        self._pending: dict[Hashable, asyncio.Task] = {}
+
+    def invalidate(self):
+        """Marks all entries as stale."""
+        self.generation += 1
+
+    async def on_transaction_ended(self, event):
+        self.invalidate()
+
+    def _is_fresh(self, entry, now) -> bool:
+        created_at, generation, _ = entry
+        age = now - created_at
+        return age < self.min_age or (age < self.ttl and generation == self.generation)
+
+    async def get_or_compute(self, key: Hashable, compute: Callable[[], Awaitable[Any]]):
+        """Returns the cached value for `key`, or the result of `compute()` (awaited once for concurrent callers)."""
+        entry = self._entries.get(key)
+        if entry is not None and self._is_fresh(entry, time.monotonic()):
+            return entry[2]
+
+        if key not in self._pending:
+            # start time and generation are taken before computing, so that changes during the computation make the
+            # result stale.
+            created_at, generation = time.monotonic(), self.generation
+
+            def _on_done(task: asyncio.Task):
+                self._pending.pop(key, None)
+                if not task.cancelled() and task.exception() is None:
+                    self._set(key, (created_at, generation, task.result()))
+
+            self._pending[key] = asyncio.ensure_future(compute())
+            self._pending[key].add_done_callback(_on_done)
+
+        # shielded, so that a cancelled request does not cancel the computation other requests are waiting for
+        return await asyncio.shield(self._pending[key])
+
+    def _set(self, key, entry):
+        # forget expired entries, as keys may come from user input (endpoint names)
+        now = time.monotonic()
+        for expired in [k for k, (created_at, _, _) in self._entries.items() if now - created_at >= self.ttl]:
+            del self._entries[expired]
+        self._entries[key] = entry
@@ -26,11 +26,22 @@ def get_start_datetime_from_range(range: str | None, *, now=None) -> datetime |
     return start_datetime
 
 
+_TIME_BUCKET_DELTAS = {
+    "minute": timedelta(minutes=1),
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+    "week": timedelta(weeks=1),
+}
+
+
 def _truncate_datetime_for_time_bucket(dt: datetime, time_bucket: str = "day") -> datetime:
     """
-    Truncate a datetime object to the given time bucket.
+    Truncate a datetime object to the given time bucket, using the wall clock of its own timezone (weeks start on
+    mondays).
     """
-    if time_bucket == "day":
+    if time_bucket == "week":
+        return (dt - timedelta(days=dt.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+    elif time_bucket == "day":
         return dt.replace(hour=0, minute=0, second=0, microsecond=0)
     elif time_bucket == "hour":
         return dt.replace(minute=0, second=0, microsecond=0)
@@ -40,34 +51,53 @@ def _truncate_datetime_for_time_bucket(dt: datetime, time_bucket: str = "day") -
         raise ValueError(f"Unknown time bucket: {time_bucket}")
 
 
+def _as_aware(dt: datetime) -> datetime:
+    return dt if dt.tzinfo else dt.replace(tzinfo=UTC)
+
+
 def generate_continuous_time_range(
     discontinuous_transactions: List[TransactionsGroupedByTimeBucket],
     start_datetime=None,
     time_bucket: str = "day",
 ) -> List[TransactionsGroupedByTimeBucket]:
     """
-    Generate a list of datetime objects from a range string.
+    Fill the gaps between data points, from the start of the time bucket containing start_datetime (or the first data
+    point) to now, with empty data points.
+
+    Day and week buckets follow the wall clock of the start datetime's timezone, so that they start at midnight even
+    across daylight saving time changes, while minute and hour buckets are fixed durations. Data points are indexed by
+    instant once, which keeps this linear in the number of buckets.
     """
-    # Generate a list of datetime objects from a range string
-    start_datetime = start_datetime if start_datetime else discontinuous_transactions[0]["datetime"]
-    start_datetime = _truncate_datetime_for_time_bucket(start_datetime, time_bucket)
+    try:
+        delta = _TIME_BUCKET_DELTAS[time_bucket]
+    except KeyError:
+        raise ValueError(f"Unknown time bucket: {time_bucket}")
 
+    if not start_datetime:
+        if not discontinuous_transactions:
+            return []
+        start_datetime = discontinuous_transactions[0]["datetime"]
+    start_datetime = _truncate_datetime_for_time_bucket(_as_aware(start_datetime), time_bucket)
+    tz = start_datetime.tzinfo
+    if delta < _TIME_BUCKET_DELTAS["day"]:
+        # aware datetime arithmetic is wall clock arithmetic, fixed durations are added in UTC
+        start_datetime = start_datetime.astimezone(UTC)
     end_datetime = datetime.now(UTC)
-    delta = timedelta(
-        days=1 if time_bucket == "day" else 0,
-        hours=1 if time_bucket == "hour" else 0,
-        minutes=1 if time_bucket == "minute" else 0,
-    )
 
-    datetime_range = [start_datetime + i * delta for i in range(int((end_datetime - start_datetime) / delta) + 1)]
+    # aware datetimes are hashed and compared as instants, whatever their timezone
+    by_datetime = {_as_aware(d["datetime"]): d for d in discontinuous_transactions}
 
-    # Fill missing data points
     continuous_transactions = []
-    for t in datetime_range:
-        if t in [d["datetime"] for d in discontinuous_transactions]:
-            continuous_transactions.append([d for d in discontinuous_transactions if d["datetime"] == t][0])
-        else:
-            continuous_transactions.append(
-                {"datetime": t, "count": None, "errors": None, "cached": 0, "meanDuration": None, "meanTpdex": None}
-            )
+    append, get = continuous_transactions.append, by_datetime.get
+    i, t = 0, start_datetime
+    while t <= end_datetime:
+        if t.tzinfo is not tz:
+            t = t.astimezone(tz)
+        d = get(t)
+        if d is None:
+            d = {"datetime": t, "count": None, "errors": None, "cached": 0, "meanDuration": None, "meanTpdex": None}
+        append(d)
+        # adding to the start (rather than to the previous bucket) does not accumulate wall clock shifts
+        i += 1
+        t = start_datetime + i * delta
     return continuous_transactions
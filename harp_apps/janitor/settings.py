@@ -1,7 +1,75 @@
 from datetime import timedelta
 
-#: How many seconds to wait between loop executions.
-PERIOD = 600
+from harp.config import BaseSetting, settings_dataclass
+from harp.errors import ConfigurationValueError
+from harp.utils.env import cast_bool
 
-#: Number of days after we consider something as "old".
-OLD_AFTER = timedelta(days=60)
+#: How long fine-grained transaction rollups are kept, by time bucket (day rollups are kept forever).
+ROLLUPS_OLD_AFTER = {
+    "minute": timedelta(days=2),
+    "hour": timedelta(days=90),
+}
+
+#: Maximum number of ids in one delete statement.
+DELETE_CHUNK_SIZE = 500
+
+#: Number of seconds before a blob file without a database row is considered stray (its row may not be committed yet).
+STRAY_FILES_MIN_AGE = 3600
+
+#: Approximate number of rows examined by index when refreshing sqlite statistics (see ``PRAGMA analysis_limit``).
+SQLITE_ANALYSIS_LIMIT = 1000
+
+
+@settings_dataclass
+class JanitorSettings(BaseSetting):
+    """Settings of the janitor worker, cleaning up the storage in the background."""
+
+    #: How many seconds to wait between loop executions.
+    period: int = 600
+
+    #: Number of days after which transactions are deleted (flagged transactions are kept).
+    old_after: int = 60
+
+    #: Number of old transactions deleted by each delete statement (and database transaction).
+    batch_size: int = 1000
+
+    #: Number of seconds to wait between two batches, to leave room for other database writes.
+    batch_pause: float = 0.1
+
+    #: Maximum number of seconds spent deleting old transactions in each loop. What remains is deleted by the next
+    #: loops.
+    time_budget: float = 60.0
+
+    #: Maximum (estimated) number of stored transactions, the oldest ones are deleted first once it is exceeded
+    #: (flagged transactions are kept). 0 for no limit.
+    max_transactions: int = 0
+
+    #: Maximum (estimated) number of bytes used by blobs (the whole database file with sqlite, and the blob files with
+    #: the filesystem blob backend), the oldest transactions are deleted first once it is exceeded (flagged
+    #: transactions are kept). 0 for no limit.
+    max_blobs_size: int = 0
+
+    #: Count stored objects exactly (``COUNT(*)``) for the storage metrics, every `exact_counts_period` seconds.
+    #: Otherwise (and in between), counts are estimated from the database statistics.
+    exact_counts: bool = False
+
+    #: Minimum number of seconds between two exact counts, if enabled (and between two refreshes of the sqlite
+    #: statistics, when no rows were deleted).
+    exact_counts_period: int = 86400
+
+    def __post_init__(self):
+        super().__post_init__()
+        self.period = int(self.period)
+        self.old_after = int(self.old_after)
+        self.batch_size = int(self.batch_size)
+        self.batch_pause = float(self.batch_pause)
+        self.time_budget = float(self.time_budget)
+        self.max_transactions = int(self.max_transactions)
+        self.max_blobs_size = int(self.max_blobs_size)
+        self.exact_counts = cast_bool(self.exact_counts)
+        self.exact_counts_period = int(self.exact_counts_period)
+
+        if self.batch_size < 1:
+            raise ConfigurationValueError("Janitor batch size must be at least 1.")
+        if self.max_transactions < 0 or self.max_blobs_size < 0:
+            raise ConfigurationValueError("Janitor storage budget cannot be negative (use 0 for no limit).")
@@ -0,0 +1,54 @@
+import pytest
+
+from harp.config import asdict
+from harp.errors import ConfigurationValueError
+from harp_apps.janitor.settings import JanitorSettings
+
+
+def test_defaults():
+    assert asdict(JanitorSettings()) == {
+        "period": 600,
+        "old_after": 60,
+        "batch_size": 1000,
+        "batch_pause": 0.1,
+        "time_budget": 60.0,
+        "max_transactions": 0,
+        "max_blobs_size": 0,
+        "exact_counts": False,
+        "exact_counts_period": 86400,
+    }
+
+
+def test_override():
+    settings = JanitorSettings(
+        period="60",
+        old_after=30,
+        batch_size="100",
+        time_budget=10,
+        max_transactions="100000",
+        max_blobs_size=2**30,
+        exact_counts="true",
+        exact_counts_period="3600",
+    )
+
+    assert asdict(settings) == {
+        "period": 60,
+        "old_after": 30,
+        "batch_size": 100,
+        "batch_pause": 0.1,
+        "time_budget": 10.0,
+        "max_transactions": 100000,
+        "max_blobs_size": 2**30,
+        "exact_counts": True,
+        "exact_counts_period": 3600,
+    }
+
+
+def test_invalid_batch_size():
+    with pytest.raises(ConfigurationValueError):
+        JanitorSettings(batch_size=0)
+
+
+def test_invalid_budget():
+    with pytest.raises(ConfigurationValueError):
+        JanitorSettings(max_transactions=-1)
@@ -1,7 +1,10 @@
 from datetime import UTC, datetime, timedelta
+from unittest.mock import patch
 
-from harp_apps.janitor.settings import OLD_AFTER
+from harp.models import Blob as BlobModel
+from harp_apps.janitor.settings import JanitorSettings
 from harp_apps.janitor.worker import JanitorWorker
+from harp_apps.sqlalchemy_storage.blob_backends import FilesystemBlobBackend
 from harp_apps.sqlalchemy_storage.storage import SqlAlchemyStorage
 from harp_apps.sqlalchemy_storage.utils.testing.mixins import SqlalchemyStorageTestFixtureMixin
 
@@ -10,9 +13,9 @@ class TestJanitorWorker(SqlalchemyStorageTestFixtureMixin):
     async def test_delete_old_transactions(self, storage: SqlAlchemyStorage):
         worker = JanitorWorker(storage)
 
-        await self.create_transaction(storage, started_at=datetime.now(UTC) - OLD_AFTER - timedelta(hours=1))
-        await self.create_transaction(storage, started_at=datetime.now(UTC) - OLD_AFTER - timedelta(minutes=1))
-        await self.create_transaction(storage, started_at=datetime.now(UTC) - OLD_AFTER + timedelta(minutes=1))
+        await self.create_transaction(storage, started_at=datetime.now(UTC) - worker.old_after - timedelta(hours=1))
+        await self.create_transaction(storage, started_at=datetime.now(UTC) - worker.old_after - timedelta(minutes=1))
+        await self.create_transaction(storage, started_at=datetime.now(UTC) - worker.old_after + timedelta(minutes=1))
 
         async with storage.session_factory() as session:
             assert (await worker.compute_metrics(session))["storage.transactions"] == 3
@@ -22,12 +25,30 @@ class TestJanitorWorker(SqlalchemyStorageTestFixtureMixin):
         async with storage.session_factory() as session:
             assert (await worker.compute_metrics(session))["storage.transactions"] == 1
 
+    async def test_delete_old_rollups(self, storage: SqlAlchemyStorage):
+        worker = JanitorWorker(storage)
+
+        await self.create_transaction(storage, started_at=datetime.now(UTC) - timedelta(days=120))
+        await self.create_transaction(storage, started_at=datetime.now(UTC) - timedelta(days=7))
+        await self.create_transaction(storage, started_at=datetime.now(UTC))
+
+        async with storage.session_factory() as session:
+            assert (await session.execute(storage.rollups.count())).scalar() == 9
+
+        # minute rollups are kept 2 days, hour rollups 90 days, and day rollups forever
+        assert await worker.delete_old_rollups() == 3
+
+        assert [t["count"] for t in await storage.transactions_grouped_by_time_bucket(time_bucket="day")] == [1, 1, 1]
+        assert [t["count"] for t in await storage.transactions_grouped_by_time_bucket(time_bucket="minute")] == [1]
+
     async def test_delete_orphan_blobs(self, storage: SqlAlchemyStorage):
         worker = JanitorWorker(storage)
 
         b1 = await self.create_blob(storage, "foo")
         b2 = await self.create_blob(storage, "bar")
-        await self.create_blob(storage, "baz")
+        b3 = await self.create_blob(storage, "baz")
+        for blob in (b1, b2, b3):
+            storage.writer.written_blobs[blob.id] = True
 
         async with storage.session_factory() as session:
             metrics = await worker.compute_metrics(session)
@@ -42,19 +63,78 @@ class TestJanitorWorker(SqlalchemyStorageTestFixtureMixin):
             assert metrics["storage.blobs"] == 3
             assert metrics["storage.blobs.orphans"] == 1
 
-        await worker.delete_orphan_blobs()
+        assert await worker.delete_orphan_blobs() == 1
 
         async with storage.session_factory() as session:
             metrics = await worker.compute_metrics(session)
             assert metrics["storage.blobs"] == 2
             assert metrics["storage.blobs.orphans"] == 0
 
+        # the deleted blob is not considered as written anymore, so it would be written again if seen
+        assert set(storage.writer.written_blobs) == {b1.id, b2.id}
+
+    async def test_delete_blobs_of_old_transactions(self, storage: SqlAlchemyStorage):
+        worker = JanitorWorker(storage)
+
+        shared, old, recent = [await self.create_blob(storage, data) for data in ("shared", "old", "recent")]
+        t1 = await self.create_transaction(
+            storage, started_at=datetime.now(UTC) - worker.old_after - timedelta(hours=1)
+        )
+        await self.create_message(
+            storage, transaction_id=t1.id, kind="request", summary="", headers=shared.id, body=old.id
+        )
+        await self.create_message(
+            storage, transaction_id=t1.id, kind="response", summary="", headers=shared.id, body=""
+        )
+        t2 = await self.create_transaction(storage)
+        await self.create_message(
+            storage, transaction_id=t2.id, kind="request", summary="", headers=shared.id, body=recent.id
+        )
+
+        assert await worker.delete_old_transactions() == 1
+
+        # references of the deleted messages are released, only blobs without references left are orphans
+        async with storage.session_factory() as session:
+            assert (await storage.blobs.find_one_by_id(shared.id, session=session)).refs == 1
+            assert (await session.execute(storage.blobs.find_orphans())).scalars().all() == [old.id]
+            assert (await worker.compute_metrics(session))["storage.messages"] == 1
+
+        assert await worker.delete_orphan_blobs() == 1
+        assert await storage.get_blob(old.id) is None
+        assert (await storage.get_blob(shared.id)).data == b"shared"
+
+    async def test_delete_orphan_blobs_from_filesystem(self, storage: SqlAlchemyStorage, tmp_path):
+        storage.blob_backend = storage.writer.blob_backend = FilesystemBlobBackend(tmp_path)
+        worker = JanitorWorker(storage)
+
+        b1, b2, b3 = (BlobModel.from_data(data) for data in (b"foo", b"bar", b"baz"))
+        for blob in (b1, b2, b3):
+            storage.writer.add_blob(blob)
+        await storage.writer.flush()
+
+        t = await self.create_transaction(storage)
+        await self.create_message(storage, transaction_id=t.id, kind="misc", summary="foo", headers=b1.id, body=b2.id)
+
+        assert await worker.delete_orphan_blobs() == 1
+        assert sorted(storage.blob_backend.iter_ids()) == sorted([b1.id, b2.id])
+        assert await storage.get_blob(b3.id) is None
+
+        # files without rows (or not matching their row's codec), are removed once old enough
+        storage.blob_backend._write_many([("0123456789abcdef0123456789abcdef01234567", b"stray")])
+        storage.blob_backend._write_many([(f"{b1.id}.zlib", b"stray")])
+        assert await worker.delete_stray_blob_files() == 0
+        with patch("harp_apps.janitor.worker.STRAY_FILES_MIN_AGE", -60):
+            assert await worker.delete_stray_blob_files() == 2
+        assert sorted(storage.blob_backend.iter_ids()) == sorted([b1.id, b2.id])
+
     async def test_delete_old_transactions_but_keep_flagged_ones(self, storage: SqlAlchemyStorage):
         worker = JanitorWorker(storage)
 
-        t1 = await self.create_transaction(storage, started_at=datetime.now(UTC) - OLD_AFTER - timedelta(hours=1))
-        await self.create_transaction(storage, started_at=datetime.now(UTC) - OLD_AFTER - timedelta(minutes=1))
-        await self.create_transaction(storage, started_at=datetime.now(UTC) - OLD_AFTER + timedelta(minutes=1))
+        t1 = await self.create_transaction(
+            storage, started_at=datetime.now(UTC) - worker.old_after - timedelta(hours=1)
+        )
+        await self.create_transaction(storage, started_at=datetime.now(UTC) - worker.old_after - timedelta(minutes=1))
+        await self.create_transaction(storage, started_at=datetime.now(UTC) - worker.old_after + timedelta(minutes=1))
 
         user = await storage.users.find_one_by_username("anonymous")
         await storage.flags.create({"type": 1, "user_id": user.id, "transaction_id": t1.id})
@@ -66,3 +146,163 @@ class TestJanitorWorker(SqlalchemyStorageTestFixtureMixin):
 
         async with storage.session_factory() as session:
             assert (await worker.compute_metrics(session))["storage.transactions"] == 2
+
+    async def test_delete_old_transactions_by_batches(self, storage: SqlAlchemyStorage):
+        worker = JanitorWorker(storage, JanitorSettings(batch_size=2, batch_pause=0, time_budget=0))
+
+        old = [
+            await self.create_transaction(storage, started_at=datetime.now(UTC) - worker.old_after - timedelta(hours=i))
+            for i in range(1, 6)
+        ]
+        recent = await self.create_transaction(storage, started_at=datetime.now(UTC))
+
+        user = await storage.users.find_one_by_username("anonymous")
+        await storage.flags.create({"type": 1, "user_id": user.id, "transaction_id": old[0].id})
+
+        # no time budget, one batch per loop (oldest first), until there is nothing left to delete
+        assert await worker.delete_old_transactions() == 2
+        assert worker.retention["batches"] == 1 and not worker.retention["complete"]
+
+        remaining = sorted(
+            t.id for t in (await storage.get_transaction_list(username="anonymous", with_messages=True)).items
+        )
+        assert remaining == sorted([recent.id, old[0].id, old[1].id, old[2].id])
+
+        assert await worker.delete_old_transactions() == 2
+        assert worker.retention["batches"] == 1 and not worker.retention["complete"]
+
+        # flagged transactions are kept
+        assert await worker.delete_old_transactions() == 0
+        assert worker.retention["complete"]
+        remaining = sorted(
+            t.id for t in (await storage.get_transaction_list(username="anonymous", with_messages=True)).items
+        )
+        assert remaining == sorted([recent.id, old[0].id])
+
+    async def test_delete_old_transactions_within_time_budget(self, storage: SqlAlchemyStorage):
+        worker = JanitorWorker(storage, JanitorSettings(batch_size=2, batch_pause=0))
+
+        for i in range(1, 6):
+            await self.create_transaction(storage, started_at=datetime.now(UTC) - worker.old_after - timedelta(hours=i))
+
+        assert await worker.delete_old_transactions() == 5
+        assert worker.retention["batches"] == 3 and worker.retention["complete"]
+
+    async def test_enforce_budget(self, storage: SqlAlchemyStorage):
+        worker = JanitorWorker(storage, JanitorSettings(max_transactions=3, batch_size=1, batch_pause=0))
+
+        transactions = [
+            await self.create_transaction(storage, started_at=datetime.now(UTC) - timedelta(hours=i)) for i in range(5)
+        ]
+        user = await storage.users.find_one_by_username("anonymous")
+        await storage.flags.create({"type": 1, "user_id": user.id, "transaction_id": transactions[-1].id})
+
+        # the oldest unflagged transactions are deleted, down to the budget
+        assert await worker.enforce_budget() == 2
+        assert worker.budget["transactions"] == 5 and worker.budget["usage"] == 5 / 3
+        remaining = sorted(
+            t.id for t in (await storage.get_transaction_list(username="anonymous", with_messages=True)).items
+        )
+        assert remaining == sorted([transactions[0].id, transactions[1].id, transactions[4].id])
+
+        assert await worker.enforce_budget() == 0
+        assert worker.budget["usage"] == 1.0
+
+        async with storage.session_factory() as session:
+            assert (await worker.compute_metrics(session))["storage.budget"] == 100
+
+    async def test_enforce_blobs_size_budget(self, storage: SqlAlchemyStorage):
+        worker = JanitorWorker(storage, JanitorSettings(max_blobs_size=1))
+        assert worker.budget["usage"] is None
+
+        flagged = await self.create_transaction(storage)
+        for i in range(3):
+            await self.create_transaction(storage)
+        user = await storage.users.find_one_by_username("anonymous")
+        await storage.flags.create({"type": 1, "user_id": user.id, "transaction_id": flagged.id})
+
+        # with sqlite, the whole database file is over the (tiny) budget, all unflagged transactions are deleted
+        assert await worker.enforce_budget() == 3
+        assert worker.budget["blobs_size"] > 1 and worker.budget["usage"] > 1
+        remaining = [t.id for t in (await storage.get_transaction_list(username="anonymous", with_messages=True)).items]
+        assert remaining == [flagged.id]
+
+    async def test_no_budget(self, storage: SqlAlchemyStorage):
+        worker = JanitorWorker(storage)
+        await self.create_transaction(storage)
+
+        assert await worker.enforce_budget() == 0
+        assert worker.budget["usage"] is None
+        async with storage.session_factory() as session:
+            assert "storage.budget" not in await worker.compute_metrics(session)
+
+    async def test_estimated_counts(self, storage: SqlAlchemyStorage):
+        worker = JanitorWorker(storage)
+
+        for i in range(3):
+            await self.create_transaction(storage)
+
+        async with storage.session_factory() as session:
+            # without statistics, objects are counted
+            assert (await worker.compute_metrics(session))["storage.transactions"] == 3
+
+        # statistics are refreshed by the janitor, and estimates are taken from them in between
+        assert await worker.refresh_statistics()
+        await self.create_transaction(storage)
+        async with storage.session_factory() as session:
+            assert (await worker.compute_metrics(session))["storage.transactions"] == 3
+
+        # ... again only once rows were deleted, or after `exact_counts_period`
+        assert not await worker.refresh_statistics()
+        worker.settings = JanitorSettings(exact_counts_period=0)
+        assert await worker.refresh_statistics()
+        async with storage.session_factory() as session:
+            assert (await worker.compute_metrics(session))["storage.transactions"] == 4
+
+            # exact counts are opt-in, and not computed more often than `exact_counts_period`
+            await self.create_transaction(storage)
+            worker.settings = JanitorSettings(exact_counts=True)
+            assert (await worker.compute_metrics(session))["storage.transactions"] == 5
+            assert (await worker.compute_metrics(session))["storage.transactions"] == 4
+
+            worker.settings = JanitorSettings(exact_counts=True, exact_counts_period=0)
+            assert (await worker.compute_metrics(session))["storage.transactions"] == 5
+
+    async def test_enforce_budget_on_stale_estimates(self, storage: SqlAlchemyStorage, monkeypatch):
+        worker = JanitorWorker(storage, JanitorSettings(max_transactions=3, batch_pause=0))
+        for i in range(5):
+            await self.create_transaction(storage, started_at=datetime.now(UTC) - timedelta(hours=i))
+
+        # statistics that do not reflect the deletions
+        async def estimate_row_count(*args, **kwargs):
+            return 5
+
+        monkeypatch.setattr("harp_apps.janitor.worker.estimate_row_count", estimate_row_count)
+
+        assert await worker.enforce_budget() == 2
+        assert await worker.enforce_budget() == 0
+        assert len((await storage.get_transaction_list(username="anonymous", with_messages=True)).items) == 3
+
+    async def test_enforce_blobs_size_budget_with_filesystem_backend(
+        self, storage: SqlAlchemyStorage, tmp_path, monkeypatch
+    ):
+        storage.blob_backend = storage.writer.blob_backend = FilesystemBlobBackend(tmp_path)
+        worker = JanitorWorker(storage, JanitorSettings(max_blobs_size=2000))
+
+        for i in range(3):
+            transaction = await self.create_transaction(storage, started_at=datetime.now(UTC) - timedelta(hours=i))
+            blob = BlobModel.from_data(b"%d" % i * 1000)
+            storage.writer.add_blob(blob)
+            await self.create_message(
+                storage, transaction_id=transaction.id, kind="request", summary="", headers="", body=blob.id
+            )
+        await storage.writer.flush()
+
+        # only the blob files are counted (the database rows have no data)
+        async def estimate_data_size(*args, **kwargs):
+            return 0
+
+        monkeypatch.setattr("harp_apps.janitor.worker.estimate_data_size", estimate_data_size)
+
+        assert await worker.enforce_budget() == 1
+        assert worker.budget["blobs_size"] == 3000
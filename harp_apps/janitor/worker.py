@@ -1,33 +1,91 @@
 import asyncio
+import math
+import time
+from datetime import UTC, datetime, timedelta
 from typing import cast
 
+from sqlalchemy import delete, select, text
+
 from harp import get_logger
 from harp.settings import USE_PROMETHEUS
 from harp.typing import Storage
 from harp_apps.sqlalchemy_storage.storage import SqlAlchemyStorage
 
+from ..sqlalchemy_storage.blob_backends import FilesystemBlobBackend
+from ..sqlalchemy_storage.models import Blob, Message
 from ..sqlalchemy_storage.models.base import with_session
-from .settings import OLD_AFTER, PERIOD
+from ..sqlalchemy_storage.models.blobs import count_refs
+from ..sqlalchemy_storage.models.transactions import transaction_tag_values_association_table
+from ..sqlalchemy_storage.optionals.pg_partitions import (
+    PARTITIONS_AHEAD,
+    create_partitions,
+    drop_partitions,
+    get_partition_days,
+    is_pg_partitions_installed,
+)
+from ..sqlalchemy_storage.utils.sql import estimate_data_size, estimate_row_count
+from .settings import DELETE_CHUNK_SIZE, ROLLUPS_OLD_AFTER, SQLITE_ANALYSIS_LIMIT, STRAY_FILES_MIN_AGE, JanitorSettings
 
 logger = get_logger(__name__)
 
 
 class JanitorWorker:
-    def __init__(self, storage: Storage):
+    def __init__(self, storage: Storage, settings: JanitorSettings = None):
         self.storage: SqlAlchemyStorage = cast(SqlAlchemyStorage, storage)
+        self.settings = settings or JanitorSettings()
         self.running = False
         self.session_factory = self.storage.session_factory
 
+        #: Progress of the last retention run (deleted transactions, batches, duration, and whether all old
+        #: transactions were deleted, or some were left for the next loops).
+        self.retention = {"deleted": 0, "batches": 0, "duration": 0.0, "complete": True}
+
+        #: Storage usage against the budget at the last run (estimated transactions and blobs size, and usage ratio of
+        #: the most used budget, None without budget), and transactions deleted to enforce it.
+        self.budget = {"transactions": None, "blobs_size": None, "usage": None, "deleted": 0, "batches": 0}
+
+        # estimates the budget was last enforced on (see `enforce_budget()`)
+        self._budget_enforced_on = None
+
+        #: Monotonic time of the last exact counts of stored objects (see `compute_metrics()`).
+        self.exact_counts_at = None
+
+        #: Monotonic time of the last refresh of the database statistics (see `refresh_statistics()`).
+        self.analyzed_at = None
+
+        # whether rows were deleted since the statistics were last refreshed
+        self._statistics_stale = False
+
         if USE_PROMETHEUS:
-            from prometheus_client import Gauge
+            from prometheus_client import Counter, Gauge
 
             self._prometheus = {
                 "storage.transactions": Gauge("storage_transactions", "Transactions currently in storage."),
                 "storage.messages": Gauge("storage_messages", "Messages currently in storage."),
                 "storage.blobs": Gauge("storage_blobs", "Blob objects currently in storage."),
                 "storage.blobs.orphans": Gauge("storage_blobs_orphans", "Orphan blobs currently in storage."),
+                "storage.budget": Gauge("storage_budget", "Estimated storage usage, in percent of the janitor budget."),
+                "janitor.retention.deleted": Counter(
+                    "janitor_retention_deleted", "Old transactions deleted by the janitor."
+                ),
+                "janitor.retention.duration": Gauge(
+                    "janitor_retention_duration", "Seconds spent deleting old transactions in the last janitor loop."
+                ),
+                "janitor.retention.backlog": Gauge(
+                    "janitor_retention_backlog", "Whether old transactions were left for the next janitor loops."
+                ),
+                "janitor.retention.partitions": Counter(
+                    "janitor_retention_partitions", "Old day partitions dropped by the janitor."
+                ),
+                "janitor.budget.deleted": Counter(
+                    "janitor_budget_deleted", "Transactions deleted by the janitor to enforce the storage budget."
+                ),
             }
 
+    @property
+    def old_after(self) -> timedelta:
+        return timedelta(days=self.settings.old_after)
+
     def stop(self):
         """
         Mark the loop for termination.
@@ -36,7 +94,7 @@ class JanitorWorker:
 
     async def run(self):
         """
-        Once dependencies are ready, start the main loop (basically, run the `loop()` every PERIOD seconds), until
+        Once dependencies are ready, start the main loop (basically, run the `loop()` every `period` seconds), until
         `stop()` is called.
         """
         # do not start before storage is ready
@@ -48,45 +106,357 @@ class JanitorWorker:
                 await self.loop()
             except Exception as exc:
                 logger.exception(exc)
-            await asyncio.sleep(PERIOD)
+            await asyncio.sleep(self.settings.period)
 
     async def loop(self):
         """
         One iteration of the janitor loop.
         """
 
+        # Drop old day partitions (postgresql, with the pg_partitions feature installed)
+        dropped = await self.drop_old_partitions()
+        if dropped:
+            logger.debug("🧹 Dropped %d old day partitions", dropped)
+            self._statistics_stale = True
+
         # Delete old transactions
-        result = await self.delete_old_transactions()
-        if result.rowcount:
-            logger.debug("🧹 Deleted %d old transactions", result.rowcount)
+        deleted = await self.delete_old_transactions()
+        if deleted:
+            logger.debug(
+                "🧹 Deleted %d old transactions (%s)",
+                deleted,
+                "done" if self.retention["complete"] else "more to delete in the next loops",
+            )
+            self._statistics_stale = True
+
+        # Refresh the statistics used to estimate storage usage (sqlite only)
+        await self.refresh_statistics()
+
+        # Delete the oldest transactions while over the storage budget
+        deleted = await self.enforce_budget()
+        if deleted:
+            logger.debug("🧹 Deleted %d transactions to enforce the storage budget", deleted)
+            self._statistics_stale = True
+
+        # Delete old fine-grained rollups
+        deleted = await self.delete_old_rollups()
+        if deleted:
+            logger.debug("🧹 Deleted %d old rollups", deleted)
 
         # Delete orphan blobs
-        result = await self.delete_orphan_blobs()
-        if result.rowcount:
-            logger.debug("🧹 Deleted %d orphan blobs", result.rowcount)
+        deleted = await self.delete_orphan_blobs()
+        if deleted:
+            logger.debug("🧹 Deleted %d orphan blobs", deleted)
+            self._statistics_stale = True
+
+        # Delete blob files without database rows (external blob backends only)
+        deleted = await self.delete_stray_blob_files()
+        if deleted:
+            logger.debug("🧹 Deleted %d stray blob files", deleted)
 
         # Compute and store stored objecg counts as metrics
         logger.debug("🧹 Compute and store metrics...")
         await self.compute_and_store_metrics()
 
+    async def delete_old_transactions(self):
+        """
+        Remove transactions older than `old_after` days (except flagged ones), with their messages (see
+        `delete_transactions()`).
+
+        Transactions are deleted oldest first, by batches of `batch_size`, each in its own database transaction and
+        followed by a `batch_pause` seconds pause, so that a large backlog (first run, or after an outage) does not
+        lock the table and stall ingestion. After `time_budget` seconds, the remaining old transactions are left for
+        the next loops. Returns the number of deleted transactions.
+        """
+        started_at = time.monotonic()
+        self.retention = {"deleted": 0, "batches": 0, "duration": 0.0, "complete": False}
+
+        self.retention["complete"] = await self._delete_by_batches(await self.get_rows_old_after(), self.retention)
+
+        self.retention["duration"] = time.monotonic() - started_at
+        if USE_PROMETHEUS:
+            self._prometheus["janitor.retention.deleted"].inc(self.retention["deleted"])
+            self._prometheus["janitor.retention.duration"].set(self.retention["duration"])
+            self._prometheus["janitor.retention.backlog"].set(0 if self.retention["complete"] else 1)
+
+        return self.retention["deleted"]
+
+    async def enforce_budget(self):
+        """
+        Remove the oldest transactions (except flagged ones) while the storage is over budget (`max_transactions`
+        transactions, or `max_blobs_size` bytes of blobs), with their messages (see `delete_transactions()`). The
+        usage is estimated (see `get_budget_usage()`), and transactions are deleted by batches, as old transactions
+        are. For the blobs size, the number of deleted transactions is proportional to the excess, and the blobs are
+        actually deleted once orphaned (see `delete_orphan_blobs()`), so the usage converges over the next runs.
+        Returns the number of deleted transactions.
+
+        Database statistics do not always reflect deletions right away (cached or refreshed from time to time on
+        mysql, updated by ``ANALYZE`` on sqlite, allocated space that is reused but not released ...). Nothing is
+        deleted while the estimates are still the ones the budget was last enforced on, as deleting the same excess
+        again would eventually delete everything.
+        """
+        self.budget = {**(await self.get_budget_usage()), "deleted": 0, "batches": 0}
+        if self.budget["usage"] is None:
+            return 0
+
+        transactions, blobs_size = self.budget["transactions"], self.budget["blobs_size"]
+        excess = 0
+        if self.settings.max_transactions:
+            excess = transactions - self.settings.max_transactions
+        if self.settings.max_blobs_size and blobs_size > self.settings.max_blobs_size:
+            excess = max(excess, math.ceil(transactions * (blobs_size - self.settings.max_blobs_size) / blobs_size))
+
+        if excess <= 0:
+            logger.debug("🧹 Storage budget usage: %d%%", self.budget["usage"] * 100)
+            return 0
+
+        if (transactions, blobs_size) == self._budget_enforced_on:
+            logger.debug(
+                "🧹 Storage budget usage: %d%% (estimates not updated since the last deletions, waiting)",
+                self.budget["usage"] * 100,
+            )
+            return 0
+
+        logger.warning(
+            "🧹 Storage budget exceeded (%d%%, %d transactions, %d bytes of blobs), deleting the %d oldest transactions",
+            self.budget["usage"] * 100,
+            transactions,
+            blobs_size or 0,
+            excess,
+        )
+        await self._delete_by_batches(timedelta(0), self.budget, limit=excess)
+        self._budget_enforced_on = (transactions, blobs_size)
+        if USE_PROMETHEUS:
+            self._prometheus["janitor.budget.deleted"].inc(self.budget["deleted"])
+        return self.budget["deleted"]
+
+    async def refresh_statistics(self) -> bool:
+        """
+        Sqlite only updates the table statistics used to estimate row counts (see `do_count()`) when running
+        ``ANALYZE``, so it is run by the janitor when rows were deleted since the last refresh, and otherwise at most
+        every `exact_counts_period` seconds. It examines about `SQLITE_ANALYSIS_LIMIT` rows by index so that it stays
+        cheap on large tables (other databases maintain their statistics). Returns whether statistics were refreshed.
+        """
+        if self.storage.engine.dialect.name != "sqlite":
+            return False
+
+        if (
+            not self._statistics_stale
+            and self.analyzed_at is not None
+            and time.monotonic() - self.analyzed_at < self.settings.exact_counts_period
+        ):
+            return False
+
+        async with self.session_factory() as session:
+            await session.execute(text(f"PRAGMA analysis_limit = {SQLITE_ANALYSIS_LIMIT}"))
+            await session.execute(text("ANALYZE"))
+            await session.commit()
+
+        self.analyzed_at = time.monotonic()
+        self._statistics_stale = False
+        return True
+
+    async def get_budget_usage(self) -> dict:
+        """
+        Estimates the number of transactions, and the size of blobs (only if limited), from the database statistics
+        rather than counting (see :func:`estimate_row_count
+        <harp_apps.sqlalchemy_storage.utils.sql.estimate_row_count>` and :func:`estimate_data_size
+        <harp_apps.sqlalchemy_storage.utils.sql.estimate_data_size>`), with the usage ratio of the most used budget
+        (None without budget). With an external blob backend, the size of the stored files is added to the blobs size.
+        """
+        usage = {"transactions": None, "blobs_size": None, "usage": None}
+        if not (self.settings.max_transactions or self.settings.max_blobs_size):
+            return usage
+
+        async with self.session_factory() as session:
+            usage["transactions"] = transactions = await self.do_count(session, "transactions", estimate=True)
+            if self.settings.max_blobs_size:
+                usage["blobs_size"] = await estimate_data_size(
+                    session, "blobs", "data", dialect_name=self.storage.engine.dialect.name
+                )
+                if self.storage.blob_backend.external:
+                    usage["blobs_size"] += await self.storage.blob_backend.get_size()
+
+        usage["usage"] = max(
+            transactions / self.settings.max_transactions if self.settings.max_transactions else 0.0,
+            usage["blobs_size"] / self.settings.max_blobs_size if self.settings.max_blobs_size else 0.0,
+        )
+        return usage
+
+    async def _delete_by_batches(self, old_after: timedelta, progress: dict, /, *, limit=None) -> bool:
+        """
+        Delete unflagged transactions older than `old_after`, oldest first and at most `limit`, by batches of
+        `batch_size` (each in its own database transaction, followed by a `batch_pause` seconds pause), for at most
+        `time_budget` seconds. Counts are added to `progress`. Returns whether all the matching transactions were
+        deleted.
+        """
+        started_at = time.monotonic()
+        while True:
+            batch_size = self.settings.batch_size
+            if limit is not None:
+                batch_size = min(batch_size, limit - progress["deleted"])
+
+            async with self.session_factory() as session:
+                # rows are locked until the batch is deleted, so they cannot be flagged in the meantime
+                query = self.storage.transactions.find_old(old_after, limit=batch_size)
+                ids = (await session.execute(query.with_for_update())).scalars().all()
+                if ids:
+                    progress["deleted"] += await self.delete_transactions(
+                        session, self.storage.transactions.delete_old(old_after, ids=ids), ids
+                    )
+                    progress["batches"] += 1
+                    await session.commit()
+
+            if len(ids) < batch_size or (limit is not None and progress["deleted"] >= limit):
+                return True
+
+            if time.monotonic() - started_at >= self.settings.time_budget:
+                return False
+
+            await asyncio.sleep(self.settings.batch_pause)
+
+    async def get_rows_old_after(self) -> timedelta:
+        """
+        Age after which transactions are deleted row by row. With day partitions, rows of the days that still have a
+        partition are left to `drop_old_partitions()`, so only the rows stored in the default partition (older days,
+        or flagged transactions that were unflagged since) are deleted row by row.
+        """
+        if not await self._has_partitions():
+            return self.old_after
+
+        async with self.session_factory() as session:
+            days = await get_partition_days(session)
+        if not days:
+            return self.old_after
+        oldest = datetime.combine(days[0], datetime.min.time(), tzinfo=UTC)
+        return max(self.old_after, datetime.now(UTC) - oldest)
+
+    async def drop_old_partitions(self):
+        """
+        With the pg_partitions feature installed, create the partitions of the upcoming days, and drop the day
+        partitions that only contain transactions older than `old_after` days, one day per database transaction.
+        Flagged transactions (with their messages and tags) are moved to the default partitions, and the reference
+        counts of the blobs of the dropped messages are decremented. Returns the number of dropped days.
+        """
+        if not await self._has_partitions():
+            return 0
+
+        today = datetime.now(UTC).date()
+        async with self.session_factory() as session:
+            await create_partitions(session, (today + timedelta(days=i) for i in range(PARTITIONS_AHEAD + 1)))
+            await session.commit()
+            days = await get_partition_days(session)
+
+        # a day partition is dropped once its whole day is old
+        threshold = datetime.now(UTC) - self.old_after - timedelta(days=1)
+        old_days = [day for day in days if datetime.combine(day, datetime.min.time(), tzinfo=UTC) <= threshold]
+        for day in old_days:
+            async with self.session_factory() as session:
+                await drop_partitions(session, day)
+                await session.commit()
+            if USE_PROMETHEUS:
+                self._prometheus["janitor.retention.partitions"].inc()
+        return len(old_days)
+
+    async def _has_partitions(self) -> bool:
+        if self.storage.engine.dialect.name != "postgresql":
+            return False
+        async with self.session_factory() as session:
+            return await is_pg_partitions_installed(session)
+
+    async def delete_transactions(self, session, query, ids) -> int:
+        """
+        Delete transactions using the given delete statement, for transactions among `ids` (that should be locked in
+        the session's transaction), with their messages and tags. Messages are deleted explicitly (the foreign keys
+        would cascade on most databases, but not on sqlite, nor on partitioned tables), so that the reference counts of
+        their blobs can be decremented, and blobs without references anymore are deleted by `delete_orphan_blobs()`.
+        Returns the number of deleted transactions.
+        """
+        refs = count_refs((await session.execute(self.storage.messages.find_blob_refs(ids))).all(), sign=-1)
+        await session.execute(delete(Message).where(Message.transaction_id.in_(ids)))
+        await session.execute(
+            delete(transaction_tag_values_association_table).where(
+                transaction_tag_values_association_table.c.transaction_id.in_(ids)
+            )
+        )
+        if refs:
+            await session.execute(self.storage.blobs.update_refs(), refs)
+        return (await session.execute(query)).rowcount
+
     @with_session
-    async def delete_old_transactions(self, /, *, session):
+    async def delete_old_rollups(self, /, *, session):
         """
-        Remove transactions older than OLD_AFTER days. On correct database implementations (postgresql for example), it
-        will cascade to related objects. On sqlite, there will be garbage left, but it's not a big deal.
+        Remove minute and hour rollups (and latency sketches) older than their retention period (see
+        ROLLUPS_OLD_AFTER). Rollups are not removed with the transactions they were computed from, so the overview
+        keeps the whole history.
         """
-        result = await session.execute(self.storage.transactions.delete_old(OLD_AFTER))
+        deleted = 0
+        for time_bucket, old_after in ROLLUPS_OLD_AFTER.items():
+            deleted += (await session.execute(self.storage.rollups.delete_old(time_bucket, old_after))).rowcount
+            await session.execute(self.storage.rollups.delete_old(time_bucket, old_after, latency=True))
         await session.commit()
-        return result
+        return deleted
 
     @with_session
     async def delete_orphan_blobs(self, /, *, session):
         """
-        Find and remove blobs that are not referenced anymore by any transaction.
+        Find and remove blobs that are not referenced anymore by any message (using their reference counts, without
+        scanning the messages). With an external blob backend, the data is removed too, once the rows are deleted.
+        Returns the number of deleted blobs.
         """
-        result = await session.execute(self.storage.blobs.delete_orphans())
+        blob_ids = (await session.execute(self.storage.blobs.find_orphans())).scalars().all()
+
+        # forget them as written before deleting them, so the writer does not skip them if they are seen again
+        written_blobs = self.storage.writer.written_blobs
+        for blob_id in blob_ids:
+            written_blobs.pop(blob_id, None)
+
+        deleted = 0
+        for i in range(0, len(blob_ids), DELETE_CHUNK_SIZE):
+            result = await session.execute(self.storage.blobs.delete_orphans(blob_ids[i : i + DELETE_CHUNK_SIZE]))
+            deleted += result.rowcount
         await session.commit()
-        return result
+
+        if not self.storage.blob_backend.external:
+            return deleted
+
+        # blobs referenced again since they were found are kept
+        kept = set()
+        for i in range(0, len(blob_ids), DELETE_CHUNK_SIZE):
+            chunk = blob_ids[i : i + DELETE_CHUNK_SIZE]
+            kept.update((await session.execute(select(Blob.id).where(Blob.id.in_(chunk)))).scalars())
+        blob_ids = [blob_id for blob_id in blob_ids if blob_id not in kept]
+
+        await self.storage.blob_backend.delete_many(blob_ids)
+        return len(blob_ids)
+
+    @with_session
+    async def delete_stray_blob_files(self, /, *, session):
+        """
+        Remove the files of an external blob backend that have no matching row (for example, written by a batch that
+        failed to be committed), or whose row references another version of the data (codec and dictionary). Recent
+        files are kept, as their rows may not be committed yet.
+        """
+        backend = self.storage.blob_backend
+        if not isinstance(backend, FilesystemBlobBackend):
+            return 0
+
+        deleted = 0
+        files = list(backend.iter_files(older_than=STRAY_FILES_MIN_AGE))
+        for i in range(0, len(files), DELETE_CHUNK_SIZE):
+            chunk = files[i : i + DELETE_CHUNK_SIZE]
+            existing = set(
+                tuple(row)
+                for row in await session.execute(
+                    select(Blob.id, Blob.codec, Blob.dictionary_id).where(
+                        Blob.id.in_({blob_id for blob_id, _, _ in chunk})
+                    )
+                )
+            )
+            stray = [file for file in chunk if file not in existing]
+            await backend.delete_files(stray)
+            deleted += len(stray)
+        return deleted
 
     @with_session
     async def compute_and_store_metrics(self, /, *, session):
@@ -96,12 +466,25 @@ class JanitorWorker:
         await self.storage.metrics.insert_values(await self.compute_metrics(session))
 
     async def compute_metrics(self, session):
+        """
+        Compute counts of objects in storage. Transactions, messages and blobs are estimated from the database
+        statistics (see :func:`estimate_row_count <harp_apps.sqlalchemy_storage.utils.sql.estimate_row_count>`), unless
+        `exact_counts` is enabled and the last exact counts are older than `exact_counts_period` seconds. Orphan blobs
+        are always counted, using the index on blob reference counts.
+        """
+        exact = self.settings.exact_counts and (
+            self.exact_counts_at is None or time.monotonic() - self.exact_counts_at >= self.settings.exact_counts_period
+        )
         values = {
-            "storage.transactions": await self.do_count(session, "transactions"),
-            "storage.messages": await self.do_count(session, "messages"),
-            "storage.blobs": await self.do_count(session, "blobs"),
+            "storage.transactions": await self.do_count(session, "transactions", estimate=not exact),
+            "storage.messages": await self.do_count(session, "messages", estimate=not exact),
+            "storage.blobs": await self.do_count(session, "blobs", estimate=not exact),
             "storage.blobs.orphans": await self.do_count(session, "blobs", method="count_orphans"),
         }
+        if exact:
+            self.exact_counts_at = time.monotonic()
+        if self.budget["usage"] is not None:
+            values["storage.budget"] = round(self.budget["usage"] * 100)
 
         if USE_PROMETHEUS:
             for key, value in values.items():
@@ -109,7 +492,7 @@ class JanitorWorker:
 
         return values
 
-    async def do_count(self, session, name: str, /, *, method="count"):
+    async def do_count(self, session, name: str, /, *, method="count", estimate=False):
         """
         Helper to count objects in storage, from different repositories and using different methods for building the
         actual query.
@@ -117,8 +500,19 @@ class JanitorWorker:
         :param session: sqlalchemy async session
         :param name: repository name (should be available from storage)
         :param method: method name to call on the repository to get the actual sqlalchemy query, default as "count"
+        :param estimate: estimate the row count of the repository's table from the database statistics instead, if
+            available (only for the "count" method)
         :return: integer
         """
+        if estimate and method == "count":
+            value = await estimate_row_count(
+                session,
+                getattr(self.storage, name).Type.__tablename__,
+                dialect_name=self.storage.engine.dialect.name,
+            )
+            if value is not None:
+                return value
+
         return (
             await session.execute(
                 getattr(
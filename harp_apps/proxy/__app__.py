@@ -34,5 +34,9 @@ class ProxyApplication(Application):
                     name=endpoint.name,
                     dispatcher=event.dispatcher,
                     http_client=event.provider.get(AsyncClient),
+                    stream_requests=endpoint.stream_requests,
+                    stream_responses=endpoint.stream_responses,
+                    capture=endpoint.capture,
+                    dispatch_after_response=endpoint.dispatch_after_response,
                 ),
             )
@@ -1,8 +1,10 @@
+import asyncio
 import time
 from datetime import UTC, datetime
 from functools import cached_property
 from typing import Optional
 from urllib.parse import urlencode, urljoin, urlparse
+from weakref import WeakValueDictionary
 
 import httpx
 from hishel._headers import parse_cache_control
@@ -10,8 +12,8 @@ from httpx import AsyncClient, codes
 from whistle import IAsyncEventDispatcher
 
 from harp import __parsed_version__, get_logger
-from harp.asgi.events import MessageEvent, TransactionEvent
-from harp.http import BaseHttpMessage, HttpError, HttpRequest, HttpResponse
+from harp.asgi.events import EVENT_CORE_TERMINATE, MessageEvent, TerminateEvent, TransactionEvent
+from harp.http import BaseHttpMessage, HttpError, HttpRequest, HttpResponse, HttpStreamingResponse
 from harp.http.requests import WrappedHttpRequest
 from harp.models import Transaction
 from harp.settings import USE_PROMETHEUS
@@ -19,9 +21,12 @@ from harp.utils.guids import generate_transaction_id_ksuid
 from harp.utils.tpdex import tpdex
 
 from .events import EVENT_TRANSACTION_ENDED, EVENT_TRANSACTION_MESSAGE, EVENT_TRANSACTION_STARTED
+from .settings import ProxyEndpointCaptureSetting
 
 logger = get_logger(__name__)
 
+DEFERRED_EVENTS_CONTEXT_KEY = "proxy.deferred_events"
+
 _prometheus = None
 if USE_PROMETHEUS:
     from prometheus_client import Counter, Histogram
@@ -33,6 +38,39 @@ if USE_PROMETHEUS:
     }
 
 
+class DeferredEventDispatcher:
+    """
+    Holds the events dispatched for one transaction until released (once the response has been sent to the client),
+    then dispatches them in order. Events dispatched after release are dispatched immediately, still in order.
+
+    """
+
+    def __init__(self, dispatcher: IAsyncEventDispatcher):
+        self._dispatcher = dispatcher
+        self._pending = []
+        self._released = False
+        self._lock = asyncio.Lock()
+
+    async def adispatch(self, event_id, event=None):
+        if not self._released:
+            self._pending.append((event_id, event))
+            return event
+
+        async with self._lock:
+            return await self._dispatcher.adispatch(event_id, event)
+
+    async def release(self):
+        async with self._lock:
+            self._released = True
+            while self._pending:
+                event_id, event = self._pending.pop(0)
+                try:
+                    await self._dispatcher.adispatch(event_id, event)
+                except Exception:
+                    # one failing listener must not prevent the next events of the transaction to go through
+                    logger.exception(f"Error while dispatching deferred {event_id} event.")
+
+
 class HttpProxyController:
     name: str = None
     """Controller name, also refered as endpoint name (for example in
@@ -47,18 +85,64 @@ class HttpProxyController:
     url: str
     """Base URL to proxy requests to."""
 
+    stream_requests: bool = False
+    """Forward request bodies chunk by chunk, as they are received, instead of buffering them before sending the
+    upstream request. A copy of the body is still kept for the request message event, which is dispatched once the
+    body went through."""
+
+    stream_responses: bool = False
+    """Send response bodies to the client chunk by chunk, as they are received from the remote endpoint, instead of
+    buffering them first. The transaction is ended (and the response message dispatched, with a complete copy of the
+    body) once the whole body went through."""
+
+    capture: Optional[ProxyEndpointCaptureSetting] = None
+    """Capture policy for message bodies, telling how much of them (and which content types) should be captured by the
+    message event listeners (storage, ...). Bodies are always forwarded entirely."""
+
+    dispatch_after_response: bool = False
+    """Hold the transaction events (started, messages, ended) until the response has been sent to the client, so that
+    the listeners (storage, ...) do not add latency to the proxied requests. Events are still dispatched in order for
+    each transaction."""
+
     @cached_property
     def dispatcher(self):
         """Read-only reference to the event dispatcher."""
         return self._dispatcher
 
-    def __init__(self, url, *, http_client: AsyncClient, dispatcher=None, name=None, logging=True):
+    def __init__(
+        self,
+        url,
+        *,
+        http_client: AsyncClient,
+        dispatcher=None,
+        name=None,
+        logging=True,
+        stream_requests=None,
+        stream_responses=None,
+        capture=None,
+        dispatch_after_response=None,
+    ):
         self.http_client = http_client
         self.url = url or self.url
         self.name = name or self.name
+        self.stream_requests = self.stream_requests if stream_requests is None else stream_requests
+        self.stream_responses = self.stream_responses if stream_responses is None else stream_responses
+        self.capture = capture or self.capture
+        self.dispatch_after_response = (
+            self.dispatch_after_response if dispatch_after_response is None else dispatch_after_response
+        )
         self._logging = logging
         self._dispatcher = dispatcher or self._dispatcher
 
+        # keep references to the transactions being ended in the background, so they're not garbage collected
+        self._background_tasks = set()
+
+        # deferred dispatchers of the transactions in progress, they're referenced by the request (until the response
+        # is sent) and by the controller (until the transaction ends)
+        self._deferred_dispatchers = WeakValueDictionary()
+        if self.dispatch_after_response and self._dispatcher:
+            self._dispatcher.add_listener(EVENT_CORE_TERMINATE, self._on_terminate)
+
         self.parsed_url = urlparse(self.url)
 
         # we only expose minimal information about the exact version
@@ -75,7 +159,9 @@ class HttpProxyController:
         :return: :class:`IEvent <whistle.IEvent>` or None
         """
         if self._dispatcher:
-            return await self._dispatcher.adispatch(event_id, event)
+            transaction = getattr(event, "transaction", None)
+            dispatcher = self._deferred_dispatchers.get(transaction.id) if transaction else None
+            return await (dispatcher or self._dispatcher).adispatch(event_id, event)
 
     def debug(self, message, *args, **kwargs):
         if not self._logging:
@@ -113,19 +199,43 @@ class HttpProxyController:
             request,
             tags=self._extract_tags_from_request(request),
         )
-        await request.join()
+
+        streaming = self._should_stream_request_body(request)
+        if streaming:
+            # chunks are forwarded as they come, the request keeps a copy (bounded by the capture policy) for the
+            # message event that will be dispatched once the body went through.
+            content = request.stream(
+                max_body_size=self._get_max_captured_body_size(request.headers.get("content-type"))
+            )
+        else:
+            await request.join()
+            # dispatch message event for request
+            await self.adispatch(EVENT_TRANSACTION_MESSAGE, self._create_message_event(transaction, request))
+            content = request.body
+
         url = urljoin(self.url, request.path) + (f"?{urlencode(request.query)}" if request.query else "")
 
         # PROXY REQUEST
         p_request: httpx.Request = self.http_client.build_request(
-            request.method, url, headers=list(request.headers.items()), content=request.body
+            request.method, url, headers=list(request.headers.items()), content=content
         )
-        self.debug(f"▶▶ {request.method} {url}", transaction=transaction)
+        self.debug(f"▶▶ {request.method} {url}{' (streaming)' if streaming else ''}", transaction=transaction)
 
         # PROXY RESPONSE
         before_forward_time = time.perf_counter()
         try:
-            p_response: httpx.Response = await self.http_client.send(p_request)
+            try:
+                p_response: httpx.Response = await self.http_client.send(p_request, stream=self.stream_responses)
+            except Exception:
+                if streaming:
+                    # the request message is still recorded if possible, without masking the remote error.
+                    try:
+                        await self._dispatch_streamed_request_message(transaction, request)
+                    except Exception:
+                        logger.exception("Error while reading the rest of a streamed request body.")
+                raise
+            if streaming:
+                await self._dispatch_streamed_request_message(transaction, request)
         except httpx.ConnectError as exc:
             if _prometheus:
                 _prometheus["time.forward"].labels(*prometheus_labels).observe(
@@ -150,16 +260,21 @@ class HttpProxyController:
         if _prometheus:
             _prometheus["time.forward"].labels(*prometheus_labels).observe(time.perf_counter() - before_forward_time)
 
+        # elapsed time is only known once the body has been read, which is not the case yet for streamed responses.
         self.debug(
-            f"◀◀ {p_response.status_code} {p_response.reason_phrase} ({p_response.elapsed.total_seconds()}s)",
+            f"◀◀ {p_response.status_code} {p_response.reason_phrase} "
+            + ("(streaming)" if self.stream_responses else f"({p_response.elapsed.total_seconds()}s)"),
             transaction=transaction,
         )
 
         response_status = p_response.status_code
+        # raw streams are forwarded untouched, so their framing headers are still valid.
+        stream_raw = self.stream_responses and "content-encoding" not in p_response.headers
         response_headers = {
             k: v
             for k, v in p_response.headers.multi_items()
-            if k.lower() not in ("server", "date", "content-encoding", "content-length")
+            if k.lower() not in ("server", "date")
+            and (stream_raw or k.lower() not in ("content-encoding", "content-length"))
         }
         # XXX for now, we use transaction "extras" to store searchable data for later
         transaction.extras["status_class"] = f"{response_status // 100}xx"
@@ -167,9 +282,21 @@ class HttpProxyController:
         if p_response.extensions.get("from_cache"):
             transaction.extras["cached"] = p_response.extensions.get("cache_metadata", {}).get("cache_key", True)
 
-        response = HttpResponse(p_response.content, status=response_status, headers=response_headers)
-
-        await self.end_transaction(transaction, response)
+        if self.stream_responses:
+            response = HttpStreamingResponse(
+                p_response.aiter_raw() if stream_raw else p_response.aiter_bytes(),
+                status=response_status,
+                headers=response_headers,
+                close=p_response.aclose,
+                max_body_size=self._get_max_captured_body_size(p_response.headers.get("content-type")),
+            )
+            # the body will be sent by the caller, once we return, so the transaction can only end afterward.
+            task = asyncio.create_task(self._end_transaction_once_streamed(transaction, response))
+            self._background_tasks.add(task)
+            task.add_done_callback(self._background_tasks.discard)
+        else:
+            response = HttpResponse(p_response.content, status=response_status, headers=response_headers)
+            await self.end_transaction(transaction, response)
 
         if _prometheus:
             _prometheus["time.full"].labels(*prometheus_labels).observe(
@@ -196,12 +323,30 @@ class HttpProxyController:
         else:
             transaction.tpdex = tpdex(transaction.elapsed)
 
-        # dispatch message event for response
-        # TODO delay after response is sent ?
-        await self.adispatch(EVENT_TRANSACTION_MESSAGE, MessageEvent(transaction, response))
-        # dispatch transaction ended event
-        # TODO delay after response is sent ?
+        # dispatch message event for response (may be deferred, see dispatch_after_response)
+        await self.adispatch(EVENT_TRANSACTION_MESSAGE, self._create_message_event(transaction, response))
+        # dispatch transaction ended event (may be deferred, see dispatch_after_response)
         await self.adispatch(EVENT_TRANSACTION_ENDED, TransactionEvent(transaction))
+        self._deferred_dispatchers.pop(transaction.id, None)
+
+    def _get_max_captured_body_size(self, content_type):
+        return self.capture.get_max_body_size(content_type) if self.capture else None
+
+    def _create_message_event(self, transaction, message: BaseHttpMessage):
+        if isinstance(message, HttpError):
+            return MessageEvent(transaction, message)
+        return MessageEvent(
+            transaction, message, max_body_size=self._get_max_captured_body_size(message.headers.get("content-type"))
+        )
+
+    async def _dispatch_streamed_request_message(self, transaction, request: HttpRequest):
+        # the remote may answer (or fail) before reading the whole body, we still want all of it.
+        await request.join()
+        await self.adispatch(EVENT_TRANSACTION_MESSAGE, self._create_message_event(transaction, request))
+
+    async def _end_transaction_once_streamed(self, transaction, response: HttpStreamingResponse):
+        await response.join()
+        await self.end_transaction(transaction, response)
 
     async def _create_transaction_from_request(self, request: HttpRequest, *, tags=None):
         transaction = Transaction(
@@ -224,15 +369,29 @@ class HttpProxyController:
 
         self.debug(f"▶ {request.method} {request.path}", transaction=transaction)
 
-        # dispatch transaction started event
-        # we don't really want to await this, should run in background ? or use an async queue ?
-        await self.adispatch(EVENT_TRANSACTION_STARTED, TransactionEvent(transaction))
+        if self.dispatch_after_response and self._dispatcher:
+            deferred = DeferredEventDispatcher(self._dispatcher)
+            request.context[DEFERRED_EVENTS_CONTEXT_KEY] = deferred
+            self._deferred_dispatchers[transaction.id] = deferred
 
-        # dispatch message event for request
-        await self.adispatch(EVENT_TRANSACTION_MESSAGE, MessageEvent(transaction, request))
+        # dispatch transaction started event (may be deferred, see dispatch_after_response)
+        await self.adispatch(EVENT_TRANSACTION_STARTED, TransactionEvent(transaction))
 
         return transaction
 
+    async def _on_terminate(self, event: TerminateEvent):
+        """Once the response is sent, releases the events held for the request's transaction, if any."""
+        deferred = event.request.context.pop(DEFERRED_EVENTS_CONTEXT_KEY, None)
+        if deferred:
+            await deferred.release()
+
+    def _should_stream_request_body(self, request: HttpRequest):
+        """
+        Only stream requests that announce a body, so that body-less requests (GET, HEAD, ...) are not turned into
+        chunked ones by the http client.
+        """
+        return self.stream_requests and ("content-length" in request.headers or "transfer-encoding" in request.headers)
+
     def _extract_tags_from_request(self, request: WrappedHttpRequest):
         """
         Convert special request headers (x-harp-*) into tags (key-value pairs) that we'll attach to the
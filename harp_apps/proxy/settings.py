@@ -1,6 +1,49 @@
+from dataclasses import field
+from fnmatch import fnmatch
 from typing import Optional
 
 from harp.config.settings.base import BaseSetting, settings_dataclass
+from harp.utils.env import cast_bool
+
+
+@settings_dataclass
+class ProxyEndpointCaptureSetting(BaseSetting):
+    """Defines what part of the message bodies going through an endpoint are captured (for storage, ...). Whatever
+    the capture policy is, bodies are always forwarded entirely."""
+
+    #: Maximum number of body bytes to capture, larger bodies are truncated (and their original size recorded).
+    max_body_size: Optional[int] = None
+
+    #: If set, only bodies with a content type matching one of these patterns (for example "application/*") are
+    #: captured.
+    content_types: Optional[list[str]] = None
+
+    #: Bodies with a content type matching one of these patterns are not captured.
+    exclude_content_types: Optional[list[str]] = None
+
+    def __post_init__(self):
+        super().__post_init__()
+        if self.max_body_size is not None:
+            self.max_body_size = int(self.max_body_size)
+
+    def accepts(self, content_type: Optional[str]) -> bool:
+        content_type = (content_type or "").split(";", 1)[0].strip().lower()
+        if self.content_types is not None and not any(
+            fnmatch(content_type, pattern.lower()) for pattern in self.content_types
+        ):
+            return False
+        if self.exclude_content_types and any(
+            fnmatch(content_type, pattern.lower()) for pattern in self.exclude_content_types
+        ):
+            return False
+        return True
+
+    def get_max_body_size(self, content_type: Optional[str]) -> Optional[int]:
+        """Returns the maximum number of body bytes to capture for a given content type, zero meaning nothing and
+        None meaning everything."""
+        if not self.accepts(content_type):
+            return 0
+        return self.max_body_size
 
 
 @settings_dataclass
@@ -11,6 +54,30 @@ class ProxyEndpointSetting(BaseSetting):
 
     description: Optional[str] = None
 
+    #: Forward request bodies to the remote endpoint as they are received, instead of buffering them first.
+    stream_requests: bool = False
+
+    #: Forward response bodies to the client as they are received, instead of buffering them first.
+    stream_responses: bool = False
+
+    #: Dispatch transaction events (used by storage, ...) once the response has been sent, instead of before.
+    dispatch_after_response: bool = False
+
+    #: Capture policy for message bodies (size cap, content types).
+    capture: ProxyEndpointCaptureSetting = field(default_factory=ProxyEndpointCaptureSetting)
+
+    def __post_init__(self):
+        super().__post_init__()
+        self.stream_requests = cast_bool(self.stream_requests)
+        self.stream_responses = cast_bool(self.stream_responses)
+        self.dispatch_after_response = cast_bool(self.dispatch_after_response)
+
+        if self.capture is None:
+            self.capture = ProxyEndpointCaptureSetting()
+
+        if isinstance(self.capture, dict):
+            self.capture = ProxyEndpointCaptureSetting(**self.capture)
+
 
 @settings_dataclass
 class ProxySettings(BaseSetting):
@@ -1,17 +1,22 @@
+import asyncio
 from unittest.mock import ANY, AsyncMock, patch
 
 import pytest
 import respx
-from httpx import AsyncClient, Response
+from httpx import AsyncClient, ConnectError, Response
 from whistle import AsyncEventDispatcher
 
+from harp.asgi.events import EVENT_CORE_TERMINATE, MessageEvent, TerminateEvent
+from harp.http import HttpRequest, HttpStreamingResponse
+from harp.http.tests.stubs import HttpRequestStubBridge
 from harp.utils.bytes import ensure_bytes
 from harp.utils.testing.mixins import ControllerTestFixtureMixin
 from harp_apps.sqlalchemy_storage.storage import SqlAlchemyStorage
 from harp_apps.sqlalchemy_storage.utils.testing.mixins import SqlalchemyStorageTestFixtureMixin
 
 from ..controllers import HttpProxyController
-from ..events import EVENT_TRANSACTION_STARTED
+from ..events import EVENT_TRANSACTION_ENDED, EVENT_TRANSACTION_MESSAGE, EVENT_TRANSACTION_STARTED
+from ..settings import ProxyEndpointCaptureSetting
 
 
 class DispatcherTestFixtureMixin:
@@ -85,6 +90,148 @@ class TestHttpProxyController(HttpProxyControllerTestFixtureMixin, DispatcherTes
         assert response.headers == {}
         assert response.body == b"Hello."
 
+    @respx.mock
+    async def test_post_streamed(self, dispatcher: AsyncEventDispatcher):
+        endpoint = respx.post("http://example.com/").mock(return_value=Response(200, content=b"Thanks."))
+
+        # register a mock handler to inspect the dispatched messages
+        transaction_message_handler = AsyncMock()
+        dispatcher.add_listener(EVENT_TRANSACTION_MESSAGE, transaction_message_handler)
+
+        request = HttpRequest(
+            HttpRequestStubBridge(method="POST", headers={"content-length": "9"}, body=[b"foo", b"bar", b"baz"])
+        )
+        response = await self.create_controller("http://example.com/", dispatcher=dispatcher, stream_requests=True)(
+            request
+        )
+
+        # the remote endpoint got the full body, without the proxy buffering it first
+        assert endpoint.called and endpoint.call_count == 1
+        assert endpoint.calls[0].request.headers["content-length"] == "9"
+        assert endpoint.calls[0].request.content == b"foobarbaz"
+
+        # the request message was dispatched once streamed, with a complete copy of the body
+        assert transaction_message_handler.call_count == 2
+        assert transaction_message_handler.call_args_list[0].args[0].message.kind == "request"
+        assert transaction_message_handler.call_args_list[0].args[0].message.body == b"foobarbaz"
+
+        assert response.status == 200
+        assert response.body == b"Thanks."
+
+    @respx.mock
+    async def test_post_streamed_keeps_remote_error(self, dispatcher: AsyncEventDispatcher):
+        respx.post("http://example.com/").mock(side_effect=ConnectError("Connection refused"))
+
+        request = HttpRequest(
+            HttpRequestStubBridge(method="POST", headers={"content-length": "9"}, body=[b"foo", b"bar", b"baz"])
+        )
+        controller = self.create_controller("http://example.com/", dispatcher=dispatcher, stream_requests=True)
+
+        # reading the rest of the body fails too (client gone ...), the remote error is still the one handled
+        with patch.object(request, "join", AsyncMock(side_effect=OSError("Client disconnected"))):
+            response = await controller(request)
+
+        assert response.status == 503
+
+    @respx.mock
+    async def test_get_is_not_streamed(self):
+        endpoint = self.mock_http_endpoint("http://example.com/", content="Hello.")
+        request, response = await self.call_controller(
+            self.create_controller("http://example.com/", stream_requests=True)
+        )
+
+        # body-less requests must not be turned into chunked ones
+        assert endpoint.called and endpoint.call_count == 1
+        assert "transfer-encoding" not in endpoint.calls[0].request.headers
+        assert response.status == 200
+
+    @respx.mock
+    async def test_get_streamed(self, dispatcher: AsyncEventDispatcher):
+        self.mock_http_endpoint("http://example.com/", content="Hello, world.")
+
+        transaction_message_handler = AsyncMock()
+        dispatcher.add_listener(EVENT_TRANSACTION_MESSAGE, transaction_message_handler)
+
+        request, response = await self.call_controller(
+            self.create_controller("http://example.com/", dispatcher=dispatcher, stream_responses=True)
+        )
+
+        # the response is returned before its body went through, so it is not dispatched yet
+        assert isinstance(response, HttpStreamingResponse)
+        assert response.status == 200
+        assert response.headers == {"content-length": "13"}
+        assert transaction_message_handler.call_count == 1
+
+        assert b"".join([chunk async for chunk in response.stream()]) == b"Hello, world."
+        await asyncio.wait_for(response.join(), 1)
+        await asyncio.sleep(0)
+
+        # once sent, the response message is dispatched with a complete copy of the body
+        assert transaction_message_handler.call_count == 2
+        assert transaction_message_handler.call_args_list[1].args[0].message.kind == "response"
+        assert transaction_message_handler.call_args_list[1].args[0].message.body == b"Hello, world."
+
+    @respx.mock
+    async def test_dispatch_after_response(self, dispatcher: AsyncEventDispatcher):
+        self.mock_http_endpoint("http://example.com/", content="Hello.")
+
+        dispatched = []
+
+        async def on_transaction_event(event):
+            # listeners may be slow, the next events of the transaction must wait for them
+            await asyncio.sleep(0.01)
+            dispatched.append((event.name, event.message.kind if isinstance(event, MessageEvent) else None))
+
+        for event_id in (EVENT_TRANSACTION_STARTED, EVENT_TRANSACTION_MESSAGE, EVENT_TRANSACTION_ENDED):
+            dispatcher.add_listener(event_id, on_transaction_event)
+
+        request, response = await self.call_controller(
+            self.create_controller("http://example.com/", dispatcher=dispatcher, dispatch_after_response=True)
+        )
+
+        # nothing is dispatched before the response is sent
+        assert response.body == b"Hello."
+        assert dispatched == []
+
+        await dispatcher.adispatch(EVENT_CORE_TERMINATE, TerminateEvent(request, response))
+
+        assert dispatched == [
+            (EVENT_TRANSACTION_STARTED, None),
+            (EVENT_TRANSACTION_MESSAGE, "request"),
+            (EVENT_TRANSACTION_MESSAGE, "response"),
+            (EVENT_TRANSACTION_ENDED, None),
+        ]
+
+    @respx.mock
+    async def test_dispatch_after_response_streamed(self, dispatcher: AsyncEventDispatcher):
+        self.mock_http_endpoint("http://example.com/", content="Hello.")
+
+        dispatched = []
+
+        async def on_transaction_event(event):
+            dispatched.append(event.name)
+
+        for event_id in (EVENT_TRANSACTION_STARTED, EVENT_TRANSACTION_MESSAGE, EVENT_TRANSACTION_ENDED):
+            dispatcher.add_listener(event_id, on_transaction_event)
+
+        request, response = await self.call_controller(
+            self.create_controller(
+                "http://example.com/", dispatcher=dispatcher, dispatch_after_response=True, stream_responses=True
+            )
+        )
+        async for _ in response.stream():
+            pass
+        await dispatcher.adispatch(EVENT_CORE_TERMINATE, TerminateEvent(request, response))
+        await asyncio.sleep(0)
+
+        # events coming from the streamed response end go through, in order
+        assert dispatched == [
+            EVENT_TRANSACTION_STARTED,
+            EVENT_TRANSACTION_MESSAGE,
+            EVENT_TRANSACTION_MESSAGE,
+            EVENT_TRANSACTION_ENDED,
+        ]
+
 
 class TestHttpProxyControllerWithStorage(
     HttpProxyControllerTestFixtureMixin,
@@ -203,3 +350,93 @@ class TestHttpProxyControllerWithStorage(
             "body": "6ffdd89703735cc316470566467b816446f008ce",
             "created_at": ANY,
         }
+
+    @respx.mock
+    async def test_post_streamed(self, storage):
+        respx.post("http://example.com/").mock(return_value=Response(200, content=b"Thanks."))
+
+        request = HttpRequest(
+            HttpRequestStubBridge(method="POST", headers={"content-length": "9"}, body=[b"foo", b"bar", b"baz"])
+        )
+        await self.create_controller("http://example.com/", dispatcher=storage._dispatcher, stream_requests=True)(
+            request
+        )
+        await storage.wait_for_background_tasks_to_be_processed()
+
+        transaction, request, response = await self._find_one_transaction_with_messages_from_storage(storage)
+
+        assert request.summary == "POST / HTTP/1.1"
+        assert (await storage.get_blob(request.body)).data == b"foobarbaz"
+        assert (await storage.get_blob(response.body)).data == b"Thanks."
+
+    @respx.mock
+    async def test_post_with_capture_policy(self, storage):
+        respx.post("http://example.com/").mock(
+            return_value=Response(200, content=b'{"status": "created"}', headers={"content-type": "application/json"})
+        )
+
+        request = HttpRequest(
+            HttpRequestStubBridge(
+                method="POST", headers={"content-type": "text/csv"}, body=[b"id,name\n", b"1,foo\n", b"2,bar\n"]
+            )
+        )
+        response = await self.create_controller(
+            "http://example.com/",
+            dispatcher=storage._dispatcher,
+            capture=ProxyEndpointCaptureSetting(max_body_size=8, exclude_content_types=["application/json"]),
+        )(request)
+        await storage.wait_for_background_tasks_to_be_processed()
+
+        # the client gets the full response
+        assert response.body == b'{"status": "created"}'
+
+        transaction, request, response = await self._find_one_transaction_with_messages_from_storage(storage)
+
+        # storage only got a prefix of the request body, and nothing of the (excluded) response body
+        request_body = await storage.get_blob(request.body)
+        assert request_body.data == b"id,name\n"
+        assert request_body.original_size == 20
+        response_body = await storage.get_blob(response.body)
+        assert response_body.data == b""
+        assert response_body.original_size == 21
+
+    @respx.mock
+    async def test_post_streamed_with_capture_policy(self, storage):
+        route = respx.post("http://example.com/").mock(return_value=Response(200, content=b"Thanks."))
+
+        request = HttpRequest(
+            HttpRequestStubBridge(method="POST", headers={"content-length": "9"}, body=[b"foo", b"bar", b"baz"])
+        )
+        await self.create_controller(
+            "http://example.com/",
+            dispatcher=storage._dispatcher,
+            stream_requests=True,
+            capture=ProxyEndpointCaptureSetting(max_body_size=4),
+        )(request)
+        await storage.wait_for_background_tasks_to_be_processed()
+
+        # the upstream gets the full body, while only a prefix was kept for storage
+        assert route.calls.last.request.content == b"foobarbaz"
+        transaction, request, response = await self._find_one_transaction_with_messages_from_storage(storage)
+        request_body = await storage.get_blob(request.body)
+        assert request_body.data == b"foob"
+        assert request_body.original_size == 9
+
+    @respx.mock
+    async def test_get_streamed(self, storage):
+        self.mock_http_endpoint("http://example.com/", content="Hello.")
+
+        request, response = await self.call_controller(
+            self.create_controller("http://example.com/", dispatcher=storage._dispatcher, stream_responses=True)
+        )
+        async for _ in response.stream():
+            pass
+        await asyncio.sleep(0)
+        await storage.wait_for_background_tasks_to_be_processed()
+
+        transaction, request, response = await self._find_one_transaction_with_messages_from_storage(storage)
+
+        assert transaction.extras["status_class"] == "2xx"
+        assert transaction.finished_at is not None
+        assert response.summary == "HTTP/1.1 200 OK"
+        assert (await storage.get_blob(response.body)).data == b"Hello."
@@ -0,0 +1,30 @@
+from ..settings import ProxyEndpointCaptureSetting, ProxyEndpointSetting, ProxySettings
+
+
+def test_default_capture():
+    settings = ProxySettings(endpoints=[{"name": "api", "port": 4000, "url": "http://example.com/"}])
+    capture = settings.endpoints[0].capture
+
+    assert isinstance(capture, ProxyEndpointCaptureSetting)
+    assert capture.get_max_body_size("application/json") is None
+    assert capture.get_max_body_size(None) is None
+
+
+def test_capture_max_body_size():
+    endpoint = ProxyEndpointSetting(name="api", port=4000, url="http://example.com/", capture={"max_body_size": "1024"})
+    assert endpoint.capture.max_body_size == 1024
+    assert endpoint.capture.get_max_body_size("application/json") == 1024
+
+
+def test_capture_content_types():
+    capture = ProxyEndpointCaptureSetting(
+        max_body_size=1024,
+        content_types=["application/*", "text/*"],
+        exclude_content_types=["text/event-stream"],
+    )
+
+    assert capture.get_max_body_size("application/json; charset=utf-8") == 1024
+    assert capture.get_max_body_size("Text/HTML") == 1024
+    assert capture.get_max_body_size("text/event-stream") == 0
+    assert capture.get_max_body_size("image/png") == 0
+    assert capture.get_max_body_size(None) == 0
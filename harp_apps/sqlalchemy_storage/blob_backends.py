@@ -0,0 +1,180 @@
+"""
+Blob backends decide where the content of blobs lives. Blob metadata (id, content type, sizes ...) is always stored in
+the `blobs` table, but the data itself can either live in the same row (default), or in a content-addressed directory
+on the filesystem, keeping the database small.
+
+Rows written with an external backend have a NULL `data` column, so rows written before switching backends can still
+be read.
+
+Stored data depends on the codec and dictionary it was compressed with (see :mod:`.compression`), so each version of a
+blob's data is stored separately, and found using the `codec` and `dictionary_id` of its row.
+
+"""
+
+import asyncio
+import mmap
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+#: Stored version of a blob's data: (blob id, codec, dictionary id).
+BlobFile = tuple[str, Optional[str], Optional[int]]
+
+
+def get_filename(blob_id: str, /, *, codec: str = None, dictionary_id: int = None) -> str:
+    """Returns the name of the file storing the data of a blob, as compressed with the given codec and dictionary
+    (``<id>``, ``<id>.<codec>`` or ``<id>.<codec>.<dictionary id>``)."""
+    if codec:
+        blob_id += f".{codec}"
+    if dictionary_id:
+        blob_id += f".{dictionary_id}"
+    return blob_id
+
+
+def parse_filename(filename: str) -> BlobFile:
+    """Returns the (blob id, codec, dictionary id) stored in a file, reverse of :func:`get_filename`."""
+    blob_id, codec, dictionary_id = (filename.split(".", 2) + [None, None])[:3]
+    return blob_id, codec or None, int(dictionary_id) if dictionary_id else None
+
+
+class DatabaseBlobBackend:
+    """Stores blob data in the `data` column of the `blobs` table."""
+
+    #: Whether the data is stored outside of the database.
+    external = False
+
+    async def put_many(self, rows: list[dict]) -> list[dict]:
+        """Stores the data of the given blob rows, and returns the rows to insert in the database."""
+        return rows
+
+    def read(self, blob_id: str, /, *, codec: str = None, dictionary_id: int = None):
+        """Returns the data of a blob whose data is not in the database (as written with the given codec and
+        dictionary), or None if not found."""
+        return None
+
+    async def delete_many(self, blob_ids: Iterable[str]):
+        """Removes the data of the given blobs (all versions), once their rows are deleted."""
+
+    async def delete_files(self, files: Iterable[BlobFile]):
+        """Removes the given versions of blob data (for example, the raw data of a blob once its row references the
+        recompressed data)."""
+
+    async def get_size(self) -> int:
+        """Returns the number of bytes used by the data stored outside of the database."""
+        return 0
+
+
+class FilesystemBlobBackend(DatabaseBlobBackend):
+    """
+    Stores blob data in files under `path`, named after the blob id (the sha1 of the content) and the codec and
+    dictionary used (see :func:`get_filename`), and sharded in two levels of subdirectories (``ab/cd/abcdef...``). As
+    files are content-addressed, writing a file that already exists is a no-op, and files are written atomically
+    (temporary file, then rename). Existing files are never modified.
+
+    Reads use memory maps, so that serving a blob does not load it in memory (pages are loaded on demand by the OS).
+
+    """
+
+    external = True
+
+    def __init__(self, path, /):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def get_path(self, blob_id: str, /, *, codec: str = None, dictionary_id: int = None) -> Path:
+        return self._get_file_path(get_filename(blob_id, codec=codec, dictionary_id=dictionary_id))
+
+    async def put_many(self, rows: list[dict]) -> list[dict]:
+        await asyncio.to_thread(
+            self._write_many,
+            [
+                (get_filename(row["id"], codec=row.get("codec"), dictionary_id=row.get("dictionary_id")), row["data"])
+                for row in rows
+            ],
+        )
+        return [{**row, "data": None} for row in rows]
+
+    def read(self, blob_id: str, /, *, codec: str = None, dictionary_id: int = None):
+        try:
+            with open(self.get_path(blob_id, codec=codec, dictionary_id=dictionary_id), "rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    # empty files cannot be mapped
+                    return b""
+                # the map stays valid once the file is closed, and is released with the last reference to it
+                return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        except FileNotFoundError:
+            return None
+
+    async def delete_many(self, blob_ids: Iterable[str]):
+        await asyncio.to_thread(self._delete_many, list(blob_ids))
+
+    async def delete_files(self, files: Iterable[BlobFile]):
+        await asyncio.to_thread(
+            self._unlink_many,
+            [
+                self.get_path(blob_id, codec=codec, dictionary_id=dictionary_id)
+                for blob_id, codec, dictionary_id in files
+            ],
+        )
+
+    async def get_size(self) -> int:
+        # walks the whole directory, in a worker thread
+        return await asyncio.to_thread(self._get_size)
+
+    def iter_files(self, *, older_than: float = 0) -> Iterator[BlobFile]:
+        """Yields the (blob id, codec, dictionary id) of the stored files, skipping files modified less than
+        `older_than` seconds ago."""
+        limit = time.time() - older_than
+        for shard in self.path.glob("??/??"):
+            with os.scandir(shard) as entries:
+                for entry in entries:
+                    if entry.is_file() and not entry.name.startswith(".") and entry.stat().st_mtime < limit:
+                        yield parse_filename(entry.name)
+
+    def iter_ids(self, *, older_than: float = 0) -> Iterator[str]:
+        """Yields the blob ids of the stored files (once per stored version), see :meth:`iter_files`."""
+        for blob_id, _, _ in self.iter_files(older_than=older_than):
+            yield blob_id
+
+    def _get_size(self) -> int:
+        size = 0
+        for shard in self.path.glob("??/??"):
+            with os.scandir(shard) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        size += entry.stat().st_size
+        return size
+
+    def _get_file_path(self, filename: str) -> Path:
+        return self.path / filename[0:2] / filename[2:4] / filename
+
+    def _write_many(self, files: list[tuple[str, bytes]]):
+        for filename, data in files:
+            if not self._get_file_path(filename).exists():
+                self._write(filename, data)
+
+    def _write(self, filename: str, data: bytes):
+        path = self._get_file_path(filename)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{filename}.")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _delete_many(self, blob_ids: list[str]):
+        # all versions of the data, the blob id is followed by a dot in compressed versions' names.
+        self._unlink_many(
+            path
+            for blob_id in blob_ids
+            for path in self.get_path(blob_id).parent.glob(f"{blob_id}*")
+            if path.name == blob_id or path.name.startswith(f"{blob_id}.")
+        )
+
+    def _unlink_many(self, paths: Iterable[Path]):
+        for path in paths:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
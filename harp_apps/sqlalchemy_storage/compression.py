@@ -0,0 +1,283 @@
+"""
+Compression of blob data at rest.
+
+Blob rows record the codec used (``codec`` column, NULL for raw data) and the optional dictionary used (``dictionary_id``
+column, referencing ``blob_dictionaries``), so that compression can be enabled, changed or disabled at any time, and
+existing blobs can still be read.
+
+Two codecs are available: ``zlib`` (always available) and ``zstd`` (requires the optional ``zstandard`` package).
+Responses from one endpoint are usually structurally very similar, so both codecs can use per-endpoint dictionaries,
+trained on the first blobs seen for each endpoint.
+
+"""
+
+import asyncio
+import zlib
+from typing import Iterable
+
+from sqlalchemy import and_, func, select, update
+
+from harp import get_logger
+
+from .models import Blob, BlobDictionary, Message, Transaction
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = get_logger(__name__)
+
+#: Only the beginning of large blobs is kept as dictionary training sample.
+MAX_SAMPLE_SIZE = 16384
+
+
+class ZlibCodec:
+    """Deflate compression, from the standard library. Dictionaries are built from the tail of the samples, as zlib
+    only uses the last 32KiB of a dictionary."""
+
+    name = "zlib"
+
+    def __init__(self, level=6):
+        self.level = level
+
+    def compress(self, data: bytes, dictionary: bytes = None) -> bytes:
+        compressor = zlib.compressobj(self.level, zdict=dictionary) if dictionary else zlib.compressobj(self.level)
+        return compressor.compress(data) + compressor.flush()
+
+    def decompress(self, data: bytes, dictionary: bytes = None) -> bytes:
+        decompressor = zlib.decompressobj(zdict=dictionary) if dictionary else zlib.decompressobj()
+        return decompressor.decompress(data) + decompressor.flush()
+
+    def train(self, samples: list[bytes], size: int) -> bytes:
+        return b"".join(samples)[-min(size, 32768) :]
+
+
+class ZstdCodec:
+    """Zstandard compression, with trained dictionaries."""
+
+    name = "zstd"
+
+    def __init__(self, level=3):
+        if zstandard is None:
+            raise RuntimeError("The zstd codec requires the zstandard package (pip install harp-proxy[zstd]).")
+        self.level = level
+
+    def compress(self, data: bytes, dictionary: bytes = None) -> bytes:
+        dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+        return zstandard.ZstdCompressor(level=self.level, dict_data=dict_data).compress(data)
+
+    def decompress(self, data: bytes, dictionary: bytes = None) -> bytes:
+        dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+        return zstandard.ZstdDecompressor(dict_data=dict_data).decompress(data)
+
+    def train(self, samples: list[bytes], size: int) -> bytes:
+        return zstandard.train_dictionary(size, samples).as_bytes()
+
+
+CODECS = {
+    ZlibCodec.name: ZlibCodec,
+    ZstdCodec.name: ZstdCodec,
+}
+
+
+def get_codec(name: str, /, **kwargs):
+    try:
+        return CODECS[name](**kwargs)
+    except KeyError:
+        raise ValueError(f"Unknown blob codec «{name}», expected one of {', '.join(CODECS)}.")
+
+
+class BlobCompressor:
+    """
+    Compresses blob rows before they are written (using `codec`, or not at all if None), and decompresses blob data
+    when read (using whatever codec the row was written with).
+
+    With `dictionaries`, the first `dictionary_samples` blobs of each endpoint are compressed without dictionary and
+    kept as samples, then a dictionary of `dictionary_size` bytes is trained on them, stored in the database, and used
+    for the next blobs of this endpoint.
+
+    """
+
+    def __init__(
+        self,
+        codec: str = None,
+        /,
+        *,
+        level: int = None,
+        min_size=64,
+        dictionaries=True,
+        dictionary_size=16384,
+        dictionary_samples=100,
+    ):
+        self.codec = get_codec(codec, **({"level": level} if level is not None else {})) if codec else None
+        self.min_size = min_size
+        self.dictionaries = dictionaries
+        self.dictionary_size = dictionary_size
+        self.dictionary_samples = dictionary_samples
+
+        self._dictionaries: dict[int, bytes] = {}
+        self._dictionary_ids_by_endpoint: dict[str, int | None] = {}
+        self._samples: dict[str, list[bytes]] = {}
+        self._codecs = {self.codec.name: self.codec} if self.codec else {}
+
+    async def compress_rows(self, session, rows: Iterable[dict]) -> list[dict]:
+        """Returns the rows to write, with compressed data, codec and dictionary id (the optional `endpoint` key of
+        each row is used to choose a dictionary, and removed). Compression runs in a worker thread, so that the event
+        loop is not blocked by large blobs."""
+        result, to_compress = [], []
+        for row in rows:
+            # all rows must have the same keys, to be inserted using one multi-row statement
+            row = {**row, "codec": None, "dictionary_id": None}
+            endpoint = row.pop("endpoint", None)
+            data = row["data"]
+
+            if self.codec is not None and data is not None and len(data) >= self.min_size:
+                dictionary_id = await self._get_dictionary_id(session, endpoint, data) if self.dictionaries else None
+                dictionary = self._dictionaries[dictionary_id] if dictionary_id else None
+                to_compress.append((row, dictionary_id, dictionary))
+
+            result.append(row)
+
+        if to_compress:
+            compressed = await asyncio.to_thread(
+                lambda: [self.codec.compress(bytes(row["data"]), dictionary) for row, _, dictionary in to_compress]
+            )
+            for (row, dictionary_id, _), data in zip(to_compress, compressed):
+                if len(data) < len(row["data"]):
+                    row.update(data=data, codec=self.codec.name, dictionary_id=dictionary_id)
+
+        return result
+
+    async def decompress(self, session, data, /, *, codec: str = None, dictionary_id: int = None) -> bytes:
+        """Returns the raw data of a blob, as written with the given codec and dictionary."""
+        if not codec:
+            return data
+
+        if codec not in self._codecs:
+            self._codecs[codec] = get_codec(codec)
+
+        dictionary = await self._get_dictionary(session, dictionary_id) if dictionary_id else None
+        return self._codecs[codec].decompress(bytes(data), dictionary)
+
+    async def _get_dictionary(self, session, dictionary_id: int) -> bytes:
+        if dictionary_id not in self._dictionaries:
+            self._dictionaries[dictionary_id] = (
+                await session.execute(select(BlobDictionary.data).where(BlobDictionary.id == dictionary_id))
+            ).scalar_one()
+        return self._dictionaries[dictionary_id]
+
+    async def _get_dictionary_id(self, session, endpoint: str, data: bytes):
+        if not endpoint:
+            return None
+
+        # dictionary trained before (by this process or a previous one)
+        if endpoint not in self._dictionary_ids_by_endpoint:
+            row = (
+                await session.execute(
+                    select(BlobDictionary.id, BlobDictionary.data)
+                    .where(and_(BlobDictionary.endpoint == endpoint, BlobDictionary.codec == self.codec.name))
+                    .order_by(BlobDictionary.id.desc())
+                    .limit(1)
+                )
+            ).first()
+            self._dictionary_ids_by_endpoint[endpoint] = row[0] if row else None
+            if row:
+                self._dictionaries[row[0]] = row[1]
+
+        if self._dictionary_ids_by_endpoint[endpoint] is not None:
+            return self._dictionary_ids_by_endpoint[endpoint]
+
+        # not enough samples yet
+        samples = self._samples.setdefault(endpoint, [])
+        samples.append(bytes(data[:MAX_SAMPLE_SIZE]))
+        if len(samples) < self.dictionary_samples:
+            return None
+
+        del self._samples[endpoint]
+        try:
+            dictionary = await asyncio.to_thread(self.codec.train, samples, self.dictionary_size)
+        except Exception as exc:
+            # training may fail, for example with too few or too small samples, let's try again later.
+            logger.warning(f"🛢 Could not train a {self.codec.name} dictionary for endpoint {endpoint}: {exc}")
+            return None
+
+        blob_dictionary = BlobDictionary(endpoint=endpoint, codec=self.codec.name, data=dictionary)
+        session.add(blob_dictionary)
+        await session.flush()
+
+        self._dictionaries[blob_dictionary.id] = dictionary
+        self._dictionary_ids_by_endpoint[endpoint] = blob_dictionary.id
+        logger.info(f"🛢 Trained a {self.codec.name} dictionary for endpoint {endpoint} ({len(dictionary)} bytes).")
+        return blob_dictionary.id
+
+    def forget(self):
+        """Forgets the dictionaries created in a rolled back database transaction (known dictionaries will be loaded
+        again from the database)."""
+        self._dictionary_ids_by_endpoint.clear()
+        self._dictionaries.clear()
+
+
+async def recompress_blobs(storage, /, *, batch_size=500) -> int:
+    """
+    Compresses the existing raw blobs of a storage, using its configured compressor, one batch (and one database
+    transaction) at a time. Returns the number of compressed blobs.
+
+    With an external blob backend, the compressed data is stored next to the raw data (see
+    :func:`get_filename <harp_apps.sqlalchemy_storage.blob_backends.get_filename>`), which is only removed once the
+    updated rows are committed, so that rows always reference existing data.
+    """
+    compressor: BlobCompressor = storage.compressor
+    if compressor.codec is None:
+        raise ValueError("No blob compression codec configured.")
+
+    compressed, last_id = 0, ""
+    while True:
+        async with storage.begin() as session:
+            rows = (
+                await session.execute(
+                    select(Blob.id, Blob.data)
+                    .where(and_(Blob.codec.is_(None), Blob.id > last_id))
+                    .order_by(Blob.id)
+                    .limit(batch_size)
+                )
+            ).all()
+            if not rows:
+                return compressed
+            last_id = rows[-1][0]
+
+            # endpoints of the batch's blobs (used to choose a dictionary), found at once as messages.body is not indexed
+            endpoints = dict(
+                (
+                    await session.execute(
+                        select(Message.body, func.min(Transaction.endpoint))
+                        .join(Transaction, Message.transaction_id == Transaction.id)
+                        .where(Message.body.in_([blob_id for blob_id, _ in rows]))
+                        .group_by(Message.body)
+                    )
+                ).all()
+            )
+
+            values, external_ids = [], set()
+            for blob_id, data in rows:
+                if data is None:
+                    data = storage.blob_backend.read(blob_id)
+                    external_ids.add(blob_id)
+                if data is None:
+                    continue
+                values.append({"id": blob_id, "data": bytes(data), "endpoint": endpoints.get(blob_id)})
+
+            rows = [row for row in await compressor.compress_rows(session, values) if row["codec"] is not None]
+            external_ids.intersection_update(row["id"] for row in rows)
+            await storage.blob_backend.put_many([row for row in rows if row["id"] in external_ids])
+            for row in rows:
+                blob_id = row.pop("id")
+                if blob_id in external_ids:
+                    row.pop("data")
+                await session.execute(update(Blob).where(Blob.id == blob_id).values(**row))
+            compressed += len(rows)
+
+        # the raw data of externally stored blobs is not referenced anymore
+        await storage.blob_backend.delete_files((blob_id, None, None) for blob_id in external_ids)
+
+        logger.info(f"🛢 Recompressed {compressed} blobs so far (last id: {last_id}).")
@@ -8,3 +8,20 @@ class TimeBucket(Enum):
     DAY = "day"
     HOUR = "hour"
     MINUTE = "minute"
+
+
+class TotalCount(Enum):
+    """How the total number of results is computed, when listing transactions."""
+
+    #: Exact count, requires to go through all matching rows.
+    EXACT = "exact"
+    #: Exact count up to TOTAL_COUNT_CAP rows, a lower bound otherwise ("10000+").
+    CAPPED = "capped"
+    #: Estimated from the query planner statistics, where available (capped otherwise).
+    ESTIMATED = "estimated"
+    #: No total.
+    NONE = "none"
+
+
+#: Maximum number of rows counted for capped totals.
+TOTAL_COUNT_CAP = 10000
@@ -0,0 +1,161 @@
+import asyncio
+import time
+from collections import deque
+from typing import Iterable, Optional
+
+from harp import get_logger
+
+from .optionals.body_search import index_bodies, is_body_search_installed
+
+logger = get_logger(__name__)
+
+#: Content types (without parameters) indexed besides ``text/*``.
+_TEXT_CONTENT_TYPES = {
+    "application/json",
+    "application/xml",
+    "application/x-www-form-urlencoded",
+    "application/javascript",
+    "application/graphql",
+}
+
+#: Structured syntax suffixes of indexed content types (``application/vnd.api+json`` ...).
+_TEXT_SUFFIXES = ("+json", "+xml")
+
+
+def is_text_content_type(content_type: Optional[str]) -> bool:
+    """Tells if a body with this content type is worth indexing as text."""
+    if not content_type:
+        return False
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    return media_type.startswith("text/") or media_type in _TEXT_CONTENT_TYPES or media_type.endswith(_TEXT_SUFFIXES)
+
+
+def _get_charset(content_type: str) -> str:
+    for param in content_type.split(";")[1:]:
+        key, _, value = param.partition("=")
+        if key.strip().lower() == "charset" and value.strip():
+            return value.strip().strip('"')
+    return "utf-8"
+
+
+def _decode(data: bytes, content_type: str) -> str:
+    try:
+        content = data.decode(_get_charset(content_type), errors="replace")
+    except LookupError:
+        content = data.decode("utf-8", errors="replace")
+    # postgres text cannot contain NUL characters
+    return content.replace("\x00", "")
+
+
+class BodyIndexer:
+    """
+    Fills the body search index (see :class:`BodySearchOptional
+    <harp_apps.sqlalchemy_storage.optionals.body_search.BodySearchOptional>`) in the background, from the blobs
+    written by the storage writer, so that indexing never happens on the proxy path.
+
+    Only text-like bodies (``text/*``, json, xml, form data ...) of at most `max_size` bytes are indexed. The queue is
+    bounded to `max_queue_bytes` bytes of bodies, blobs added while it is full are not indexed. Nothing is queued while the index is not installed (this is
+    checked every `check_interval` seconds).
+
+    """
+
+    def __init__(
+        self,
+        begin,
+        /,
+        *,
+        max_size=65536,
+        batch_size=100,
+        interval=1.0,
+        max_queue_bytes=16 * 1024 * 1024,
+        check_interval=60.0,
+    ):
+        #: Callable returning an async context manager that yields a session within a database transaction.
+        self.begin = begin
+
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_queue_bytes = max_queue_bytes
+        self.check_interval = check_interval
+
+        #: Number of bodies not indexed because the queue was full.
+        self.dropped = 0
+
+        self._queue: deque[tuple[str, str, bytes]] = deque()
+        self._queue_bytes = 0
+        self._installed: Optional[bool] = None
+        self._checked_at = None
+        self._lock = asyncio.Lock()
+        self._task = None
+
+    def __len__(self):
+        return len(self._queue)
+
+    def add_many(self, rows: Iterable[dict]):
+        """Queues blob rows (as written by the storage writer) for indexing, if they should be."""
+        if self._installed is False and not self._should_check():
+            return
+
+        for row in rows:
+            data = row["data"]
+            if not data or len(data) > self.max_size or not is_text_content_type(row["content_type"]):
+                continue
+            if self._queue_bytes + len(data) > self.max_queue_bytes:
+                self.dropped += 1
+                continue
+            self._queue.append((row["id"], row["content_type"], data))
+            self._queue_bytes += len(data)
+
+        if self._queue and self._task is None:
+            self._task = asyncio.create_task(self())
+
+    async def flush(self):
+        """Indexes all queued bodies."""
+        async with self._lock:
+            while self._queue:
+                if not await self._is_installed():
+                    self._queue.clear()
+                    self._queue_bytes = 0
+                    return
+
+                batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+                self._queue_bytes -= sum(len(data) for _, _, data in batch)
+                try:
+                    async with self.begin() as session:
+                        await index_bodies(
+                            session,
+                            [(blob_id, _decode(data, content_type)) for blob_id, content_type, data in batch],
+                        )
+                except Exception as exc:
+                    logger.exception(f"Error while indexing a batch of {len(batch)} bodies: {exc}")
+                    self._checked_at = None
+
+    async def close(self):
+        """Indexes the queued bodies, and stops the background task."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def _should_check(self) -> bool:
+        return self._checked_at is None or time.monotonic() - self._checked_at >= self.check_interval
+
+    async def _is_installed(self) -> bool:
+        if self._should_check():
+            async with self.begin() as session:
+                self._installed = await is_body_search_installed(session)
+            self._checked_at = time.monotonic()
+        return self._installed
+
+    async def __call__(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception as exc:
+                logger.exception(f"Error while indexing bodies: {exc}")
@@ -0,0 +1,26 @@
+"""add blobs original size
+
+Revision ID: 5a8f3c2e7d14
+Revises: 0b4d9cb71c38
+Create Date: 2024-06-20 10:15:12.418733
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "5a8f3c2e7d14"
+down_revision: Union[str, None] = "0b4d9cb71c38"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("blobs", sa.Column("original_size", sa.BigInteger(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("blobs", "original_size")
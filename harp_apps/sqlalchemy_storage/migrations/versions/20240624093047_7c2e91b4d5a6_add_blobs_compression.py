@@ -0,0 +1,41 @@
+"""add blobs compression
+
+Revision ID: 7c2e91b4d5a6
+Revises: 5a8f3c2e7d14
+Create Date: 2024-06-24 09:30:47.215804
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "7c2e91b4d5a6"
+down_revision: Union[str, None] = "5a8f3c2e7d14"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "blob_dictionaries",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("endpoint", sa.String(length=32), nullable=True),
+        sa.Column("codec", sa.String(length=16), nullable=False),
+        sa.Column("data", sa.LargeBinary(), nullable=False),
+        sa.Column("created_at", sa.TIMESTAMP(timezone=True), server_default=sa.text("now()"), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("id"),
+    )
+    op.create_index(op.f("ix_blob_dictionaries_endpoint"), "blob_dictionaries", ["endpoint"], unique=False)
+    op.add_column("blobs", sa.Column("codec", sa.String(length=16), nullable=True))
+    op.add_column("blobs", sa.Column("dictionary_id", sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("blobs", "dictionary_id")
+    op.drop_column("blobs", "codec")
+    op.drop_index(op.f("ix_blob_dictionaries_endpoint"), table_name="blob_dictionaries")
+    op.drop_table("blob_dictionaries")
@@ -0,0 +1,27 @@
+"""transactions started_at id index
+
+Revision ID: e4b19a7c3d82
+Revises: 7c2e91b4d5a6
+Create Date: 2024-06-26 14:05:12.483921
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e4b19a7c3d82"
+down_revision: Union[str, None] = "7c2e91b4d5a6"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_transactions_started_at_id", "transactions", ["started_at", "id"], unique=False)
+    op.drop_index("ix_transactions_started_at", table_name="transactions")
+
+
+def downgrade() -> None:
+    op.create_index("ix_transactions_started_at", "transactions", ["started_at"], unique=False)
+    op.drop_index("ix_transactions_started_at_id", table_name="transactions")
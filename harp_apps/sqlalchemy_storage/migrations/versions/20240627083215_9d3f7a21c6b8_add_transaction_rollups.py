@@ -0,0 +1,78 @@
+"""add transaction rollups
+
+Revision ID: 9d3f7a21c6b8
+Revises: e4b19a7c3d82
+Create Date: 2024-06-27 08:32:15.104382
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+from harp_apps.sqlalchemy_storage.utils.dates import TruncDatetime
+
+# revision identifiers, used by Alembic.
+revision: str = "9d3f7a21c6b8"
+down_revision: Union[str, None] = "e4b19a7c3d82"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    rollups = op.create_table(
+        "transaction_rollups",
+        sa.Column("time_bucket", sa.String(length=8), nullable=False),
+        sa.Column("started_at", sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.Column("endpoint", sa.String(length=32), nullable=False),
+        sa.Column("count", sa.Integer(), nullable=False),
+        sa.Column("errors", sa.Integer(), nullable=False),
+        sa.Column("cached", sa.Integer(), nullable=False),
+        sa.Column("elapsed_sum", sa.Float(), nullable=False),
+        sa.Column("elapsed_count", sa.Integer(), nullable=False),
+        sa.Column("tpdex_sum", sa.BigInteger(), nullable=False),
+        sa.Column("tpdex_count", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("time_bucket", "started_at", "endpoint"),
+    )
+
+    # backfill the rollups from existing transactions
+    transactions = sa.table(
+        "transactions",
+        sa.column("started_at", sa.TIMESTAMP(timezone=True)),
+        sa.column("endpoint", sa.String()),
+        sa.column("elapsed", sa.Float()),
+        sa.column("tpdex", sa.Integer()),
+        sa.column("x_status_class", sa.String()),
+        sa.column("x_cached", sa.String()),
+    )
+    dialect_name = op.get_bind().dialect.name
+    for time_bucket in ("minute", "hour", "day"):
+        started_at = TruncDatetime(sa.literal(time_bucket), transactions.c.started_at)
+        if dialect_name == "sqlite":
+            # same format as the datetimes written by sqlalchemy
+            started_at = sa.func.strftime("%Y-%m-%d %H:%M:%f000", started_at)
+        endpoint = sa.func.coalesce(transactions.c.endpoint, "")
+        op.execute(
+            rollups.insert().from_select(
+                [column.name for column in rollups.columns],
+                sa.select(
+                    sa.literal(time_bucket),
+                    started_at,
+                    endpoint,
+                    sa.func.count(),
+                    sa.func.sum(sa.case((transactions.c.x_status_class.in_(("5xx", "ERR")), 1), else_=0)),
+                    sa.func.sum(sa.case((sa.func.coalesce(transactions.c.x_cached, "") != "", 1), else_=0)),
+                    sa.func.coalesce(sa.func.sum(transactions.c.elapsed), 0.0),
+                    sa.func.count(transactions.c.elapsed),
+                    sa.func.coalesce(sa.func.sum(transactions.c.tpdex), 0),
+                    sa.func.count(transactions.c.tpdex),
+                )
+                .where(transactions.c.started_at.is_not(None))
+                .group_by(started_at, endpoint),
+            )
+        )
+
+
+def downgrade() -> None:
+    op.drop_table("transaction_rollups")
@@ -0,0 +1,63 @@
+"""add transaction latency rollups
+
+Revision ID: b5e8c2d49f17
+Revises: 9d3f7a21c6b8
+Create Date: 2024-06-28 10:17:44.592610
+
+"""
+
+import math
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+from harp_apps.sqlalchemy_storage.utils.dates import TruncDatetime
+from harp_apps.sqlalchemy_storage.utils.sketches import MIN_VALUE, RELATIVE_ACCURACY
+
+# revision identifiers, used by Alembic.
+revision: str = "b5e8c2d49f17"
+down_revision: Union[str, None] = "9d3f7a21c6b8"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    latency_rollups = op.create_table(
+        "transaction_latency_rollups",
+        sa.Column("time_bucket", sa.String(length=8), nullable=False),
+        sa.Column("started_at", sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.Column("endpoint", sa.String(length=32), nullable=False),
+        sa.Column("bin", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("count", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("time_bucket", "started_at", "endpoint", "bin"),
+    )
+
+    # backfill the sketches from existing transactions (sqlite has no portable logarithm function, its databases are
+    # not migrated using alembic anyway)
+    if op.get_bind().dialect.name not in ("postgresql", "mysql"):
+        return
+
+    transactions = sa.table(
+        "transactions",
+        sa.column("started_at", sa.TIMESTAMP(timezone=True)),
+        sa.column("endpoint", sa.String()),
+        sa.column("elapsed", sa.Float()),
+    )
+    log_gamma = math.log((1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY))
+    index = sa.func.ceil(sa.func.ln(sa.func.greatest(transactions.c.elapsed, MIN_VALUE)) / log_gamma)
+    for time_bucket in ("minute", "hour", "day"):
+        started_at = TruncDatetime(sa.literal(time_bucket), transactions.c.started_at)
+        endpoint = sa.func.coalesce(transactions.c.endpoint, "")
+        op.execute(
+            latency_rollups.insert().from_select(
+                [column.name for column in latency_rollups.columns],
+                sa.select(sa.literal(time_bucket), started_at, endpoint, index, sa.func.count())
+                .where(transactions.c.started_at.is_not(None), transactions.c.elapsed.is_not(None))
+                .group_by(started_at, endpoint, index),
+            )
+        )
+
+
+def downgrade() -> None:
+    op.drop_table("transaction_latency_rollups")
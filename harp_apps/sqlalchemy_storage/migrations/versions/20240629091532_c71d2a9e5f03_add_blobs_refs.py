@@ -0,0 +1,57 @@
+"""add blobs refs
+
+Revision ID: c71d2a9e5f03
+Revises: b5e8c2d49f17
+Create Date: 2024-06-29 09:15:32.204518
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c71d2a9e5f03"
+down_revision: Union[str, None] = "b5e8c2d49f17"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("blobs", sa.Column("refs", sa.Integer(), server_default="0", nullable=False))
+
+    # backfill the reference counts from existing messages, counted once in a temporary table (a correlated count per
+    # blob would scan the messages table for each blob, as blob references are not indexed)
+    blob_refs = op.create_table(
+        "blob_refs_backfill",
+        sa.Column("blob_id", sa.String(length=40), primary_key=True),
+        sa.Column("refs", sa.Integer(), nullable=False),
+    )
+    messages = sa.table("messages", sa.column("headers", sa.String()), sa.column("body", sa.String()))
+    references = sa.union_all(
+        sa.select(messages.c.headers.label("blob_id")),
+        sa.select(messages.c.body.label("blob_id")),
+    ).subquery()
+    op.execute(
+        blob_refs.insert().from_select(
+            ["blob_id", "refs"],
+            sa.select(references.c.blob_id, sa.func.count())
+            .where(references.c.blob_id.is_not(None))
+            .group_by(references.c.blob_id),
+        )
+    )
+    blobs = sa.table("blobs", sa.column("id", sa.String()), sa.column("refs", sa.Integer()))
+    op.execute(
+        blobs.update()
+        .where(blobs.c.id.in_(sa.select(blob_refs.c.blob_id)))
+        .values(refs=sa.select(blob_refs.c.refs).where(blob_refs.c.blob_id == blobs.c.id).scalar_subquery())
+    )
+    op.drop_table("blob_refs_backfill")
+
+    op.create_index(op.f("ix_blobs_refs"), "blobs", ["refs"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_blobs_refs"), table_name="blobs")
+    op.drop_column("blobs", "refs")
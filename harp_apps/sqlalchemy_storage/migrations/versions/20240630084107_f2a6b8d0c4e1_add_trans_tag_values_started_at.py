@@ -0,0 +1,39 @@
+"""add trans_tag_values started_at
+
+Revision ID: f2a6b8d0c4e1
+Revises: c71d2a9e5f03
+Create Date: 2024-06-30 08:41:07.113296
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "f2a6b8d0c4e1"
+down_revision: Union[str, None] = "c71d2a9e5f03"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("trans_tag_values", sa.Column("started_at", sa.TIMESTAMP(timezone=True), nullable=True))
+
+    # copy the start of the tagged transactions (used as partition key by the pg_partitions feature)
+    tag_values = sa.table(
+        "trans_tag_values", sa.column("transaction_id", sa.String()), sa.column("started_at", sa.TIMESTAMP())
+    )
+    transactions = sa.table("transactions", sa.column("id", sa.String()), sa.column("started_at", sa.TIMESTAMP()))
+    op.execute(
+        tag_values.update().values(
+            started_at=sa.select(transactions.c.started_at)
+            .where(transactions.c.id == tag_values.c.transaction_id)
+            .scalar_subquery()
+        )
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("trans_tag_values", "started_at")
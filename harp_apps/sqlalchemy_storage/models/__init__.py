@@ -1,8 +1,9 @@
 from .base import Base
-from .blobs import Blob, BlobsRepository
+from .blobs import Blob, BlobDictionary, BlobsRepository
 from .flags import FLAGS_BY_NAME, FLAGS_BY_TYPE, FlagsRepository, UserFlag
 from .messages import Message, MessagesRepository
 from .metrics import Metric, MetricsRepository, MetricValue, MetricValuesRepository
+from .rollups import TransactionLatencyRollup, TransactionRollup, TransactionRollupsRepository
 from .tags import Tag, TagsRepository, TagValue, TagValuesRepository
 from .transactions import Transaction, TransactionsRepository
 from .users import User, UsersRepository
@@ -12,6 +13,7 @@ __all__ = [
     "FLAGS_BY_TYPE",
     "Base",
     "Blob",
+    "BlobDictionary",
     "BlobsRepository",
     "Message",
     "MessagesRepository",
@@ -24,6 +26,9 @@ __all__ = [
     "Tag",
     "TagsRepository",
     "Transaction",
+    "TransactionLatencyRollup",
+    "TransactionRollup",
+    "TransactionRollupsRepository",
     "TransactionsRepository",
     "User",
     "UserFlag",
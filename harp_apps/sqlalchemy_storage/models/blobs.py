@@ -1,10 +1,12 @@
-from sqlalchemy import TIMESTAMP, LargeBinary, String, delete, func, select
-from sqlalchemy.orm import aliased, mapped_column
+from collections import Counter
+from typing import Iterable, Optional
+
+from sqlalchemy import TIMESTAMP, BigInteger, Integer, LargeBinary, String, bindparam, delete, func, select, update
+from sqlalchemy.orm import mapped_column
 
 from harp.models import Blob as BlobModel
 
 from .base import Base, Repository, with_session
-from .messages import Message
 
 
 class Blob(Base):
@@ -13,6 +15,32 @@ class Blob(Base):
     id = mapped_column(String(40), primary_key=True, unique=True)
     data = mapped_column(LargeBinary())
     content_type = mapped_column(String(64))
+    original_size = mapped_column(BigInteger(), nullable=True)
+    codec = mapped_column(String(16), nullable=True)
+    dictionary_id = mapped_column(Integer(), nullable=True)
+    created_at = mapped_column(TIMESTAMP(timezone=True), server_default=func.now())
+
+    #: Number of messages referencing this blob (as headers or body), blobs without references are orphans.
+    refs = mapped_column(Integer(), nullable=False, default=0, server_default="0", index=True)
+
+
+def count_refs(references: Iterable[tuple[Optional[str], Optional[str]]], /, *, sign=1) -> list[dict]:
+    """Returns the :meth:`BlobsRepository.update_refs` parameters for the given (headers, body) blob ids of messages,
+    with one item per blob, sorted by blob id so that concurrent updates lock the blob rows in the same order. Use
+    `sign=-1` for removed messages."""
+    counts = Counter(blob_id for pair in references for blob_id in pair if blob_id)
+    return [{"blob_id": blob_id, "delta": sign * counts[blob_id]} for blob_id in sorted(counts)]
+
+
+class BlobDictionary(Base):
+    """Compression dictionary, trained on the blobs of one endpoint."""
+
+    __tablename__ = "blob_dictionaries"
+
+    id = mapped_column(Integer(), primary_key=True, unique=True, autoincrement=True)
+    endpoint = mapped_column(String(32), nullable=True, index=True)
+    codec = mapped_column(String(16), nullable=False)
+    data = mapped_column(LargeBinary(), nullable=False)
     created_at = mapped_column(TIMESTAMP(timezone=True), server_default=func.now())
 
 
@@ -20,32 +48,22 @@ class BlobsRepository(Repository[Blob]):
     Type = Blob
 
     def count_orphans(self):
-        MH = aliased(Message, name="mh")
-        MB = aliased(Message, name="mb")
-        subquery = (
-            select(Blob.id, func.count(MH.id) + func.count(MB.id))
-            .select_from(Blob)
-            .outerjoin(MH, MH.headers == Blob.id)
-            .outerjoin(MB, MB.body == Blob.id)
-            .group_by(Blob.id)
-            .subquery()
-        )
-        query = select(func.count(subquery.c.id)).where(subquery.c[1] == 0)
-        return query
-
-    def delete_orphans(self):
-        MH = aliased(Message, name="mh")
-        MB = aliased(Message, name="mb")
-        subquery = (
-            select(Blob.id, func.count(MH.id) + func.count(MB.id))
-            .select_from(Blob)
-            .outerjoin(MH, MH.headers == Blob.id)
-            .outerjoin(MB, MB.body == Blob.id)
-            .group_by(Blob.id)
-            .subquery()
-        )
-        query = select(subquery.c.id).where(subquery.c[1] == 0)
-        return delete(Blob).where(Blob.id.in_(query))
+        return select(func.count()).select_from(Blob).where(Blob.refs <= 0)
+
+    def find_orphans(self):
+        return select(Blob.id).where(Blob.refs <= 0)
+
+    def delete_orphans(self, ids=None):
+        """Deletes orphan blobs, only among `ids` if given (references are checked again, in case a message was added
+        since the ids were selected)."""
+        query = delete(Blob).where(Blob.refs <= 0)
+        return query.where(Blob.id.in_(ids)) if ids is not None else query
+
+    def update_refs(self):
+        """Statement adding `delta` to the reference count of the blob `blob_id`, to be executed with a list of
+        parameters (see :func:`count_refs`)."""
+        table = Blob.__table__
+        return update(table).where(table.c.id == bindparam("blob_id")).values(refs=table.c.refs + bindparam("delta"))
 
     @with_session
     async def create(self, values: dict | BlobModel, /, *, session):
@@ -54,5 +72,6 @@ class BlobsRepository(Repository[Blob]):
                 id=values.id,
                 data=values.data,
                 content_type=values.content_type,
+                original_size=values.original_size,
             )
         return await super().create(values, session=session)
@@ -1,13 +1,14 @@
 from datetime import UTC
 from typing import TYPE_CHECKING
 
-from sqlalchemy import TIMESTAMP, ForeignKey, Integer, String
+from sqlalchemy import TIMESTAMP, ForeignKey, Integer, String, select
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from harp.http import get_serializer_for
 from harp.models.messages import Message as MessageModel
 
 from .base import Base, Repository, with_session
+from .blobs import BlobsRepository, count_refs
 
 if TYPE_CHECKING:
     from .transactions import Transaction
@@ -66,4 +67,11 @@ class MessagesRepository(Repository[Message]):
                 body=values.body,
                 created_at=values.created_at,
             )
+        refs = count_refs([(values.get("headers"), values.get("body"))])
+        if refs:
+            await session.execute(BlobsRepository(None).update_refs(), refs)
         return await super().create(values, session=session)
+
+    def find_blob_refs(self, transaction_ids):
+        """Selects the (headers, body) blob ids of the messages of the given transactions."""
+        return select(self.Type.headers, self.Type.body).where(self.Type.transaction_id.in_(transaction_ids))
@@ -0,0 +1,160 @@
+from datetime import UTC, datetime, timedelta
+from typing import Iterable
+
+from sqlalchemy import TIMESTAMP, BigInteger, Float, Integer, String, delete
+from sqlalchemy.orm import mapped_column
+
+from ..constants import TimeBucket
+from ..utils.sketches import get_bin
+from ..utils.sql import upsert_increment
+from .base import Base, Repository, with_session
+
+#: Time buckets for which transactions are rolled up, coarser ones are computed from the day rollups.
+ROLLUP_TIME_BUCKETS = (TimeBucket.MINUTE.value, TimeBucket.HOUR.value, TimeBucket.DAY.value)
+
+#: Rolled up values, incremented for each transaction.
+ROLLUP_COLUMNS = ("count", "errors", "cached", "elapsed_sum", "elapsed_count", "tpdex_sum", "tpdex_count")
+
+_TRUNCATE = {
+    TimeBucket.MINUTE.value: dict(second=0, microsecond=0),
+    TimeBucket.HOUR.value: dict(minute=0, second=0, microsecond=0),
+    TimeBucket.DAY.value: dict(hour=0, minute=0, second=0, microsecond=0),
+}
+
+
+def truncate_datetime(value: datetime, time_bucket: str) -> datetime:
+    """Returns the start of the (minute, hour or day) time bucket containing the given datetime."""
+    return value.replace(**_TRUNCATE[time_bucket])
+
+
+class TransactionRollup(Base):
+    """Aggregated values of the transactions started in one time bucket, for one endpoint ("" for none)."""
+
+    __tablename__ = "transaction_rollups"
+
+    time_bucket = mapped_column(String(8), primary_key=True)
+    started_at = mapped_column(TIMESTAMP(timezone=True), primary_key=True)
+    endpoint = mapped_column(String(32), primary_key=True, default="")
+
+    count = mapped_column(Integer(), nullable=False, default=0)
+    errors = mapped_column(Integer(), nullable=False, default=0)
+    cached = mapped_column(Integer(), nullable=False, default=0)
+    elapsed_sum = mapped_column(Float(), nullable=False, default=0.0)
+    elapsed_count = mapped_column(Integer(), nullable=False, default=0)
+    tpdex_sum = mapped_column(BigInteger(), nullable=False, default=0)
+    tpdex_count = mapped_column(Integer(), nullable=False, default=0)
+
+
+class TransactionLatencyRollup(Base):
+    """Latency sketch of the transactions started in one time bucket, for one endpoint ("" for none), stored as the
+    number of transactions by sketch bin (see :class:`LatencySketch
+    <harp_apps.sqlalchemy_storage.utils.sketches.LatencySketch>`)."""
+
+    __tablename__ = "transaction_latency_rollups"
+
+    time_bucket = mapped_column(String(8), primary_key=True)
+    started_at = mapped_column(TIMESTAMP(timezone=True), primary_key=True)
+    endpoint = mapped_column(String(32), primary_key=True, default="")
+    bin = mapped_column(Integer(), primary_key=True, autoincrement=False)
+
+    count = mapped_column(Integer(), nullable=False, default=0)
+
+
+def _get_rollup_key(row, time_bucket):
+    started_at = row["started_at"]
+    started_at = started_at.astimezone(UTC) if started_at.tzinfo else started_at.replace(tzinfo=UTC)
+    return time_bucket, truncate_datetime(started_at, time_bucket), row["endpoint"] or ""
+
+
+def get_rollup_rows(transactions: Iterable[dict] = (), updates: Iterable[dict] = ()) -> list[dict]:
+    """
+    Returns the rollup increments for the given transaction rows (counted once, when created) and transaction update
+    rows (finished transactions, adding their errors, cached hits, elapsed time and tpdex). Both kinds of rows must
+    contain the transaction's `started_at` and `endpoint`. Rows are sorted by key, so that concurrent writers lock the
+    rollup rows they upsert in the same order (and cannot deadlock).
+
+    """
+    rollups = {}
+
+    def _add(row, **values):
+        for time_bucket in ROLLUP_TIME_BUCKETS:
+            key = _get_rollup_key(row, time_bucket)
+            if key not in rollups:
+                rollups[key] = dict.fromkeys(ROLLUP_COLUMNS, 0)
+            for name, value in values.items():
+                rollups[key][name] += value
+
+    def _add_finished(row, **values):
+        if row.get("elapsed") is not None:
+            values.update(elapsed_sum=row["elapsed"], elapsed_count=1)
+        if row.get("tpdex") is not None:
+            values.update(tpdex_sum=row["tpdex"], tpdex_count=1)
+        _add(
+            row,
+            errors=int(row.get("x_status_class") in ("5xx", "ERR")),
+            cached=int(bool(row.get("x_cached"))),
+            **values,
+        )
+
+    for row in transactions:
+        if row.get("finished_at") is not None:
+            _add_finished(row, count=1)
+        else:
+            _add(row, count=1)
+
+    for row in updates:
+        _add_finished(row)
+
+    return [
+        {"time_bucket": time_bucket, "started_at": started_at, "endpoint": endpoint, **values}
+        for (time_bucket, started_at, endpoint), values in sorted(rollups.items())
+    ]
+
+
+def get_latency_rollup_rows(rows: Iterable[dict]) -> list[dict]:
+    """Returns the latency sketch increments for the given finished transaction (or transaction update) rows, sorted
+    by key (see :func:`get_rollup_rows`)."""
+    counts = {}
+    for row in rows:
+        if row.get("elapsed") is None:
+            continue
+        index = get_bin(row["elapsed"])
+        for time_bucket in ROLLUP_TIME_BUCKETS:
+            key = (*_get_rollup_key(row, time_bucket), index)
+            counts[key] = counts.get(key, 0) + 1
+
+    return [
+        {"time_bucket": time_bucket, "started_at": started_at, "endpoint": endpoint, "bin": index, "count": count}
+        for (time_bucket, started_at, endpoint, index), count in sorted(counts.items())
+    ]
+
+
+class TransactionRollupsRepository(Repository[TransactionRollup]):
+    Type = TransactionRollup
+
+    @with_session
+    async def add(self, /, transactions: Iterable[dict] = (), updates: Iterable[dict] = (), *, session):
+        """Increments the rollups (and latency sketches) with the given transaction and update rows (without
+        commiting)."""
+        transactions, updates = list(transactions), list(updates)
+        dialect_name = session.bind.dialect.name
+
+        rows = get_rollup_rows(transactions, updates)
+        if rows:
+            await session.execute(
+                upsert_increment(TransactionRollup, columns=ROLLUP_COLUMNS, dialect_name=dialect_name), rows
+            )
+
+        rows = get_latency_rollup_rows(
+            [row for row in transactions if row.get("finished_at") is not None] + updates,
+        )
+        if rows:
+            await session.execute(
+                upsert_increment(TransactionLatencyRollup, columns=("count",), dialect_name=dialect_name), rows
+            )
+
+    def delete_old(self, time_bucket: str, old_after: timedelta, /, *, latency=False):
+        """Deletes the rollups (or latency sketches, with `latency`) of the given time bucket older than `old_after`."""
+        threshold = datetime.now(UTC) - old_after
+        Type = TransactionLatencyRollup if latency else self.Type
+        return delete(Type).where((Type.time_bucket == time_bucket) & (Type.started_at < threshold))
@@ -1,8 +1,14 @@
-from sqlalchemy import ForeignKey, Integer, String, UniqueConstraint
+from sqlalchemy import ForeignKey, Integer, String, UniqueConstraint, select, tuple_
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
+from harp.utils.collections import LRUCache
+
+from ..utils.sql import insert_ignore
 from . import Base
-from .base import Repository
+from .base import Repository, with_session
+
+#: Number of tag (and tag value) ids kept in memory by the repositories.
+ID_CACHE_SIZE = 4096
 
 
 class Tag(Base):
@@ -15,6 +21,27 @@ class Tag(Base):
 class TagsRepository(Repository[Tag]):
     Type = Tag
 
+    def __init__(self, session_factory, /, *, cache_size=ID_CACHE_SIZE):
+        super().__init__(session_factory)
+
+        #: Ids of known tags, by name. Tags are never deleted, so it never gets stale.
+        self.ids = LRUCache(cache_size)
+
+    @with_session
+    async def find_or_create_ids(self, names, /, *, session) -> dict[str, int]:
+        """Returns the ids of the given tag names, creating the missing tags (without commiting)."""
+        tag_ids = {name: self.ids[name] for name in names if name in self.ids}
+
+        missing = set(names) - set(tag_ids)
+        if missing:
+            await session.execute(
+                insert_ignore(Tag, dialect_name=session.bind.dialect.name), [{"name": name} for name in missing]
+            )
+            for name, tag_id in await session.execute(select(Tag.name, Tag.id).where(Tag.name.in_(missing))):
+                tag_ids[name] = self.ids[name] = tag_id
+
+        return tag_ids
+
 
 class TagValue(Base):
     __tablename__ = "tag_values"
@@ -30,3 +57,28 @@ class TagValue(Base):
 
 class TagValuesRepository(Repository[TagValue]):
     Type = TagValue
+
+    def __init__(self, session_factory, /, *, cache_size=ID_CACHE_SIZE):
+        super().__init__(session_factory)
+
+        #: Ids of known tag values, by (tag_id, value) pair. Values are never deleted, so it never gets stale.
+        self.ids = LRUCache(cache_size)
+
+    @with_session
+    async def find_or_create_ids(self, pairs, /, *, session) -> dict[tuple[int, str], int]:
+        """Returns the ids of the given (tag_id, value) pairs, creating the missing values (without commiting)."""
+        value_ids = {pair: self.ids[pair] for pair in pairs if pair in self.ids}
+
+        missing = set(pairs) - set(value_ids)
+        if missing:
+            await session.execute(
+                insert_ignore(TagValue, dialect_name=session.bind.dialect.name),
+                [{"tag_id": tag_id, "value": value} for tag_id, value in missing],
+            )
+            query = select(TagValue.tag_id, TagValue.value, TagValue.id).where(
+                tuple_(TagValue.tag_id, TagValue.value).in_(missing)
+            )
+            for tag_id, value, value_id in await session.execute(query):
+                value_ids[(tag_id, value)] = self.ids[(tag_id, value)] = value_id
+
+        return value_ids
@@ -1,7 +1,20 @@
 from datetime import UTC, datetime, timedelta
 from typing import TYPE_CHECKING, List
 
-from sqlalchemy import TIMESTAMP, Boolean, Column, Float, ForeignKey, Integer, String, Table, exists, insert
+from sqlalchemy import (
+    TIMESTAMP,
+    Boolean,
+    Column,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Table,
+    exists,
+    insert,
+    select,
+)
 from sqlalchemy.orm import Mapped, joinedload, mapped_column, relationship, selectinload
 
 from harp.models.transactions import Transaction as TransactionModel
@@ -18,16 +31,20 @@ transaction_tag_values_association_table = Table(
     Base.metadata,
     Column("transaction_id", ForeignKey("transactions.id", ondelete="CASCADE"), primary_key=True),
     Column("value_id", ForeignKey("tag_values.id", ondelete="CASCADE"), primary_key=True),
+    # copy of the transaction's start, used as partition key by the pg_partitions feature
+    Column("started_at", TIMESTAMP(timezone=True), nullable=True),
 )
 
 
 class Transaction(Base):
     __tablename__ = "transactions"
+    # transactions are listed (and paginated) ordered by (started_at, id)
+    __table_args__ = (Index("ix_transactions_started_at_id", "started_at", "id"),)
 
     id = mapped_column(String(27), primary_key=True, unique=True)
     type = mapped_column(String(10), index=True)
     endpoint = mapped_column(String(32), nullable=True, index=True)
-    started_at = mapped_column(TIMESTAMP(timezone=True), index=True)
+    started_at = mapped_column(TIMESTAMP(timezone=True))
     finished_at = mapped_column(TIMESTAMP(timezone=True), nullable=True)
     elapsed = mapped_column(Float(), nullable=True)
     tpdex = mapped_column(Integer(), nullable=True)
@@ -85,11 +102,12 @@ class Transaction(Base):
 class TransactionsRepository(Repository[Transaction]):
     Type = Transaction
 
-    def __init__(self, session_factory, /, tags=None, tag_values=None):
+    def __init__(self, session_factory, /, tags=None, tag_values=None, rollups=None):
         super().__init__(session_factory)
 
         self.tags = tags
         self.tag_values = tag_values
+        self.rollups = rollups
 
     def select(self, /, *, with_messages=False, with_user_flags=False, with_tags=False):
         query = super().select()
@@ -122,10 +140,21 @@ class TransactionsRepository(Repository[Transaction]):
 
         return query
 
-    def delete_old(self, old_after: timedelta):
+    def _is_old(self, old_after: timedelta):
         threshold = datetime.now(UTC) - old_after
         no_flags = ~exists().where(UserFlag.transaction_id == self.Type.id)
-        return self.delete().where((self.Type.started_at < threshold) & no_flags)
+        return (self.Type.started_at < threshold) & no_flags
+
+    def find_old(self, old_after: timedelta, /, *, limit=None):
+        """Selects the ids of transactions started more than `old_after` ago and not flagged, oldest first."""
+        query = select(self.Type.id).where(self._is_old(old_after)).order_by(self.Type.started_at, self.Type.id)
+        return query.limit(limit) if limit is not None else query
+
+    def delete_old(self, old_after: timedelta, /, *, ids=None):
+        """Deletes transactions started more than `old_after` ago and not flagged, only among `ids` if given (the
+        conditions are checked again, in case a transaction was flagged since its id was selected)."""
+        query = self.delete().where(self._is_old(old_after))
+        return query.where(self.Type.id.in_(ids)) if ids is not None else query
 
     @with_session
     async def create(self, values: dict | TransactionModel, /, *, session=None):
@@ -142,6 +171,8 @@ class TransactionsRepository(Repository[Transaction]):
                 tags=values.tags,
             )
         tags = values.pop("tags", {})
+        if self.rollups:
+            await self.rollups.add([values], session=session)
         transaction = await super().create(values, session=session)
         if len(tags):
             await self.set_tags(transaction, tags, session=session)
@@ -154,19 +185,27 @@ class TransactionsRepository(Repository[Transaction]):
         if not self.tag_values:
             raise ValueError("Tag values repository is not available.")
 
-        values = []
-        for name, value in tags.items():
-            db_tag = await self.tags.find_or_create_one({"name": name}, session=session)
-            db_value = await self.tag_values.find_or_create_one({"tag_id": db_tag.id, "value": value}, session=session)
-            values.append(
-                {
-                    "transaction_id": transaction.id,
-                    "value_id": db_value.id,
-                }
-            )
-
-        if len(values):
-            await session.execute(insert(transaction_tag_values_association_table), values)
+        tag_ids = await self.tags.find_or_create_ids(tags.keys(), session=session)
+        value_ids = await self.tag_values.find_or_create_ids(
+            {(tag_ids[name], value) for name, value in tags.items()}, session=session
+        )
+        values = [
+            {
+                "transaction_id": transaction.id,
+                "value_id": value_ids[(tag_ids[name], value)],
+                "started_at": transaction.started_at,
+            }
+            for name, value in tags.items()
+        ]
+
+        try:
+            if len(values):
+                await session.execute(insert(transaction_tag_values_association_table), values)
             await session.commit()
+        except Exception:
+            # tags created in the rolled back transaction may have been cached
+            self.tags.ids.clear()
+            self.tag_values.ids.clear()
+            raise
 
         return transaction
@@ -0,0 +1,154 @@
+from functools import cached_property
+from typing import Iterable, Optional, override
+
+from sqlalchemy import String, column, make_url, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from harp import get_logger
+
+from ..utils.sql import has_table
+from ._base import BaseOptional
+
+logger = get_logger(__name__)
+
+#: Name of the body search index table (on sqlite, a FTS5 table whose rowids are mapped to blob ids by a second table).
+BODY_SEARCH_TABLE_NAME = "blob_search"
+_SQLITE_IDS_TABLE_NAME = "blob_search_ids"
+
+#: Sqlite trigram searches need at least this many characters.
+_SQLITE_MIN_SEARCH_LENGTH = 3
+
+_INSTALL = {
+    "postgresql": [
+        f"""
+        CREATE TABLE {BODY_SEARCH_TABLE_NAME} (
+            blob_id VARCHAR(40) PRIMARY KEY REFERENCES blobs (id) ON DELETE CASCADE,
+            document TSVECTOR NOT NULL
+        )
+        """,
+        f"CREATE INDEX {BODY_SEARCH_TABLE_NAME}_document_gin ON {BODY_SEARCH_TABLE_NAME} USING gin (document)",
+    ],
+    "sqlite": [
+        f"CREATE TABLE {_SQLITE_IDS_TABLE_NAME} (id INTEGER PRIMARY KEY, blob_id VARCHAR(40) NOT NULL UNIQUE)",
+        f"CREATE VIRTUAL TABLE {BODY_SEARCH_TABLE_NAME} USING fts5(content, tokenize='trigram')",
+        f"""
+        CREATE TRIGGER {BODY_SEARCH_TABLE_NAME}_delete AFTER DELETE ON blobs BEGIN
+            DELETE FROM {BODY_SEARCH_TABLE_NAME}
+            WHERE rowid IN (SELECT id FROM {_SQLITE_IDS_TABLE_NAME} WHERE blob_id = old.id);
+            DELETE FROM {_SQLITE_IDS_TABLE_NAME} WHERE blob_id = old.id;
+        END
+        """,
+    ],
+}
+
+_UNINSTALL = {
+    "postgresql": [f"DROP TABLE IF EXISTS {BODY_SEARCH_TABLE_NAME}"],
+    "sqlite": [
+        f"DROP TRIGGER IF EXISTS {BODY_SEARCH_TABLE_NAME}_delete",
+        f"DROP TABLE IF EXISTS {BODY_SEARCH_TABLE_NAME}",
+        f"DROP TABLE IF EXISTS {_SQLITE_IDS_TABLE_NAME}",
+    ],
+}
+
+
+async def is_body_search_installed(conn) -> bool:
+    """Check if the body search index exists, using the given connection or session."""
+    return await has_table(conn, BODY_SEARCH_TABLE_NAME)
+
+
+async def index_bodies(session, bodies: Iterable[tuple[str, str]]):
+    """Adds (blob id, text content) pairs to the body search index. Blobs already indexed are skipped."""
+    bodies = list(bodies)
+    dialect_name = session.bind.dialect.name
+
+    if dialect_name == "postgresql":
+        await session.execute(
+            text(
+                f"INSERT INTO {BODY_SEARCH_TABLE_NAME} (blob_id, document) "
+                "VALUES (:blob_id, to_tsvector('simple', :content)) ON CONFLICT DO NOTHING"
+            ),
+            [{"blob_id": blob_id, "content": content} for blob_id, content in bodies],
+        )
+    elif dialect_name == "sqlite":
+        for blob_id, content in bodies:
+            row = (
+                await session.execute(
+                    text(f"INSERT OR IGNORE INTO {_SQLITE_IDS_TABLE_NAME} (blob_id) VALUES (:blob_id) RETURNING id"),
+                    {"blob_id": blob_id},
+                )
+            ).first()
+            if row is not None:
+                await session.execute(
+                    text(f"INSERT INTO {BODY_SEARCH_TABLE_NAME} (rowid, content) VALUES (:id, :content)"),
+                    {"id": row[0], "content": content},
+                )
+    else:
+        raise NotImplementedError(f"Body search is not available for «{dialect_name}» databases.")
+
+
+def get_matching_blob_ids(search_text: str, dialect_name: str) -> Optional[object]:
+    """Returns a select of the ids of blobs matching the search text, or None if the text cannot be searched."""
+    if dialect_name == "postgresql":
+        query = text(
+            f"SELECT blob_id FROM {BODY_SEARCH_TABLE_NAME} "
+            "WHERE document @@ plainto_tsquery('simple', :body_search_text)"
+        ).bindparams(body_search_text=search_text)
+    elif dialect_name == "sqlite" and len(search_text) >= _SQLITE_MIN_SEARCH_LENGTH:
+        query = text(
+            f"SELECT {_SQLITE_IDS_TABLE_NAME}.blob_id FROM {BODY_SEARCH_TABLE_NAME} "
+            f"JOIN {_SQLITE_IDS_TABLE_NAME} ON {_SQLITE_IDS_TABLE_NAME}.id = {BODY_SEARCH_TABLE_NAME}.rowid "
+            f"WHERE {BODY_SEARCH_TABLE_NAME} MATCH :body_search_text"
+        ).bindparams(body_search_text='"' + search_text.replace('"', '""') + '"')
+    else:
+        return None
+    return query.columns(column("blob_id", String))
+
+
+class BodySearchOptional(BaseOptional):
+    """
+    Installs or uninstalls a full-text index of message bodies, searched along with endpoints and message summaries.
+
+    On PostgreSQL, the index is a table of ``tsvector`` documents with a GIN index, on SQLite a FTS5 table (using the
+    trigram tokenizer, like the sqlite_fts5 optional). The index is filled in the background by the storage, from
+    text-like bodies under a size limit (see :class:`BodyIndexer <harp_apps.sqlalchemy_storage.indexer.BodyIndexer>`).
+    Bodies stored before installation are not indexed.
+
+    """
+
+    def __init__(self, db_url):
+        self._url = db_url
+
+    @cached_property
+    def engine(self):
+        engine = create_async_engine(self.url)
+
+        if engine.dialect.name not in _INSTALL:
+            raise RuntimeError("This optional is only available for PostgreSQL and SQLite databases.")
+
+        return engine
+
+    @cached_property
+    def url(self):
+        return make_url(self._url)
+
+    @override
+    async def is_supported(self):
+        return self.url.get_dialect().name in _INSTALL
+
+    @override
+    async def install(self):
+        """Install this optional feature in the database (creates the index tables)."""
+        async with self.engine.begin() as conn:
+            if await is_body_search_installed(conn):
+                logger.info("🛢 Body search index is already installed.")
+                return
+
+            for sql in _INSTALL[self.engine.dialect.name]:
+                await conn.execute(text(sql))
+
+    @override
+    async def uninstall(self):
+        """Remove this optional feature from database (drops the index tables)."""
+        async with self.engine.begin() as conn:
+            for sql in _UNINSTALL[self.engine.dialect.name]:
+                await conn.execute(text(sql))
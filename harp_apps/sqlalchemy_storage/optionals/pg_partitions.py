@@ -0,0 +1,311 @@
+from datetime import UTC, date, datetime, time, timedelta
+from functools import cached_property
+from typing import Iterable, override
+
+from sqlalchemy import make_url, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from harp import get_logger
+
+from ._base import BaseOptional
+
+logger = get_logger(__name__)
+
+#: Partitioned tables, with their partition key column (rows are partitioned by day of this column, in UTC).
+PARTITIONED_TABLES = {
+    "transactions": "started_at",
+    "messages": "created_at",
+    "trans_tag_values": "started_at",
+}
+
+#: Primary keys of the partitioned tables (the partition key must be part of it).
+_PRIMARY_KEYS = {
+    "transactions": ("id", "started_at"),
+    "messages": ("id", "created_at"),
+    "trans_tag_values": ("transaction_id", "value_id", "started_at"),
+}
+
+#: Foreign keys to transactions, that cannot be enforced on partitioned tables (restored on uninstall).
+_TRANSACTION_FOREIGN_KEYS = {
+    "messages": "messages_transaction_id_fkey",
+    "trans_tag_values": "trans_tag_values_transaction_id_fkey",
+    "trans_user_flags": "trans_user_flags_transaction_id_fkey",
+}
+
+#: Number of upcoming days with partitions created in advance.
+PARTITIONS_AHEAD = 3
+
+_FLAGGED = "EXISTS (SELECT 1 FROM trans_user_flags f WHERE f.transaction_id = {})"
+
+
+def get_partition_name(table: str, day: date) -> str:
+    return f"{table}_p{day:%Y%m%d}"
+
+
+def _get_bounds(day: date) -> tuple[datetime, datetime]:
+    start = datetime.combine(day, time(), tzinfo=UTC)
+    return start, start + timedelta(days=1)
+
+
+async def is_pg_partitions_installed(conn) -> bool:
+    """Check if the transactions table is partitioned, using the given (postgresql) connection or session."""
+    result = await conn.execute(
+        text("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:name)").bindparams(name="transactions")
+    )
+    return result.first() is not None
+
+
+async def get_partition_days(conn, table: str = "transactions") -> list[date]:
+    """Returns the days having a partition of the given table, sorted."""
+    result = await conn.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(:name)"
+        ).bindparams(name=table)
+    )
+    prefix = f"{table}_p"
+    return sorted(
+        datetime.strptime(name.removeprefix(prefix), "%Y%m%d").date()
+        for (name,) in result.all()
+        if name.startswith(prefix)
+    )
+
+
+async def create_partitions(conn, days: Iterable[date]):
+    """Creates the partitions of the given days, for all partitioned tables (existing partitions are skipped). Rows
+    of these days that were stored in the default partition are moved to the new partitions."""
+    days = sorted(set(days))
+    for table, key in PARTITIONED_TABLES.items():
+        existing = set(await get_partition_days(conn, table))
+        for day in days:
+            if day in existing:
+                continue
+            name, (start, end) = get_partition_name(table, day), _get_bounds(day)
+            await conn.execute(text(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS)"))
+            await conn.execute(
+                text(
+                    f"WITH moved AS (DELETE FROM {table}_default WHERE {key} >= :start AND {key} < :end RETURNING *) "
+                    f"INSERT INTO {name} SELECT * FROM moved"
+                ).bindparams(start=start, end=end)
+            )
+            await conn.execute(
+                text(f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM ('{start}') TO ('{end}')")
+            )
+
+
+async def drop_partitions(conn, day: date) -> int:
+    """
+    Drops the partitions of the given day, for all partitioned tables, except for flagged transactions (with their
+    messages and tags), that are moved to the default partitions. The reference counts of the blobs of the dropped
+    messages are decremented. Returns the number of kept transactions.
+
+    Detaching a partition locks its parent table exclusively until the end of the database transaction, blocking the
+    storage writer. As the partitions of an old day are not written anymore, the flagged rows are copied aside and the
+    blob references are released first, and the partitions are only detached at the end, so that the parent tables
+    stay locked only while the (few) flagged rows are moved back and the partitions dropped.
+    """
+    names = {table: get_partition_name(table, day) for table in PARTITIONED_TABLES}
+    existing = [table for table in PARTITIONED_TABLES if day in await get_partition_days(conn, table)]
+
+    flagged_by = {"transactions": "t.id", "messages": "t.transaction_id", "trans_tag_values": "t.transaction_id"}
+    for table in existing:
+        await conn.execute(
+            text(
+                f"CREATE TEMPORARY TABLE kept_{table} ON COMMIT DROP AS "
+                f"SELECT * FROM {names[table]} t WHERE {_FLAGGED.format(flagged_by[table])}"
+            )
+        )
+    if "messages" in existing:
+        await _release_blob_refs(conn, names["messages"])
+
+    kept = 0
+    for table in existing:
+        await conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {names[table]}"))
+        result = await conn.execute(text(f"INSERT INTO {table} SELECT * FROM kept_{table}"))
+        if table == "transactions":
+            kept = result.rowcount
+        await conn.execute(text(f"DROP TABLE {names[table]}, kept_{table}"))
+
+    return kept
+
+
+async def _release_blob_refs(conn, messages_table: str):
+    # references of the dropped messages, counted by blob, then applied in blob id order (as the storage writer does)
+    # so that concurrent reference count updates cannot deadlock.
+    not_flagged = f"NOT {_FLAGGED.format('m.transaction_id')}"
+    await conn.execute(
+        text(
+            "CREATE TEMPORARY TABLE released_blob_refs ON COMMIT DROP AS "
+            "SELECT blob_id, count(*) AS refs FROM ("
+            f"SELECT m.headers AS blob_id FROM {messages_table} m WHERE {not_flagged} "
+            f"UNION ALL SELECT m.body FROM {messages_table} m WHERE {not_flagged}"
+            ") r WHERE blob_id IS NOT NULL AND blob_id <> '' GROUP BY blob_id"
+        )
+    )
+    await conn.execute(
+        text("SELECT 1 FROM blobs WHERE id IN (SELECT blob_id FROM released_blob_refs) ORDER BY id FOR UPDATE")
+    )
+    await conn.execute(
+        text("UPDATE blobs SET refs = blobs.refs - r.refs FROM released_blob_refs r WHERE blobs.id = r.blob_id")
+    )
+    await conn.execute(text("DROP TABLE released_blob_refs"))
+
+
+class PgPartitionsOptional(BaseOptional):
+    """
+    Converts the transactions, messages and transaction tags tables to tables partitioned by day (of the transaction
+    start, or message creation), so that the janitor can apply the retention policy by dropping whole partitions
+    instead of deleting rows, without vacuum pressure or index bloat.
+
+    Installing copies all the rows of these tables, in one database transaction, so it should happen during a
+    maintenance window on large databases. Partitions are created from the oldest stored day, and the janitor then
+    creates the partitions of upcoming days in advance. Rows without a partition (and flagged transactions of dropped
+    days) are stored in a default partition.
+
+    The database does not enforce the foreign keys from messages, tags and flags to transactions anymore (they
+    cannot reference partitioned tables). They are restored when uninstalling, which copies the rows again.
+
+    """
+
+    def __init__(self, db_url):
+        self._url = db_url
+
+    @cached_property
+    def engine(self):
+        engine = create_async_engine(self.url)
+
+        if engine.dialect.name != "postgresql":
+            raise RuntimeError("This optional is only available for PostgreSQL databases.")
+
+        return engine
+
+    @cached_property
+    def url(self):
+        return make_url(self._url)
+
+    @override
+    async def is_supported(self):
+        return self.url.get_dialect().name == "postgresql"
+
+    @override
+    async def install(self):
+        """Install this optional feature in the database (converts the tables to partitioned tables)."""
+        async with self.engine.begin() as conn:
+            if await is_pg_partitions_installed(conn):
+                logger.info("🛢 Partitioned tables are already installed.")
+                return
+
+            # partition keys are part of the primary keys, they cannot be null
+            await conn.execute(
+                text(
+                    "UPDATE messages m SET created_at = t.started_at FROM transactions t "
+                    "WHERE m.created_at IS NULL AND t.id = m.transaction_id"
+                )
+            )
+            await conn.execute(
+                text(
+                    "UPDATE trans_tag_values v SET started_at = t.started_at FROM transactions t "
+                    "WHERE v.started_at IS NULL AND t.id = v.transaction_id"
+                )
+            )
+            for table, key in PARTITIONED_TABLES.items():
+                await conn.execute(text(f"UPDATE {table} SET {key} = now() WHERE {key} IS NULL"))
+
+            oldest = (await conn.execute(text("SELECT min(started_at) FROM transactions"))).scalar()
+            today = datetime.now(UTC).date()
+            first_day = min(oldest.astimezone(UTC).date(), today) if oldest else today
+
+            for table, key in PARTITIONED_TABLES.items():
+                await self._convert(conn, table, f"PARTITION BY RANGE ({key})")
+
+            # rows are copied to the default partitions first, then moved to the day partitions
+            await create_partitions(
+                conn, (first_day + timedelta(days=i) for i in range((today - first_day).days + PARTITIONS_AHEAD + 1))
+            )
+
+    @override
+    async def uninstall(self):
+        """Remove this optional feature from database (converts the tables back to regular tables)."""
+        async with self.engine.begin() as conn:
+            if not await is_pg_partitions_installed(conn):
+                logger.info("🛢 Partitioned tables are not installed.")
+                return
+
+            for table in PARTITIONED_TABLES:
+                await self._convert(conn, table, "")
+
+            # rows of deleted transactions were not deleted by the database, foreign keys would not be valid
+            for table, name in _TRANSACTION_FOREIGN_KEYS.items():
+                await conn.execute(
+                    text(
+                        f"DELETE FROM {table} r WHERE NOT EXISTS (SELECT 1 FROM transactions t WHERE t.id = r.transaction_id)"
+                    )
+                )
+                await conn.execute(
+                    text(
+                        f"ALTER TABLE {table} ADD CONSTRAINT {name} FOREIGN KEY (transaction_id) "
+                        "REFERENCES transactions (id) ON DELETE CASCADE"
+                    )
+                )
+
+    async def _convert(self, conn, table: str, partition_by: str):
+        """Replaces a table by a partitioned (or regular) copy, with the same rows, indexes and foreign keys to other
+        tables (the primary key includes the partition key only if partitioned)."""
+        partitioned = bool(partition_by)
+        indexes = (
+            (
+                await conn.execute(
+                    text(
+                        "SELECT indexdef FROM pg_indexes WHERE schemaname = current_schema() AND tablename = :table "
+                        "AND indexdef NOT LIKE 'CREATE UNIQUE %' "
+                        "AND indexname NOT IN (SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(:table))"
+                    ).bindparams(table=table)
+                )
+            )
+            .scalars()
+            .all()
+        )
+        # foreign keys to other tables than the partitioned ones are kept (for example, tag values)
+        foreign_keys = (
+            await conn.execute(
+                text(
+                    "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+                    "WHERE conrelid = to_regclass(:table) AND contype = 'f' AND confrelid NOT IN ("
+                    + ", ".join(f"to_regclass('{name}')" for name in PARTITIONED_TABLES)
+                    + ")"
+                ).bindparams(table=table)
+            )
+        ).all()
+        has_id = "id" in _PRIMARY_KEYS[table]
+        sequence = (
+            (await conn.execute(text("SELECT pg_get_serial_sequence(:table, 'id')").bindparams(table=table))).scalar()
+            if has_id
+            else None
+        )
+
+        await conn.execute(text(f"CREATE TABLE {table}_new (LIKE {table} INCLUDING DEFAULTS) {partition_by}"))
+        if partitioned:
+            await conn.execute(text(f"ALTER TABLE {table}_new ALTER COLUMN {PARTITIONED_TABLES[table]} SET NOT NULL"))
+            await conn.execute(text(f"CREATE TABLE {table}_default PARTITION OF {table}_new DEFAULT"))
+        await conn.execute(text(f"INSERT INTO {table}_new SELECT * FROM {table}"))
+
+        if sequence:
+            await conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY NONE"))
+        # also drops the foreign keys referencing the table
+        await conn.execute(text(f"DROP TABLE {table} CASCADE"))
+        await conn.execute(text(f"ALTER TABLE {table}_new RENAME TO {table}"))
+        if sequence:
+            await conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {table}.id"))
+
+        if partitioned:
+            primary_key = _PRIMARY_KEYS[table]
+        else:
+            primary_key = tuple(column for column in _PRIMARY_KEYS[table] if column != PARTITIONED_TABLES[table])
+        await conn.execute(text(f"ALTER TABLE {table} ADD PRIMARY KEY ({', '.join(primary_key)})"))
+        if has_id and not partitioned:
+            # unique constraint created along with the tables (a partitioned table cannot have it)
+            await conn.execute(text(f"ALTER TABLE {table} ADD CONSTRAINT {table}_id_key UNIQUE (id)"))
+        for indexdef in indexes:
+            await conn.execute(text(indexdef))
+        for name, definition in foreign_keys:
+            await conn.execute(text(f"ALTER TABLE {table} ADD CONSTRAINT {name} {definition}"))
@@ -0,0 +1,112 @@
+from functools import cached_property
+from typing import override
+
+from sqlalchemy import make_url, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from harp import get_logger
+
+from ._base import BaseOptional
+
+logger = get_logger(__name__)
+
+#: Name of the full-text index table, with one row per message (rowid is the message id).
+FTS_TABLE_NAME = "messages_fts"
+
+_TRIGGERS = {
+    "messages_fts_insert": f"""
+        CREATE TRIGGER messages_fts_insert AFTER INSERT ON messages BEGIN
+            INSERT INTO {FTS_TABLE_NAME} (rowid, summary, endpoint)
+            VALUES (new.id, new.summary, (SELECT endpoint FROM transactions WHERE id = new.transaction_id));
+        END
+    """,
+    "messages_fts_update": f"""
+        CREATE TRIGGER messages_fts_update AFTER UPDATE OF summary, transaction_id ON messages BEGIN
+            UPDATE {FTS_TABLE_NAME}
+            SET summary = new.summary, endpoint = (SELECT endpoint FROM transactions WHERE id = new.transaction_id)
+            WHERE rowid = old.id;
+        END
+    """,
+    "messages_fts_delete": f"""
+        CREATE TRIGGER messages_fts_delete AFTER DELETE ON messages BEGIN
+            DELETE FROM {FTS_TABLE_NAME} WHERE rowid = old.id;
+        END
+    """,
+    "transactions_fts_update": f"""
+        CREATE TRIGGER transactions_fts_update AFTER UPDATE OF endpoint ON transactions BEGIN
+            UPDATE {FTS_TABLE_NAME} SET endpoint = new.endpoint
+            WHERE rowid IN (SELECT id FROM messages WHERE transaction_id = new.id);
+        END
+    """,
+}
+
+
+async def is_sqlite_fts5_installed(conn) -> bool:
+    """Check if the full-text index table exists, using the given (sqlite) connection or session."""
+    result = await conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name").bindparams(name=FTS_TABLE_NAME)
+    )
+    return result.first() is not None
+
+
+class SqliteFts5Optional(BaseOptional):
+    """
+    Installs or uninstalls a sqlite FTS5 full-text index for the transaction search, as an alternative to the default
+    ``LIKE '%...%'`` scans.
+
+    The index has one row per message, with the message summary and its transaction's endpoint, and is kept in sync
+    by triggers on the ``messages`` and ``transactions`` tables. It uses the trigram tokenizer (sqlite 3.34+), so
+    that searches keep the same case-insensitive substring semantics (search terms shorter than 3 characters still
+    use the default search).
+
+    """
+
+    def __init__(self, db_url):
+        self._url = db_url
+
+    @cached_property
+    def engine(self):
+        engine = create_async_engine(self.url)
+
+        if engine.dialect.name != "sqlite":
+            raise RuntimeError("This optional is only available for SQLite databases.")
+
+        return engine
+
+    @cached_property
+    def url(self):
+        return make_url(self._url)
+
+    @override
+    async def is_supported(self):
+        return self.url.get_dialect().name == "sqlite"
+
+    @override
+    async def install(self):
+        """Install this optional feature in the database. This will create the full-text index table and its
+        triggers, then index the existing messages."""
+        async with self.engine.begin() as conn:
+            if await is_sqlite_fts5_installed(conn):
+                logger.info("🛢 Sqlite full-text index is already installed.")
+                return
+
+            await conn.execute(
+                text(f"CREATE VIRTUAL TABLE {FTS_TABLE_NAME} USING fts5(summary, endpoint, tokenize='trigram')")
+            )
+            for sql in _TRIGGERS.values():
+                await conn.execute(text(sql))
+            await conn.execute(
+                text(
+                    f"INSERT INTO {FTS_TABLE_NAME} (rowid, summary, endpoint) "
+                    "SELECT messages.id, messages.summary, transactions.endpoint FROM messages "
+                    "LEFT OUTER JOIN transactions ON transactions.id = messages.transaction_id"
+                )
+            )
+
+    @override
+    async def uninstall(self):
+        """Remove this optional feature from database (triggers and full-text index table)."""
+        async with self.engine.begin() as conn:
+            for name in _TRIGGERS:
+                await conn.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+            await conn.execute(text(f"DROP TABLE IF EXISTS {FTS_TABLE_NAME}"))
@@ -1,22 +1,142 @@
+from dataclasses import field
+from typing import Optional
+
 from sqlalchemy import URL, make_url
 
-from harp.config import BaseSetting, settings_dataclass
+from harp.config import BaseSetting, asdict, settings_dataclass
+from harp.errors import ConfigurationValueError
 from harp.utils.env import cast_bool
 
 
+@settings_dataclass
+class SqlAlchemyStorageWriterSettings(BaseSetting):
+    """Settings of the batching writer, used to write transactions, messages and blobs to the database."""
+
+    #: Number of pending items (transactions, messages, blobs, updates) that triggers a flush.
+    batch_size: int = 100
+
+    #: Maximum delay (in milliseconds) before pending items are flushed.
+    flush_interval: int = 50
+
+    #: Number of concurrent workers writing batches to the database.
+    workers: int = 1
+
+    #: Maximum number of items waiting to be written. Past this, new transactions are dropped.
+    max_queue_size: int = 10000
+
+    #: Number of waiting items past which bodies are dropped. Messages are dropped too once the queue is halfway between
+    #: this and `max_queue_size`.
+    high_water_mark: int = 5000
+
+    #: Number of recently written blob ids to remember, to avoid writing the same blobs again.
+    blob_cache_size: int = 10000
+
+    #: Directory of the spill log. If set, items that cannot be written right away (queue past the high-water mark,
+    #: database unavailable) are written there instead of being dropped, and replayed later.
+    spill_path: Optional[str] = None
+
+    #: Maximum size (in bytes) of the spill log. Past this, items are dropped again.
+    spill_max_size: int = 1024 * 1024 * 1024
+
+    def __post_init__(self):
+        super().__post_init__()
+        self.batch_size = int(self.batch_size)
+        self.flush_interval = int(self.flush_interval)
+        self.workers = int(self.workers)
+        self.max_queue_size = int(self.max_queue_size)
+        self.high_water_mark = int(self.high_water_mark)
+        self.blob_cache_size = int(self.blob_cache_size)
+        self.spill_max_size = int(self.spill_max_size)
+
+        if self.high_water_mark > self.max_queue_size:
+            raise ConfigurationValueError(
+                f"Invalid storage writer settings: high_water_mark ({self.high_water_mark}) cannot be greater than "
+                f"max_queue_size ({self.max_queue_size})."
+            )
+
+
+@settings_dataclass
+class SqlAlchemyStorageBlobsSettings(BaseSetting):
+    """Settings of the blob backend, deciding where the content of blobs is stored."""
+
+    #: Either "database" (blob data is stored in the blobs table) or "filesystem" (blob data is stored in files under
+    #: `path`, the database only keeps metadata).
+    type: str = "database"
+
+    #: Directory of the blob files, for the filesystem backend.
+    path: Optional[str] = None
+
+    #: Compression codec of blob data at rest, either "zlib" or "zstd" (requires the zstandard package). Disabled if
+    #: not set.
+    compression: Optional[str] = None
+
+    #: Compression level, defaults to the codec's default.
+    compression_level: Optional[int] = None
+
+    #: Whether to train (and use) per-endpoint compression dictionaries.
+    compression_dictionaries: bool = True
+
+    #: Maximum size (in bytes) of the text bodies added to the body search index, if installed (see the body_search
+    #: database feature).
+    search_max_size: int = 65536
+
+    #: Maximum total size (in bytes) of the bodies waiting to be added to the body search index, bodies written while
+    #: it is reached are not indexed.
+    search_max_queue_size: int = 16 * 1024 * 1024
+
+    def __post_init__(self):
+        super().__post_init__()
+        self.compression_dictionaries = cast_bool(self.compression_dictionaries)
+        self.search_max_size = int(self.search_max_size)
+        self.search_max_queue_size = int(self.search_max_queue_size)
+        if self.compression_level is not None:
+            self.compression_level = int(self.compression_level)
+
+        if self.compression not in (None, "zlib", "zstd"):
+            raise ConfigurationValueError(
+                f"Invalid blob compression codec «{self.compression}», expected one of «zlib» or «zstd»."
+            )
+
+        if self.type not in ("database", "filesystem"):
+            raise ConfigurationValueError(
+                f"Invalid blob backend type «{self.type}», expected one of «database» or «filesystem»."
+            )
+        if self.type == "filesystem" and not self.path:
+            raise ConfigurationValueError("The filesystem blob backend requires a path.")
+
+
 @settings_dataclass
 class SqlAlchemyStorageSettings(BaseSetting):
     type: str = "sqlalchemy"
     url: URL = make_url("sqlite+aiosqlite:///harp.db")
     migrate: bool = True
+    writer: SqlAlchemyStorageWriterSettings = field(default_factory=SqlAlchemyStorageWriterSettings)
+    blobs: SqlAlchemyStorageBlobsSettings = field(default_factory=SqlAlchemyStorageBlobsSettings)
 
     def __post_init__(self):
         self.migrate = cast_bool(self.migrate)
         self.url = make_url(self.url)
 
+        if self.writer is None:
+            self.writer = SqlAlchemyStorageWriterSettings()
+        if isinstance(self.writer, dict):
+            self.writer = SqlAlchemyStorageWriterSettings(**self.writer)
+
+        if self.blobs is None:
+            self.blobs = SqlAlchemyStorageBlobsSettings()
+        if isinstance(self.blobs, dict):
+            self.blobs = SqlAlchemyStorageBlobsSettings(**self.blobs)
+
     def _asdict(self, /, *, secure=True):
         return {
             "type": self.type,
             "url": self.url.render_as_string(hide_password=secure),
             "migrate": self.migrate,
+            # tuning settings are only shown if they differ from the defaults
+            **(
+                {"writer": asdict(self.writer, secure=secure)}
+                if self.writer != SqlAlchemyStorageWriterSettings()
+                else {}
+            ),
+            **({"blobs": asdict(self.blobs, secure=secure)} if self.blobs != SqlAlchemyStorageBlobsSettings() else {}),
         }
@@ -0,0 +1,304 @@
+"""
+Append-only local log used by the storage writer to keep rows it cannot write to the database right away (database
+unavailable or too slow), until they can be replayed.
+
+The log is a directory of segment files, written one after the other. Each segment starts with a magic header, followed
+by records::
+
+    kind (1 byte) | payload size (4 bytes) | payload crc32 (4 bytes) | payload
+
+Payloads are encoded using a compact, type-tagged binary format (close to msgpack, but limited to the types used by
+storage rows). A truncated or corrupted record (for example, after a crash while writing) ends the segment.
+
+"""
+
+import asyncio
+import os
+import struct
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator
+
+from harp import get_logger
+
+logger = get_logger(__name__)
+
+MAGIC = b"HARPSPL1"
+SEGMENT_SUFFIX = ".spill"
+FAILED_SUFFIX = ".failed"
+
+#: Record kinds, as stored in the first byte of each record.
+KINDS = ("transaction", "blob", "message", "update")
+_KIND_IDS = {kind: i for i, kind in enumerate(KINDS)}
+
+_RECORD_HEADER = struct.Struct(">BII")
+_LENGTH = struct.Struct(">I")
+_INT = struct.Struct(">q")
+_FLOAT = struct.Struct(">d")
+
+_NONE, _FALSE, _TRUE, _INTEGER, _DOUBLE, _STR, _BYTES, _DATETIME, _LIST, _DICT = range(10)
+
+
+def pack(value) -> bytes:
+    """Encodes a value (None, bool, int, float, str, bytes, datetime, and lists/dicts of those) to bytes."""
+    buffer = bytearray()
+    _pack(value, buffer)
+    return bytes(buffer)
+
+
+def _pack(value, buffer: bytearray):
+    if value is None:
+        buffer.append(_NONE)
+    elif value is True:
+        buffer.append(_TRUE)
+    elif value is False:
+        buffer.append(_FALSE)
+    elif isinstance(value, int):
+        buffer.append(_INTEGER)
+        buffer += _INT.pack(value)
+    elif isinstance(value, float):
+        buffer.append(_DOUBLE)
+        buffer += _FLOAT.pack(value)
+    elif isinstance(value, str):
+        data = value.encode("utf-8")
+        buffer.append(_STR)
+        buffer += _LENGTH.pack(len(data)) + data
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        buffer.append(_BYTES)
+        buffer += _LENGTH.pack(len(value)) + bytes(value)
+    elif isinstance(value, datetime):
+        data = value.isoformat().encode("ascii")
+        buffer.append(_DATETIME)
+        buffer += _LENGTH.pack(len(data)) + data
+    elif isinstance(value, (list, tuple)):
+        buffer.append(_LIST)
+        buffer += _LENGTH.pack(len(value))
+        for item in value:
+            _pack(item, buffer)
+    elif isinstance(value, dict):
+        buffer.append(_DICT)
+        buffer += _LENGTH.pack(len(value))
+        for key, item in value.items():
+            _pack(key, buffer)
+            _pack(item, buffer)
+    else:
+        raise TypeError(f"Cannot pack value of type {type(value).__name__}.")
+
+
+def unpack(data: bytes):
+    """Decodes a value encoded with :func:`pack`."""
+    value, offset = _unpack(memoryview(data), 0)
+    if offset != len(data):
+        raise ValueError(f"Unexpected trailing data ({len(data) - offset} bytes).")
+    return value
+
+
+def _unpack(data: memoryview, offset: int):
+    tag = data[offset]
+    offset += 1
+
+    if tag == _NONE:
+        return None, offset
+    if tag == _TRUE:
+        return True, offset
+    if tag == _FALSE:
+        return False, offset
+    if tag == _INTEGER:
+        return _INT.unpack_from(data, offset)[0], offset + _INT.size
+    if tag == _DOUBLE:
+        return _FLOAT.unpack_from(data, offset)[0], offset + _FLOAT.size
+
+    (length,) = _LENGTH.unpack_from(data, offset)
+    offset += _LENGTH.size
+
+    if tag == _STR:
+        return str(data[offset : offset + length], "utf-8"), offset + length
+    if tag == _BYTES:
+        return bytes(data[offset : offset + length]), offset + length
+    if tag == _DATETIME:
+        return datetime.fromisoformat(str(data[offset : offset + length], "ascii")), offset + length
+    if tag == _LIST:
+        items = []
+        for _ in range(length):
+            item, offset = _unpack(data, offset)
+            items.append(item)
+        return items, offset
+    if tag == _DICT:
+        items = {}
+        for _ in range(length):
+            key, offset = _unpack(data, offset)
+            items[key], offset = _unpack(data, offset)
+        return items, offset
+
+    raise ValueError(f"Unknown type tag {tag}.")
+
+
+class SpillLog:
+    """
+    Append-only log of storage rows, split in segment files of about `segment_size` bytes, under the `path`
+    directory. Once `max_size` bytes are used, appending fails (returns False), and callers should fallback to
+    dropping data.
+
+    Appended records are buffered in memory, and written to disk from a background task, in a worker thread, so that
+    appending never blocks the event loop on disk i/o (see :meth:`flush`).
+
+    Only closed segments are read back. :meth:`rotate` closes the current segment, so that everything appended so far
+    can be replayed.
+
+    """
+
+    def __init__(self, path, /, *, segment_size=16 * 1024 * 1024, max_size=1024 * 1024 * 1024):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+
+        self.segment_size = segment_size
+        self.max_size = max_size
+
+        self._file = None
+        self._file_size = 0
+
+        # records appended but not written to disk yet, and the background task writing them
+        self._pending = []
+        self._flusher = None
+        self._lock = asyncio.Lock()
+
+        segments = self.segments()
+        self._next_index = max((int(segment.stem) for segment in segments), default=0) + 1
+
+        #: Total size (in bytes) of the segments on disk.
+        self.size = sum(segment.stat().st_size for segment in segments)
+
+    def __bool__(self):
+        return self._file is not None or bool(self._pending) or bool(self.segments())
+
+    @property
+    def full(self):
+        return self.size >= self.max_size
+
+    def append(self, kind: str, row: dict) -> bool:
+        """Appends a record at the end of the log (buffered, see :meth:`flush`). Returns False if the log is full."""
+        if self.full:
+            return False
+
+        payload = pack(row)
+        record = _RECORD_HEADER.pack(_KIND_IDS[kind], len(payload), zlib.crc32(payload)) + payload
+
+        self._pending.append(record)
+        self.size += len(record)
+
+        if self._flusher is None or self._flusher.done():
+            try:
+                self._flusher = asyncio.get_running_loop().create_task(self._flush_pending())
+            except RuntimeError:
+                # no running event loop, records will be written by the next flush (or rotation)
+                pass
+        return True
+
+    async def flush(self):
+        """Writes the buffered records to the current segment, in a worker thread."""
+        await self._flush()
+
+    async def rotate(self):
+        """Writes the buffered records and closes the current segment (if any), next records will go to a new one."""
+        await self._flush(rotate=True)
+
+    def segments(self) -> list[Path]:
+        """Returns the closed segments, oldest first."""
+        current = self._file.name if self._file is not None else None
+        return sorted(
+            (
+                segment
+                for segment in self.path.glob("*" + SEGMENT_SUFFIX)
+                if segment.stem.isdigit() and str(segment) != current
+            ),
+            key=lambda segment: int(segment.stem),
+        )
+
+    def read(self, segment: Path) -> Iterator[tuple[str, dict]]:
+        """Yields the (kind, row) records of a segment, in order."""
+        with open(segment, "rb") as f:
+            data = f.read()
+
+        if not data.startswith(MAGIC):
+            logger.error(f"🛢 Invalid spill segment {segment}, ignoring.")
+            return
+
+        offset = len(MAGIC)
+        while offset < len(data):
+            if offset + _RECORD_HEADER.size > len(data):
+                logger.warning(f"🛢 Truncated record at the end of spill segment {segment}.")
+                return
+            kind, size, crc = _RECORD_HEADER.unpack_from(data, offset)
+            offset += _RECORD_HEADER.size
+            payload = data[offset : offset + size]
+            if len(payload) != size or zlib.crc32(payload) != crc or kind >= len(KINDS):
+                logger.warning(f"🛢 Corrupted record at the end of spill segment {segment}.")
+                return
+            offset += size
+            yield KINDS[kind], unpack(payload)
+
+    def remove(self, segment: Path):
+        """Removes a segment, once its records are written to the database."""
+        size = segment.stat().st_size
+        segment.unlink()
+        self.size -= size
+
+    def quarantine(self, segment: Path) -> Path:
+        """Moves a segment that cannot be replayed aside (with a `.failed` suffix, it is not read back anymore, but
+        can be inspected, or renamed back to be replayed again). Returns its new path."""
+        size = segment.stat().st_size
+        target = segment.with_suffix(FAILED_SUFFIX)
+        segment.rename(target)
+        self.size -= size
+        return target
+
+    async def close(self):
+        await self.rotate()
+
+    async def _flush(self, *, rotate=False):
+        async with self._lock:
+            records, self._pending = self._pending, []
+            if records or rotate:
+                self.size += await asyncio.to_thread(self._write, records, rotate)
+
+    async def _flush_pending(self):
+        while self._pending:
+            try:
+                await self._flush()
+            except Exception as exc:
+                logger.error(f"🛢 Error while writing to the spill log: {exc}", exc_info=exc)
+                return
+
+    def _write(self, records: list[bytes], rotate: bool) -> int:
+        """Writes records to the current segment (opening or rotating segments as needed), and returns the size of the
+        segment headers written. Runs in a worker thread."""
+        headers_size = 0
+        for record in records:
+            if self._file is None:
+                headers_size += self._open()
+            self._file.write(record)
+            self._file_size += len(record)
+            if self._file_size >= self.segment_size:
+                self._close()
+
+        if self._file is not None:
+            if rotate:
+                self._close()
+            else:
+                self._file.flush()
+        return headers_size
+
+    def _open(self) -> int:
+        filename = self.path / f"{self._next_index:016d}{SEGMENT_SUFFIX}"
+        self._next_index += 1
+        self._file = open(filename, "xb")
+        self._file.write(MAGIC)
+        self._file_size = len(MAGIC)
+        os.chmod(filename, 0o600)
+        return len(MAGIC)
+
+    def _close(self):
+        self._file.close()
+        self._file = None
+        self._file_size = 0
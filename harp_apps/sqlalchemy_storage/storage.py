@@ -1,12 +1,14 @@
 import asyncio
+import json
 import re
+from base64 import urlsafe_b64decode, urlsafe_b64encode
 from contextlib import asynccontextmanager
 from datetime import UTC, datetime, timedelta
 from functools import partial
 from operator import itemgetter
 from typing import Iterable, List, Optional, TypedDict, override
 
-from sqlalchemy import and_, bindparam, case, delete, func, literal, literal_column, null, or_, select, text, update
+from sqlalchemy import Integer, and_, bindparam, column, delete, func, literal, literal_column, null, or_, select, text
 from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.sql.functions import count
 from whistle import IAsyncEventDispatcher
@@ -18,14 +20,18 @@ from harp.models import Blob as BlobModel
 from harp.models.base import Results
 from harp.models.transactions import Transaction as TransactionModel
 from harp.settings import PAGE_SIZE
-from harp.typing.storage import Storage
+from harp.typing.storage import FacetCount, LatencyPercentiles, LatencyPercentilesByTimeBucket, Storage
 from harp.utils.background import AsyncWorkerQueue
 from harp.utils.dates import ensure_datetime
 from harp_apps.proxy.events import EVENT_TRANSACTION_ENDED, EVENT_TRANSACTION_MESSAGE, EVENT_TRANSACTION_STARTED
 
-from .constants import TimeBucket
+from .blob_backends import DatabaseBlobBackend, FilesystemBlobBackend
+from .compression import BlobCompressor
+from .constants import TOTAL_COUNT_CAP, TimeBucket, TotalCount
+from .indexer import BodyIndexer
 from .models import (
     FLAGS_BY_NAME,
+    FLAGS_BY_TYPE,
     Base,
     Blob,
     BlobsRepository,
@@ -37,13 +43,22 @@ from .models import (
     TagsRepository,
     TagValuesRepository,
     Transaction,
+    TransactionLatencyRollup,
+    TransactionRollup,
+    TransactionRollupsRepository,
     TransactionsRepository,
     User,
     UserFlag,
     UsersRepository,
 )
+from .models.rollups import ROLLUP_TIME_BUCKETS, truncate_datetime
+from .optionals.body_search import get_matching_blob_ids, is_body_search_installed
+from .optionals.sqlite_fts5 import FTS_TABLE_NAME, is_sqlite_fts5_installed
 from .settings import SqlAlchemyStorageSettings
+from .spill import SpillLog
 from .utils.dates import TruncDatetime
+from .utils.sketches import LatencySketch
+from .writer import BatchWriter
 
 
 class TransactionsGroupedByTimeBucket(TypedDict):
@@ -119,9 +134,32 @@ def _filter_query_for_user_flags(query, values, /, *, user_id):
     return query
 
 
-def _filter_transactions_based_on_text(query, search_text: str, dialect_name: str):
+def _filter_transactions_based_on_text(
+    query, search_text: str, dialect_name: str, *, sqlite_fts5=False, body_search=False
+):
     # Escape special characters in search_text
     search_text = re.sub(r"([-\*\(\)~\"@<>\^+]+)", r"", search_text)
+
+    # message bodies full-text index (see BodySearchOptional)
+    matching_blobs = get_matching_blob_ids(search_text, dialect_name) if body_search else None
+    matching_bodies = (
+        Transaction.id.in_(select(Message.transaction_id).where(Message.body.in_(matching_blobs)))
+        if matching_blobs is not None
+        else None
+    )
+
+    # sqlite full-text index (see SqliteFts5Optional), trigrams need at least 3 characters
+    if dialect_name == "sqlite" and sqlite_fts5 and len(search_text) >= 3:
+        matching_messages = text(f"SELECT rowid FROM {FTS_TABLE_NAME} WHERE {FTS_TABLE_NAME} MATCH :search_text")
+        condition = Transaction.id.in_(
+            select(Message.transaction_id).where(
+                Message.id.in_(
+                    matching_messages.bindparams(search_text=f'"{search_text}"').columns(column("rowid", Integer))
+                )
+            )
+        )
+        return query.filter(condition if matching_bodies is None else condition | matching_bodies)
+
     query = query.join(Message, isouter=True)
     # check dialect and use appropriate full text search
     if dialect_name == "mysql":
@@ -134,10 +172,51 @@ def _filter_transactions_based_on_text(query, search_text: str, dialect_name: st
             ).bindparams(bindparam("search_text", literal_column(f"'{search_text}*'")))
         )
 
-    return query.filter(
-        (Transaction.endpoint.ilike(bindparam("search_text", f"%{search_text}%")))
-        | Message.summary.ilike(bindparam("search_text", f"%{search_text}%"))
+    condition = (Transaction.endpoint.ilike(bindparam("search_text", f"%{search_text}%"))) | Message.summary.ilike(
+        bindparam("search_text", f"%{search_text}%")
+    )
+    return query.filter(condition if matching_bodies is None else condition | matching_bodies)
+
+
+def _encode_cursor(transaction: Transaction) -> str:
+    """Builds an opaque pagination cursor, pointing at the given transaction's position in the list."""
+    return urlsafe_b64encode(f"{transaction.started_at.isoformat()}|{transaction.id}".encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, str]:
+    try:
+        started_at, id = urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode().split("|", 1)
+        return datetime.fromisoformat(started_at), id
+    except ValueError as exc:
+        raise ValueError(f"Invalid pagination cursor «{cursor}».") from exc
+
+
+def _paginate_query(query, cursor: str, /, *, before=False):
+    """Keyset pagination, on (started_at, id): only keeps transactions after the cursor (older ones, as transactions are
+    listed newest first), or before the cursor (newer ones, returned oldest first)."""
+    started_at, id = _decode_cursor(cursor)
+
+    # the redundant range on started_at alone helps databases to use the index
+    if before:
+        query = query.filter(
+            Transaction.started_at >= started_at, or_(Transaction.started_at > started_at, Transaction.id > id)
+        )
+        return query.order_by(Transaction.started_at.asc(), Transaction.id.asc())
+
+    query = query.filter(
+        Transaction.started_at <= started_at, or_(Transaction.started_at < started_at, Transaction.id < id)
     )
+    return query.order_by(Transaction.started_at.desc(), Transaction.id.desc())
+
+
+def _get_latency_percentiles(tb: Optional[datetime], sketch: LatencySketch) -> LatencyPercentiles:
+    return {
+        "datetime": tb,
+        "count": len(sketch),
+        "p50": sketch.quantile(0.5),
+        "p95": sketch.quantile(0.95),
+        "p99": sketch.quantile(0.99),
+    }
 
 
 class SqlAlchemyStorage(Storage):
@@ -171,17 +250,40 @@ class SqlAlchemyStorage(Storage):
 
         self._is_ready = asyncio.Event()
         self._worker = None
+        self._writer = None
 
         self.blobs = BlobsRepository(self.session_factory)
         self.messages = MessagesRepository(self.session_factory)
         self.tags = TagsRepository(self.session_factory)
         self.tag_values = TagValuesRepository(self.session_factory)
-        self.transactions = TransactionsRepository(self.session_factory, tags=self.tags, tag_values=self.tag_values)
+        self.rollups = TransactionRollupsRepository(self.session_factory)
+        self.transactions = TransactionsRepository(
+            self.session_factory, tags=self.tags, tag_values=self.tag_values, rollups=self.rollups
+        )
         self.users = UsersRepository(self.session_factory)
         self.metrics = MetricsRepository(self.session_factory)
         self.metric_values = MetricValuesRepository(self.session_factory)
         self.flags = FlagsRepository(self.session_factory)
 
+        # fills the body search index (if installed) with the written blobs, in the background
+        self.indexer = BodyIndexer(
+            self.begin,
+            max_size=self.settings.blobs.search_max_size,
+            max_queue_bytes=self.settings.blobs.search_max_queue_size,
+        )
+
+        # where blob data is stored (the blobs table only keeps metadata with external backends)
+        self.blob_backend = (
+            FilesystemBlobBackend(self.settings.blobs.path)
+            if self.settings.blobs.type == "filesystem"
+            else DatabaseBlobBackend()
+        )
+        self.compressor = BlobCompressor(
+            self.settings.blobs.compression,
+            level=self.settings.blobs.compression_level,
+            dictionaries=self.settings.blobs.compression_dictionaries,
+        )
+
         self._debug = False
 
         logger.info(f"🛢 {type(self).__name__} url={self.settings.url}")
@@ -260,6 +362,10 @@ class SqlAlchemyStorage(Storage):
         await self.create_users(["anonymous"])
         self._is_ready.set()
 
+        # replay what may have been spilled before the last shutdown
+        if self.settings.writer.spill_path:
+            self.writer.start_replayer()
+
     async def _run_migrations(self):
         """Convenience helper to run the migrations. This behaviour can be disabled by setting migrate=false in the
         storage settings."""
@@ -281,9 +387,43 @@ class SqlAlchemyStorage(Storage):
             self._worker = AsyncWorkerQueue()
         return self._worker
 
+    @property
+    def writer(self):
+        if self._writer is None:
+            self._writer = BatchWriter(
+                self.begin,
+                batch_size=self.settings.writer.batch_size,
+                flush_interval=self.settings.writer.flush_interval,
+                workers=self.settings.writer.workers,
+                max_queue_size=self.settings.writer.max_queue_size,
+                high_water_mark=self.settings.writer.high_water_mark,
+                max_concurrent_writes=1 if self.engine.dialect.name == "sqlite" else None,
+                blob_cache_size=self.settings.writer.blob_cache_size,
+                tags=self.tags,
+                tag_values=self.tag_values,
+                blob_backend=self.blob_backend,
+                compressor=self.compressor,
+                spill=(
+                    SpillLog(self.settings.writer.spill_path, max_size=self.settings.writer.spill_max_size)
+                    if self.settings.writer.spill_path
+                    else None
+                ),
+                indexer=self.indexer,
+            )
+        return self._writer
+
+    async def finalize(self):
+        """Writes whatever is still pending and releases the database connections."""
+        if self._writer is not None:
+            await self._writer.close()
+        await self.indexer.close()
+        await self.engine.dispose()
+
     async def wait_for_background_tasks_to_be_processed(self):
         if self._worker:
             await self._worker.wait_until_empty()
+        if self._writer is not None:
+            await self._writer.wait_until_empty()
 
     @override
     async def get_facet_meta(self, name):
@@ -296,6 +436,49 @@ class SqlAlchemyStorage(Storage):
 
         raise NotImplementedError(f"Unknown facet: {name}")
 
+    @override
+    async def get_facet_counts(self, name: str, *, since: datetime, username: Optional[str] = None) -> List[FacetCount]:
+        """
+        Implements :meth:`Storage.get_facet_counts <harp.typing.storage.Storage.get_facet_counts>`.
+
+        Endpoint counts are read from the hour rollups, other counts only read the transactions started since the
+        given datetime (using the started_at index).
+
+        """
+        since = since.astimezone(UTC)
+        if name == "endpoint":
+            s_date, value, _count = TransactionRollup.started_at, TransactionRollup.endpoint, TransactionRollup.count
+            query = select(s_date, value, _count).where(
+                (TransactionRollup.time_bucket == TimeBucket.HOUR.value)
+                & (TransactionRollup.started_at >= truncate_datetime(since, TimeBucket.HOUR.value))
+            )
+        elif name in ("method", "status"):
+            s_date = TruncDatetime(literal(TimeBucket.HOUR.value), Transaction.started_at).label("tb")
+            value = getattr(Transaction, _FILTER_COLUMN_NAMES[name])
+            query = select(s_date, value, func.count()).where(Transaction.started_at >= since).group_by(s_date, value)
+        elif name == "flag":
+            s_date = TruncDatetime(literal(TimeBucket.HOUR.value), Transaction.started_at).label("tb")
+            user = await self.users.find_one_by_username(username or "anonymous")
+            query = (
+                select(s_date, UserFlag.type, func.count())
+                .join(Transaction, Transaction.id == UserFlag.transaction_id)
+                .where((UserFlag.user_id == user.id) & (Transaction.started_at >= since))
+                .group_by(s_date, UserFlag.type)
+            )
+        else:
+            raise NotImplementedError(f"Unknown facet: {name}")
+
+        async with self.begin() as session:
+            result = await session.execute(query)
+            return [
+                {
+                    "datetime": ensure_datetime(row[0], UTC),
+                    "value": FLAGS_BY_TYPE.get(row[1]) if name == "flag" else (row[1] or None),
+                    "count": int(row[2]),
+                }
+                for row in result.fetchall()
+            ]
+
     @override
     async def get_transaction_list(
         self,
@@ -306,11 +489,24 @@ class SqlAlchemyStorage(Storage):
         page: int = 1,
         cursor: str = "",
         text_search="",
+        after: str = "",
+        before: str = "",
+        total: str = TotalCount.EXACT.value,
     ):
         """
-        Implements :meth:`Storage.find_transactions <harp.typing.storage.Storage.find_transactions>`.
+        Implements :meth:`Storage.get_transaction_list <harp.typing.storage.Storage.get_transaction_list>`.
+
+        Pages are selected using keyset pagination if an `after` or `before` cursor is given (taken from the ``next``
+        and ``prev`` values of a previous result's meta), which costs the same whatever the page depth. Otherwise, the
+        `page` number is used as an offset.
+
+        Counting all matching rows can be much slower than fetching a page, so the `total` mode (see
+        :class:`TotalCount <harp_apps.sqlalchemy_storage.constants.TotalCount>`) allows to cap, estimate or skip it.
+        The kind of total actually computed is returned in the ``total_kind`` meta.
 
         """
+        if total not in [e.value for e in TotalCount]:
+            raise ValueError(f"Invalid total: {total}. Must be one of {', '.join([e.value for e in TotalCount])}.")
 
         user = await self.users.find_one_by_username(username)
 
@@ -329,9 +525,16 @@ class SqlAlchemyStorage(Storage):
             query = _numerical_filter_query(query, "tpdex", filters.get("tpdex", None))
 
         if text_search:
-            query = _filter_transactions_based_on_text(query, text_search, dialect_name=self.engine.dialect.name)
-
-        query = query.order_by(Transaction.started_at.desc())
+            dialect_name = self.engine.dialect.name
+            sqlite_fts5 = body_search = False
+            if dialect_name in ("sqlite", "postgresql"):
+                async with self.begin() as session:
+                    if dialect_name == "sqlite":
+                        sqlite_fts5 = await is_sqlite_fts5_installed(session)
+                    body_search = await is_body_search_installed(session)
+            query = _filter_transactions_based_on_text(
+                query, text_search, dialect_name=dialect_name, sqlite_fts5=sqlite_fts5, body_search=body_search
+            )
 
         # apply cursor (before count)
         if page and cursor:
@@ -339,21 +542,75 @@ class SqlAlchemyStorage(Storage):
 
         async with self.begin() as session:
             # count items from query
-            result.meta["total"] = await session.scalar(
-                query.with_only_columns(func.count(Transaction.id)).order_by(None)
+            result.meta["total"], result.meta["total_kind"] = await self._count_transactions(
+                session, query, TotalCount(total)
             )
 
-        # apply limit/offset (after count)
-        query = query.limit(PAGE_SIZE)
-        if page:
-            query = query.offset(max(0, (page - 1) * PAGE_SIZE))
+        # apply keyset or limit/offset (after count), fetching one more row to know if there is a next page
+        if after or before:
+            query = _paginate_query(query, before or after, before=bool(before))
+        else:
+            query = query.order_by(Transaction.started_at.desc(), Transaction.id.desc())
+            if page:
+                query = query.offset(max(0, (page - 1) * PAGE_SIZE))
+        query = query.limit(PAGE_SIZE + 1)
 
         async with self.begin() as session:
-            for transaction in (await session.scalars(query)).unique().all():
+            transactions = (await session.scalars(query)).unique().all()
+
+            has_more = len(transactions) > PAGE_SIZE
+            transactions = transactions[:PAGE_SIZE]
+            if before:
+                transactions = transactions[::-1]
+
+            for transaction in transactions:
                 result.append(transaction.to_model(with_user_flags=True))
 
+        if transactions:
+            has_next, has_prev = (True, has_more) if before else (has_more, bool(after) or page > 1)
+            result.meta["next"] = _encode_cursor(transactions[-1]) if has_next else None
+            result.meta["prev"] = _encode_cursor(transactions[0]) if has_prev else None
+        else:
+            result.meta["next"] = result.meta["prev"] = None
+
         return result
 
+    async def _count_transactions(self, session, query, mode: TotalCount) -> tuple[Optional[int], str]:
+        """Returns the total number of transactions matching a query, and the kind of total actually computed."""
+        if mode == TotalCount.NONE:
+            return None, TotalCount.NONE.value
+
+        if mode == TotalCount.EXACT:
+            return await session.scalar(query.with_only_columns(func.count(Transaction.id))), TotalCount.EXACT.value
+
+        if mode == TotalCount.ESTIMATED and self.engine.dialect.name == "postgresql":
+            estimate = await self._estimate_row_count(session, query.with_only_columns(Transaction.id))
+            # estimates are only worth it for large results, small ones are cheap to count exactly
+            if estimate > TOTAL_COUNT_CAP:
+                return estimate, TotalCount.ESTIMATED.value
+
+        # only count up to the cap (one more row to know if the cap is reached)
+        capped = await session.scalar(
+            select(func.count()).select_from(
+                query.with_only_columns(Transaction.id).limit(TOTAL_COUNT_CAP + 1).subquery()
+            )
+        )
+        if capped > TOTAL_COUNT_CAP:
+            return TOTAL_COUNT_CAP, TotalCount.CAPPED.value
+        return capped, TotalCount.EXACT.value
+
+    async def _estimate_row_count(self, session, query) -> int:
+        """Returns the number of rows the postgres query planner expects a query to return."""
+        compiled = query.compile(dialect=self.engine.dialect)
+        params = (
+            tuple(compiled.params[name] for name in compiled.positiontup) if compiled.positional else compiled.params
+        )
+        connection = await session.connection()
+        plan = (await connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled.string}", params)).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+
     @override
     async def get_transaction(self, id: str, /, *, username: str) -> Optional[TransactionModel]:
         user = await self.users.find_one_by_username(username)
@@ -379,26 +636,29 @@ class SqlAlchemyStorage(Storage):
                 f"Invalid time bucket: {time_bucket}. Must be one of {', '.join([e.value for e in TimeBucket])}."
             )
 
-        s_date = TruncDatetime(literal(time_bucket), Transaction.started_at).label("tb")
+        # read from the finest rollups that can be aggregated into the requested time buckets, so that the cost does
+        # not depend on the number of stored transactions.
+        rollup_time_bucket = time_bucket if time_bucket in ROLLUP_TIME_BUCKETS else TimeBucket.DAY.value
+        s_date = TruncDatetime(literal(time_bucket), TransactionRollup.started_at).label("tb")
         query = select(
             s_date,
-            func.count(),
-            func.sum(case((Transaction.x_status_class.in_(("5xx", "ERR")), 1), else_=0)),
-            func.sum(
-                case(
-                    (and_(Transaction.x_cached is not None, Transaction.x_cached != ""), 1),
-                    else_=0,
-                )
-            ),
-            func.avg(Transaction.elapsed),
-            func.avg(Transaction.tpdex),
-        )
+            func.sum(TransactionRollup.count),
+            func.sum(TransactionRollup.errors),
+            func.sum(TransactionRollup.cached),
+            func.sum(TransactionRollup.elapsed_sum),
+            func.sum(TransactionRollup.elapsed_count),
+            func.sum(TransactionRollup.tpdex_sum),
+            func.sum(TransactionRollup.tpdex_count),
+        ).where(TransactionRollup.time_bucket == rollup_time_bucket)
 
         if endpoint:
-            query = query.where(Transaction.endpoint == endpoint)
+            query = query.where(TransactionRollup.endpoint == endpoint)
 
         if start_datetime:
-            query = query.where(Transaction.started_at >= start_datetime.astimezone(UTC))
+            # the rollup containing the start datetime is included
+            query = query.where(
+                TransactionRollup.started_at >= truncate_datetime(start_datetime.astimezone(UTC), rollup_time_bucket)
+            )
 
         query = query.group_by(s_date).order_by(s_date.asc())
         async with self.begin() as session:
@@ -406,16 +666,58 @@ class SqlAlchemyStorage(Storage):
             return [
                 {
                     "datetime": ensure_datetime(row[0], UTC),
-                    "count": row[1],
+                    "count": int(row[1]),
                     "errors": int(row[2]),
                     "cached": int(row[3]),
-                    "meanDuration": row[4] if row[4] else 0,
-                    "meanTpdex": row[5],
-                    # ! probably sqlite struggling with unfinished transactions
+                    "meanDuration": row[4] / row[5] if row[5] else 0,
+                    "meanTpdex": row[6] / row[7] if row[7] else None,
                 }
                 for row in result.fetchall()
             ]
 
+    @override
+    async def latency_percentiles_by_time_bucket(
+        self,
+        endpoint: Optional[str] = None,
+        time_bucket: str = TimeBucket.DAY.value,
+        start_datetime: Optional[datetime] = None,
+    ) -> LatencyPercentilesByTimeBucket:
+        if time_bucket not in [e.value for e in TimeBucket]:
+            raise ValueError(
+                f"Invalid time bucket: {time_bucket}. Must be one of {', '.join([e.value for e in TimeBucket])}."
+            )
+
+        # merge the latency sketches of the finest rollups that can be aggregated into the requested time buckets
+        rollup_time_bucket = time_bucket if time_bucket in ROLLUP_TIME_BUCKETS else TimeBucket.DAY.value
+        s_date = TruncDatetime(literal(time_bucket), TransactionLatencyRollup.started_at).label("tb")
+        query = select(s_date, TransactionLatencyRollup.bin, func.sum(TransactionLatencyRollup.count)).where(
+            TransactionLatencyRollup.time_bucket == rollup_time_bucket
+        )
+
+        if endpoint:
+            query = query.where(TransactionLatencyRollup.endpoint == endpoint)
+
+        if start_datetime:
+            query = query.where(
+                TransactionLatencyRollup.started_at
+                >= truncate_datetime(start_datetime.astimezone(UTC), rollup_time_bucket)
+            )
+
+        query = query.group_by(s_date, TransactionLatencyRollup.bin)
+        sketches: dict[datetime, LatencySketch] = {}
+        async with self.begin() as session:
+            for tb, index, count in (await session.execute(query)).all():
+                sketches.setdefault(ensure_datetime(tb, UTC), LatencySketch()).add_bins([(index, int(count))])
+
+        overall = LatencySketch()
+        for sketch in sketches.values():
+            overall.merge(sketch)
+
+        return {
+            "overall": _get_latency_percentiles(None, overall),
+            "data": [_get_latency_percentiles(tb, sketches[tb]) for tb in sorted(sketches)],
+        }
+
     async def get_usage(self):
         async with self.begin() as session:
             query = select(count(Transaction.id)).where(
@@ -439,8 +741,27 @@ class SqlAlchemyStorage(Storage):
                 )
             ).fetchone()
 
-        if row:
-            return BlobModel(id=blob_id, data=row[0].data, content_type=row[0].content_type)
+            if not row:
+                return None
+
+            data = row[0].data
+            if data is None:
+                # stored outside the database, may be a read-only memory view of the data instead of bytes.
+                data = self.blob_backend.read(blob_id, codec=row[0].codec, dictionary_id=row[0].dictionary_id)
+                if data is None:
+                    logger.warning(f"🛢 Data of blob {blob_id} not found in blob backend.")
+                    return None
+
+            data = await self.compressor.decompress(
+                session, data, codec=row[0].codec, dictionary_id=row[0].dictionary_id
+            )
+
+        return BlobModel(
+            id=blob_id,
+            data=data,
+            content_type=row[0].content_type,
+            original_size=row[0].original_size,
+        )
 
     async def _on_startup_actions(self, TransactionEvent):
         """Event handler to create the database tables on startup. May drop them first if configured to do so."""
@@ -467,8 +788,8 @@ class SqlAlchemyStorage(Storage):
                 )
 
     async def _on_transaction_started(self, event: TransactionEvent):
-        """Event handler to store the transaction in the database."""
-        return await self.transactions.create(event.transaction)
+        """Event handler to store the transaction in the database (batched, see :class:`BatchWriter`)."""
+        self.writer.add_transaction(event.transaction)
 
     async def _on_transaction_message(self, event: MessageEvent):
         await event.message.join()
@@ -476,49 +797,17 @@ class SqlAlchemyStorage(Storage):
 
         # todo is the "__headers__" dunder content type any good idea ? maybe it's just a waste of bytes.
         headers_blob = BlobModel.from_data(serializer.headers, content_type="__headers__")
-        content_blob = BlobModel.from_data(serializer.body, content_type=event.message.headers.get("content-type"))
-
-        def create_store_blob_task(blob):
-            async def store_blob_task():
-                async with self.begin() as session:
-                    if not (
-                        await session.execute(select(select(Blob.id).where(Blob.id == blob.id).exists()))
-                    ).scalar_one():
-                        db_blob = Blob()
-                        db_blob.id = blob.id
-                        db_blob.content_type = blob.content_type
-                        db_blob.data = blob.data
-                        session.add(db_blob)
-
-            return store_blob_task
-
-        await self.worker.push(create_store_blob_task(headers_blob), ignore_errors=False)
-        await self.worker.push(create_store_blob_task(content_blob), ignore_errors=True)
-
-        async def store_message_task():
-            async with self.begin() as session:
-                session.add(
-                    Message.from_models(event.transaction, event.message, headers_blob, content_blob),
-                )
+        content_blob = BlobModel.from_data(
+            serializer.body,
+            content_type=event.message.headers.get("content-type"),
+            max_size=event.max_body_size,
+            original_size=serializer.body_size,
+        )
 
-        await self.worker.push(store_message_task)
+        self.writer.add_message(event.transaction, event.message, headers_blob, content_blob)
 
     async def _on_transaction_ended(self, event: TransactionEvent):
-        async def finalize_transaction():
-            async with self.begin() as session:
-                await session.execute(
-                    update(Transaction)
-                    .where(Transaction.id == event.transaction.id)
-                    .values(
-                        finished_at=event.transaction.finished_at.astimezone(UTC),
-                        elapsed=event.transaction.elapsed,
-                        tpdex=event.transaction.tpdex,
-                        x_status_class=event.transaction.extras.get("status_class"),
-                        x_cached=event.transaction.extras.get("cached"),
-                    )
-                )
-
-        await self.worker.push(finalize_transaction)
+        self.writer.add_transaction_update(event.transaction)
 
     async def ready(self):
         await self._is_ready.wait()
@@ -0,0 +1,78 @@
+from harp.models import Blob as BlobModel
+from harp_apps.sqlalchemy_storage.blob_backends import FilesystemBlobBackend
+from harp_apps.sqlalchemy_storage.storage import SqlAlchemyStorage
+from harp_apps.sqlalchemy_storage.utils.testing.mixins import SqlalchemyStorageTestFixtureMixin
+
+
+class TestFilesystemBlobBackend:
+    async def test_put_read_delete(self, tmp_path):
+        backend = FilesystemBlobBackend(tmp_path)
+        hello, empty = BlobModel.from_data(b"Hello."), BlobModel.from_data(b"")
+
+        rows = await backend.put_many(
+            [{"id": hello.id, "data": hello.data}, {"id": empty.id, "data": empty.data}],
+        )
+        assert rows == [{"id": hello.id, "data": None}, {"id": empty.id, "data": None}]
+
+        # content-addressed, sharded by id prefix
+        assert (tmp_path / hello.id[:2] / hello.id[2:4] / hello.id).read_bytes() == b"Hello."
+        assert sorted(backend.iter_ids()) == sorted([hello.id, empty.id])
+
+        data = backend.read(hello.id)
+        assert isinstance(data, memoryview)
+        assert bytes(data) == b"Hello."
+        assert backend.read(empty.id) == b""
+
+        await backend.delete_many([hello.id, "not-a-blob"])
+        assert backend.read(hello.id) is None
+        assert list(backend.iter_ids()) == [empty.id]
+
+    async def test_versions_are_stored_separately(self, tmp_path):
+        backend = FilesystemBlobBackend(tmp_path)
+        blob = BlobModel.from_data(b"Hello.")
+
+        await backend.put_many(
+            [
+                {"id": blob.id, "data": b"Hello.", "codec": None, "dictionary_id": None},
+                {"id": blob.id, "data": b"compressed", "codec": "zlib", "dictionary_id": 3},
+            ]
+        )
+        assert bytes(backend.read(blob.id)) == b"Hello."
+        assert bytes(backend.read(blob.id, codec="zlib", dictionary_id=3)) == b"compressed"
+        assert backend.read(blob.id, codec="zlib") is None
+        assert sorted(backend.iter_files(), key=str) == sorted([(blob.id, None, None), (blob.id, "zlib", 3)], key=str)
+
+        await backend.delete_files([(blob.id, None, None)])
+        assert list(backend.iter_files()) == [(blob.id, "zlib", 3)]
+
+        await backend.delete_many([blob.id])
+        assert list(backend.iter_files()) == []
+
+    async def test_put_existing(self, tmp_path):
+        backend = FilesystemBlobBackend(tmp_path)
+        blob = BlobModel.from_data(b"Hello.")
+
+        await backend.put_many([{"id": blob.id, "data": blob.data}])
+        await backend.put_many([{"id": blob.id, "data": blob.data}])
+        assert bytes(backend.read(blob.id)) == b"Hello."
+        assert list(backend.iter_ids(older_than=3600)) == []
+
+
+class TestStorageWithFilesystemBlobBackend(SqlalchemyStorageTestFixtureMixin):
+    async def test_only_metadata_in_database(self, storage: SqlAlchemyStorage, tmp_path):
+        storage.blob_backend = storage.writer.blob_backend = FilesystemBlobBackend(tmp_path)
+
+        blob = BlobModel.from_data(b'{"hello": "world"}', content_type="application/json")
+        storage.writer.add_blob(blob)
+        await storage.writer.flush()
+
+        assert (await storage.blobs.find_one_by_id(blob.id)).data is None
+
+        stored = await storage.get_blob(blob.id)
+        assert stored.content_type == "application/json"
+        assert bytes(stored.data) == b'{"hello": "world"}'
+        assert stored.prettify() == b'{\n  "hello": "world"\n}'
+
+        # rows written with the database backend are still readable
+        legacy = await self.create_blob(storage, b"legacy")
+        assert (await storage.get_blob(legacy.id)).data == b"legacy"
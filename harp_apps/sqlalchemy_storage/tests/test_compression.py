@@ -0,0 +1,106 @@
+import pytest
+from sqlalchemy import func, select
+
+from harp.models import Blob as BlobModel
+from harp_apps.sqlalchemy_storage.blob_backends import FilesystemBlobBackend
+from harp_apps.sqlalchemy_storage.compression import BlobCompressor, ZlibCodec, get_codec, recompress_blobs
+from harp_apps.sqlalchemy_storage.models import Blob, BlobDictionary
+from harp_apps.sqlalchemy_storage.storage import SqlAlchemyStorage
+from harp_apps.sqlalchemy_storage.utils.testing.mixins import SqlalchemyStorageTestFixtureMixin
+
+JSON = (
+    b'{"id": %d, "name": "item %d", "tags": ["alpha", "beta", "gamma"], "description": "Lorem ipsum dolor sit amet."}'
+)
+
+
+class TestCodecs:
+    @pytest.mark.parametrize("name", ["zlib", "zstd"])
+    def test_round_trip(self, name):
+        if name == "zstd":
+            pytest.importorskip("zstandard")
+        codec = get_codec(name)
+        data = JSON % (1, 1) * 10
+
+        assert codec.compress(data) != data
+        assert codec.decompress(codec.compress(data)) == data
+
+        dictionary = codec.train([JSON % (i, i) for i in range(200)], 4096)
+        assert codec.decompress(codec.compress(data, dictionary), dictionary) == data
+
+    def test_unknown(self):
+        with pytest.raises(ValueError):
+            get_codec("lz4")
+
+
+class TestBlobCompression(SqlalchemyStorageTestFixtureMixin):
+    async def test_transparent(self, storage: SqlAlchemyStorage):
+        storage.compressor = storage.writer.compressor = BlobCompressor("zlib", dictionaries=False)
+
+        small = BlobModel.from_data(b"small")
+        large = BlobModel.from_data(JSON % (1, 1) * 10, content_type="application/json")
+        storage.writer.add_blob(small)
+        storage.writer.add_blob(large)
+        await storage.writer.flush()
+
+        # too small to be worth compressing
+        assert (await storage.blobs.find_one_by_id(small.id)).codec is None
+
+        row = await storage.blobs.find_one_by_id(large.id)
+        assert row.codec == "zlib"
+        assert row.dictionary_id is None
+        assert len(row.data) < len(large.data)
+
+        assert (await storage.get_blob(small.id)).data == b"small"
+        assert (await storage.get_blob(large.id)).data == large.data
+
+    async def test_dictionaries(self, storage: SqlAlchemyStorage):
+        storage.compressor = storage.writer.compressor = BlobCompressor("zlib", dictionary_samples=5)
+
+        blobs = [BlobModel.from_data(JSON % (i, i)) for i in range(8)]
+        for blob in blobs:
+            storage.writer.add_blob(blob, endpoint="api")
+        await storage.writer.flush()
+
+        async with storage.begin() as session:
+            dictionaries = (await session.execute(select(BlobDictionary))).scalars().all()
+        assert [(dictionary.endpoint, dictionary.codec) for dictionary in dictionaries] == [("api", "zlib")]
+
+        # the first blobs are used as samples, the next ones use the trained dictionary
+        rows = [await storage.blobs.find_one_by_id(blob.id) for blob in blobs]
+        assert [row.dictionary_id for row in rows] == [None] * 4 + [dictionaries[0].id] * 4
+
+        # dictionaries are loaded from the database when not known by the compressor (e.g. after a restart)
+        storage.compressor = BlobCompressor("zlib")
+        for blob in blobs:
+            assert (await storage.get_blob(blob.id)).data == blob.data
+
+    async def test_recompress(self, storage: SqlAlchemyStorage):
+        blobs = [await self.create_blob(storage, JSON % (i, i) * 5) for i in range(3)]
+        assert (await storage.blobs.find_one_by_id(blobs[0].id)).codec is None
+
+        with pytest.raises(ValueError):
+            await recompress_blobs(storage)
+
+        storage.compressor = BlobCompressor("zlib", dictionaries=False)
+        assert await recompress_blobs(storage, batch_size=2) == 3
+        assert await recompress_blobs(storage) == 0
+
+        async with storage.begin() as session:
+            assert (await session.execute(select(func.count()).where(Blob.codec == ZlibCodec.name))).scalar() == 3
+        for blob in blobs:
+            assert (await storage.get_blob(blob.id)).data == blob.data
+
+    async def test_recompress_filesystem_blobs(self, storage: SqlAlchemyStorage, tmp_path):
+        storage.blob_backend = storage.writer.blob_backend = FilesystemBlobBackend(tmp_path)
+        blobs = [BlobModel.from_data(JSON % (i, i) * 5) for i in range(3)]
+        for blob in blobs:
+            storage.writer.add_blob(blob)
+        await storage.writer.flush()
+
+        storage.compressor = BlobCompressor("zlib", dictionaries=False)
+        assert await recompress_blobs(storage) == 3
+
+        # the raw files were replaced by compressed ones, written next to them
+        assert sorted(storage.blob_backend.iter_files()) == sorted((blob.id, "zlib", None) for blob in blobs)
+        for blob in blobs:
+            assert (await storage.get_blob(blob.id)).data == blob.data
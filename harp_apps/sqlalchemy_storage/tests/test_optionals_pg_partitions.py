@@ -0,0 +1,107 @@
+from datetime import UTC, datetime, timedelta
+
+import pytest
+
+from harp.utils.testing.databases import parametrize_with_database_urls
+from harp_apps.janitor.worker import JanitorWorker
+from harp_apps.sqlalchemy_storage.optionals.pg_partitions import (
+    PARTITIONS_AHEAD,
+    PgPartitionsOptional,
+    get_partition_days,
+    is_pg_partitions_installed,
+)
+from harp_apps.sqlalchemy_storage.utils.testing.mixins import SqlalchemyStorageTestFixtureMixin
+
+
+@parametrize_with_database_urls("mysql", "sqlite")
+async def test_pg_partitions_not_available_for_non_postgres_databases(database_url):
+    opt = PgPartitionsOptional(database_url)
+
+    assert not await opt.is_supported()
+
+    # cannot install on not supported dialects
+    with pytest.raises(RuntimeError):
+        await opt.install()
+
+
+class TestPgPartitions(SqlalchemyStorageTestFixtureMixin):
+    @parametrize_with_database_urls("postgresql")
+    async def test_install_and_uninstall(self, storage):
+        old_day = datetime.now(UTC) - timedelta(days=10)
+        transaction = await self.create_transaction(storage, started_at=old_day, tags={"foo": "bar"})
+        await self.create_message(
+            storage, transaction_id=transaction.id, kind="request", summary="GET / HTTP/1.1", created_at=old_day
+        )
+
+        opt = PgPartitionsOptional(storage.engine.url)
+        try:
+            await opt.install()
+
+            async with storage.session_factory() as session:
+                assert await is_pg_partitions_installed(session)
+                days = await get_partition_days(session)
+                assert days[0] == old_day.date()
+                assert days[-1] == datetime.now(UTC).date() + timedelta(days=PARTITIONS_AHEAD)
+                for table in ("transactions", "messages", "trans_tag_values"):
+                    assert await get_partition_days(session, table) == days
+
+            # rows were copied, and can be written and read as before
+            await self.create_transaction(storage, tags={"foo": "baz"})
+            result = await storage.get_transaction_list(username="anonymous", with_messages=True)
+            assert len(result.items) == 2
+            assert sorted(t.tags["foo"] for t in result.items) == ["bar", "baz"]
+
+            await opt.uninstall()
+
+            async with storage.session_factory() as session:
+                assert not await is_pg_partitions_installed(session)
+            result = await storage.get_transaction_list(username="anonymous", with_messages=True)
+            assert len(result.items) == 2
+        finally:
+            await opt.engine.dispose()
+
+    @parametrize_with_database_urls("postgresql")
+    async def test_janitor_drops_old_partitions(self, storage):
+        worker = JanitorWorker(storage)
+        started_at = datetime.now(UTC) - worker.old_after - timedelta(days=2)
+
+        blob = await self.create_blob(storage, b"old body")
+        old, flagged = (
+            await self.create_transaction(storage, started_at=started_at),
+            await self.create_transaction(storage, started_at=started_at),
+        )
+        for transaction in (old, flagged):
+            await self.create_message(
+                storage,
+                transaction_id=transaction.id,
+                kind="request",
+                summary="GET / HTTP/1.1",
+                body=blob.id,
+                created_at=started_at,
+            )
+        recent = await self.create_transaction(storage)
+
+        user = await storage.users.find_one_by_username("anonymous")
+        await storage.flags.create({"type": 1, "user_id": user.id, "transaction_id": flagged.id})
+
+        opt = PgPartitionsOptional(storage.engine.url)
+        try:
+            await opt.install()
+
+            # the day of the old transactions, and the next one, are entirely older than `old_after`
+            assert await worker.drop_old_partitions() == 2
+
+            async with storage.session_factory() as session:
+                assert started_at.date() not in await get_partition_days(session)
+
+            # the flagged transaction was kept (in the default partition), with its message
+            remaining = await storage.get_transaction_list(username="anonymous", with_messages=True)
+            assert sorted(t.id for t in remaining.items) == sorted([flagged.id, recent.id])
+            assert [len(t.messages) for t in remaining.items if t.id == flagged.id] == [1]
+            assert (await storage.blobs.find_one_by_id(blob.id)).refs == 1
+
+            # nothing left to delete row by row
+            assert await worker.delete_old_transactions() == 0
+        finally:
+            await opt.uninstall()
+            await opt.engine.dispose()
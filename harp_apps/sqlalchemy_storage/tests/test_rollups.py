@@ -0,0 +1,134 @@
+from datetime import UTC, datetime, timedelta
+
+import pytest
+
+from harp.models import Transaction as TransactionModel
+from harp_apps.sqlalchemy_storage.models.rollups import get_latency_rollup_rows, get_rollup_rows
+from harp_apps.sqlalchemy_storage.storage import SqlAlchemyStorage
+from harp_apps.sqlalchemy_storage.utils.sketches import RELATIVE_ACCURACY
+from harp_apps.sqlalchemy_storage.utils.testing.mixins import SqlalchemyStorageTestFixtureMixin
+
+
+def test_get_rollup_rows():
+    started_at = datetime(2024, 1, 1, 12, 3, 4, tzinfo=UTC)
+    rows = get_rollup_rows(
+        [
+            {"started_at": started_at, "endpoint": "api"},
+            {"started_at": started_at, "endpoint": None, "finished_at": started_at, "elapsed": 0.5, "tpdex": 100},
+        ],
+        [{"started_at": started_at, "endpoint": "api", "elapsed": 1.5, "tpdex": 50, "x_status_class": "5xx"}],
+    )
+
+    assert {(row["time_bucket"], row["started_at"].isoformat(), row["endpoint"]) for row in rows} == {
+        (time_bucket, bucket, endpoint)
+        for time_bucket, bucket in (
+            ("minute", "2024-01-01T12:03:00+00:00"),
+            ("hour", "2024-01-01T12:00:00+00:00"),
+            ("day", "2024-01-01T00:00:00+00:00"),
+        )
+        for endpoint in ("api", "")
+    }
+
+    # sorted by primary key, so that concurrent upserts lock rows in the same order
+    keys = [(row["time_bucket"], row["started_at"], row["endpoint"]) for row in rows]
+    assert keys == sorted(keys)
+
+    api = next(row for row in rows if row["time_bucket"] == "hour" and row["endpoint"] == "api")
+    assert api == {
+        "time_bucket": "hour",
+        "started_at": datetime(2024, 1, 1, 12, tzinfo=UTC),
+        "endpoint": "api",
+        "count": 1,
+        "errors": 1,
+        "cached": 0,
+        "elapsed_sum": 1.5,
+        "elapsed_count": 1,
+        "tpdex_sum": 50,
+        "tpdex_count": 1,
+    }
+
+
+def test_get_latency_rollup_rows_are_sorted():
+    started_at = datetime(2024, 1, 1, 12, 3, 4, tzinfo=UTC)
+    rows = get_latency_rollup_rows(
+        [
+            {"started_at": started_at, "endpoint": "web", "elapsed": 2.0},
+            {"started_at": started_at, "endpoint": "api", "elapsed": 0.5},
+            {"started_at": started_at, "endpoint": "api", "elapsed": 0.1},
+        ]
+    )
+
+    keys = [(row["time_bucket"], row["started_at"], row["endpoint"], row["bin"]) for row in rows]
+    assert len(keys) == 9
+    assert keys == sorted(keys)
+
+
+class TestTransactionRollups(SqlalchemyStorageTestFixtureMixin):
+    async def test_rollups_from_writer(self, storage: SqlAlchemyStorage):
+        now = datetime.now(UTC).replace(minute=30)
+        for i, (endpoint, elapsed, status) in enumerate(
+            (("api", 1.0, "2xx"), ("api", 3.0, "5xx"), ("web", 2.0, "2xx"))
+        ):
+            transaction = TransactionModel(id=f"t{i}", type="http", endpoint=endpoint, started_at=now)
+            storage.writer.add_transaction(transaction)
+            if i == 1:
+                # the update is written in another batch than the transaction
+                await storage.writer.flush()
+            transaction.finished_at = now + timedelta(seconds=elapsed)
+            transaction.elapsed = elapsed
+            transaction.tpdex = 100 - 10 * i
+            transaction.extras["status_class"] = status
+            storage.writer.add_transaction_update(transaction)
+        await storage.writer.flush()
+
+        (hour,) = await storage.transactions_grouped_by_time_bucket(time_bucket="hour")
+        assert hour == {
+            "datetime": now.replace(minute=0, second=0, microsecond=0),
+            "count": 3,
+            "errors": 1,
+            "cached": 0,
+            "meanDuration": 2.0,
+            "meanTpdex": 90.0,
+        }
+
+        (api,) = await storage.transactions_grouped_by_time_bucket(endpoint="api", time_bucket="month")
+        assert (api["datetime"], api["count"], api["meanDuration"]) == (
+            now.replace(day=1, hour=0, minute=0, second=0, microsecond=0),
+            2,
+            2.0,
+        )
+
+        # the rollup containing the start datetime is included
+        assert len(await storage.transactions_grouped_by_time_bucket(time_bucket="hour", start_datetime=now)) == 1
+        assert (
+            await storage.transactions_grouped_by_time_bucket(
+                time_bucket="hour", start_datetime=now + timedelta(hours=1)
+            )
+            == []
+        )
+
+    async def test_latency_percentiles(self, storage: SqlAlchemyStorage):
+        now = datetime.now(UTC).replace(minute=30)
+        for i in range(100):
+            # two endpoints, with different latencies
+            transaction = TransactionModel(
+                id=f"t{i}", type="http", endpoint="api" if i % 2 else "web", started_at=now - timedelta(days=i % 3)
+            )
+            storage.writer.add_transaction(transaction)
+            transaction.finished_at, transaction.elapsed = now, float(i + 1)
+            storage.writer.add_transaction_update(transaction)
+        # unfinished transactions are not part of latency sketches
+        storage.writer.add_transaction(TransactionModel(id="unfinished", type="http", endpoint="api", started_at=now))
+        await storage.writer.flush()
+
+        latency = await storage.latency_percentiles_by_time_bucket(time_bucket="day")
+        assert [t["count"] for t in latency["data"]] == [33, 33, 34]
+        assert latency["overall"]["count"] == 100
+        for key, expected in (("p50", 50), ("p95", 95), ("p99", 99)):
+            assert latency["overall"][key] == pytest.approx(expected, rel=RELATIVE_ACCURACY)
+
+        latency = await storage.latency_percentiles_by_time_bucket(
+            endpoint="api", time_bucket="hour", start_datetime=now - timedelta(hours=1)
+        )
+        assert [t["datetime"] for t in latency["data"]] == [now.replace(minute=0, second=0, microsecond=0)]
+        assert latency["overall"]["count"] == 17
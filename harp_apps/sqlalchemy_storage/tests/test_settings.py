@@ -1,4 +1,7 @@
+import pytest
+
 from harp.config import asdict
+from harp.errors import ConfigurationValueError
 from harp_apps.sqlalchemy_storage.settings import SqlAlchemyStorageSettings
 
 
@@ -42,3 +45,59 @@ def test_override():
         "type": "sqlalchemy",
         "url": "sqlite+aiosqlite:///:memory:",
     }
+
+
+def test_writer():
+    settings = SqlAlchemyStorageSettings(writer={"batch_size": "500"})
+
+    assert settings.writer.batch_size == 500
+    assert asdict(settings) == {
+        "migrate": True,
+        "type": "sqlalchemy",
+        "url": "sqlite+aiosqlite:///harp.db",
+        "writer": {
+            "batch_size": 500,
+            "flush_interval": 50,
+            "workers": 1,
+            "max_queue_size": 10000,
+            "high_water_mark": 5000,
+            "blob_cache_size": 10000,
+            "spill_path": None,
+            "spill_max_size": 1073741824,
+        },
+    }
+
+
+def test_writer_invalid_high_water_mark():
+    with pytest.raises(ConfigurationValueError):
+        SqlAlchemyStorageSettings(writer={"max_queue_size": 100, "high_water_mark": 200})
+
+
+def test_blobs():
+    settings = SqlAlchemyStorageSettings(blobs={"type": "filesystem", "path": "/var/lib/harp/blobs"})
+
+    assert asdict(settings) == {
+        "migrate": True,
+        "type": "sqlalchemy",
+        "url": "sqlite+aiosqlite:///harp.db",
+        "blobs": {
+            "type": "filesystem",
+            "path": "/var/lib/harp/blobs",
+            "compression": None,
+            "compression_level": None,
+            "compression_dictionaries": True,
+            "search_max_size": 65536,
+            "search_max_queue_size": 16777216,
+        },
+    }
+
+
+def test_blobs_invalid():
+    with pytest.raises(ConfigurationValueError):
+        SqlAlchemyStorageSettings(blobs={"type": "s3"})
+
+    with pytest.raises(ConfigurationValueError):
+        SqlAlchemyStorageSettings(blobs={"type": "filesystem"})
+
+    with pytest.raises(ConfigurationValueError):
+        SqlAlchemyStorageSettings(blobs={"compression": "lz4"})
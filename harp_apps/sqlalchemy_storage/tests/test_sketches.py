@@ -0,0 +1,41 @@
+import random
+
+import pytest
+
+from harp_apps.sqlalchemy_storage.utils.sketches import RELATIVE_ACCURACY, LatencySketch
+
+
+def test_quantiles_relative_accuracy():
+    rng = random.Random(42)
+    values = sorted(rng.lognormvariate(4, 1.5) for _ in range(10000))
+    sketch = LatencySketch()
+    for value in values:
+        sketch.add(value)
+
+    assert len(sketch) == 10000
+    for q in (0.5, 0.95, 0.99):
+        exact = values[int(q * (len(values) - 1))]
+        assert sketch.quantile(q) == pytest.approx(exact, rel=RELATIVE_ACCURACY)
+
+
+def test_merge():
+    a, b, both = LatencySketch(), LatencySketch(), LatencySketch()
+    for value in range(1, 100):
+        a.add(value)
+        both.add(value)
+    for value in range(1000, 1100):
+        b.add(value)
+        both.add(value)
+
+    a.merge(b)
+    assert a.bins == both.bins
+    # exact value is the 197th one
+    assert a.quantile(0.99) == pytest.approx(1097, rel=RELATIVE_ACCURACY)
+
+
+def test_empty_and_zero():
+    sketch = LatencySketch()
+    assert sketch.quantile(0.5) is None
+
+    sketch.add(0)
+    assert sketch.quantile(0.5) == pytest.approx(0.01, rel=RELATIVE_ACCURACY)
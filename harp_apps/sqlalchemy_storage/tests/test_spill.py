@@ -0,0 +1,99 @@
+from datetime import UTC, datetime
+
+import pytest
+
+from harp_apps.sqlalchemy_storage.spill import SpillLog, pack, unpack
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        None,
+        True,
+        False,
+        0,
+        -42,
+        2**62,
+        3.14,
+        "",
+        "héllo",
+        b"\x00\xffbytes",
+        datetime(2024, 6, 20, 10, 15, 12, 123456, tzinfo=UTC),
+        datetime(2024, 6, 20, 10, 15, 12),
+        [1, "two", None, [b"three"]],
+        {"id": "abc", "tags": {"env": "tests"}, "elapsed": 42.0, "data": b"Hello."},
+    ],
+)
+def test_pack_unpack(value):
+    assert unpack(pack(value)) == value
+
+
+def test_pack_unsupported_type():
+    with pytest.raises(TypeError):
+        pack(object())
+
+
+async def test_append_and_read(tmp_path):
+    spill = SpillLog(tmp_path)
+    assert not spill
+
+    assert spill.append("transaction", {"id": "t1", "tags": {"env": "tests"}})
+    assert spill.append("blob", {"id": "b1", "data": b"Hello."})
+    assert spill
+
+    # records are buffered, and written in the background
+    assert list(tmp_path.iterdir()) == []
+    await spill.flush()
+    assert len(list(tmp_path.iterdir())) == 1
+
+    # the current segment is not readable until rotated
+    assert spill.segments() == []
+    await spill.rotate()
+
+    (segment,) = spill.segments()
+    assert list(spill.read(segment)) == [
+        ("transaction", {"id": "t1", "tags": {"env": "tests"}}),
+        ("blob", {"id": "b1", "data": b"Hello."}),
+    ]
+
+    spill.remove(segment)
+    assert spill.size == 0
+    assert not spill
+
+
+async def test_segments_are_rotated_and_persisted(tmp_path):
+    spill = SpillLog(tmp_path, segment_size=64)
+    for i in range(10):
+        spill.append("message", {"transaction_id": f"t{i}", "summary": "GET / HTTP/1.1"})
+    await spill.close()
+
+    spill = SpillLog(tmp_path)
+    segments = spill.segments()
+    assert len(segments) == 10
+    assert [row["transaction_id"] for segment in segments for _, row in spill.read(segment)] == [
+        f"t{i}" for i in range(10)
+    ]
+
+    # new segments come after the existing ones
+    spill.append("message", {"transaction_id": "t10"})
+    await spill.rotate()
+    assert spill.segments()[-1].stem > segments[-1].stem
+
+
+async def test_truncated_segment(tmp_path):
+    spill = SpillLog(tmp_path)
+    spill.append("update", {"id": "t1"})
+    spill.append("update", {"id": "t2"})
+    await spill.close()
+
+    (segment,) = spill.segments()
+    segment.write_bytes(segment.read_bytes()[:-3])
+    assert list(spill.read(segment)) == [("update", {"id": "t1"})]
+
+
+def test_max_size(tmp_path):
+    spill = SpillLog(tmp_path, max_size=64)
+    while spill.append("blob", {"id": "b", "data": b"0123456789"}):
+        pass
+    assert spill.full
+    assert spill.size >= 64
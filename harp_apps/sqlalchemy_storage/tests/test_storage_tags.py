@@ -19,3 +19,19 @@ class TestStorageTags(SqlalchemyStorageTestFixtureMixin):
 
         # ... that we can read using our convenience api
         assert t1_again.tags == tags
+
+    async def test_tag_ids_are_cached(self, storage: SqlAlchemyStorage):
+        t1, t2 = await self.create_transaction(storage), await self.create_transaction(storage)
+
+        await storage.transactions.set_tags(t1, {"version": "42", "env": "tests"})
+        assert set(storage.tags.ids) == {"version", "env"}
+        assert len(storage.tag_values.ids) == 2
+
+        # cached ids are used, without querying the database
+        storage.install_debugging_instrumentation()
+        async with storage.session_factory() as session:
+            await storage.transactions.set_tags(t2, {"version": "42", "env": "tests"}, session=session)
+        assert len(storage.sql_queries) == 1
+
+        t2_again = await storage.transactions.find_one_by_id(t2.id, with_tags=True)
+        assert t2_again.tags == {"version": "42", "env": "tests"}
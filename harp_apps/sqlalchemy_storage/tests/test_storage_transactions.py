@@ -1,3 +1,9 @@
+from datetime import UTC, datetime, timedelta
+
+import pytest
+
+from harp.models import Transaction as TransactionModel
+from harp_apps.sqlalchemy_storage.models import FLAGS_BY_NAME
 from harp_apps.sqlalchemy_storage.storage import SqlAlchemyStorage
 from harp_apps.sqlalchemy_storage.utils.testing.mixins import SqlalchemyStorageTestFixtureMixin
 
@@ -28,3 +34,107 @@ class TestStorageTransactions(SqlalchemyStorageTestFixtureMixin):
 
         transactions_ba = await storage.get_transaction_list(username="anonymous", with_messages=True, text_search="ba")
         assert len(transactions_ba) == 3
+
+    async def test_get_transaction_list_keyset_pagination(self, storage: SqlAlchemyStorage, monkeypatch):
+        monkeypatch.setattr("harp_apps.sqlalchemy_storage.storage.PAGE_SIZE", 3)
+        started_at = datetime(2024, 1, 1, tzinfo=UTC)
+        # some transactions share the same start time, the id is used to break ties
+        transactions = [
+            await self.create_transaction(storage, started_at=started_at + timedelta(seconds=i // 2)) for i in range(8)
+        ]
+        expected = [t.id for t in sorted(transactions, key=lambda t: (t.started_at, t.id), reverse=True)]
+
+        first = await storage.get_transaction_list(username="anonymous", with_messages=True)
+        assert [t.id for t in first] == expected[0:3]
+        assert first.meta["total"] == 8
+        assert first.meta["prev"] is None
+
+        second = await storage.get_transaction_list(username="anonymous", with_messages=True, after=first.meta["next"])
+        assert [t.id for t in second] == expected[3:6]
+
+        last = await storage.get_transaction_list(username="anonymous", with_messages=True, after=second.meta["next"])
+        assert [t.id for t in last] == expected[6:8]
+        assert last.meta["total"] == 8
+        assert last.meta["next"] is None
+
+        # backward
+        back = await storage.get_transaction_list(username="anonymous", with_messages=True, before=last.meta["prev"])
+        assert [t.id for t in back] == expected[3:6]
+        back = await storage.get_transaction_list(username="anonymous", with_messages=True, before=back.meta["prev"])
+        assert [t.id for t in back] == expected[0:3]
+        assert back.meta["prev"] is None
+
+        # the offset based pagination is still available
+        assert [
+            t.id for t in await storage.get_transaction_list(username="anonymous", with_messages=True, page=2)
+        ] == expected[3:6]
+
+    async def test_get_transaction_list_invalid_cursor(self, storage: SqlAlchemyStorage):
+        with pytest.raises(ValueError):
+            await storage.get_transaction_list(username="anonymous", with_messages=True, after="not a cursor")
+
+    async def test_get_transaction_list_totals(self, storage: SqlAlchemyStorage, monkeypatch):
+        for _ in range(5):
+            await self.create_transaction(storage)
+
+        result = await storage.get_transaction_list(username="anonymous", with_messages=True)
+        assert (result.meta["total"], result.meta["total_kind"]) == (5, "exact")
+
+        result = await storage.get_transaction_list(username="anonymous", with_messages=True, total="none")
+        assert (result.meta["total"], result.meta["total_kind"]) == (None, "none")
+        assert len(result) == 5
+
+        # under the cap, capped and estimated totals are exact
+        for total in ("capped", "estimated"):
+            result = await storage.get_transaction_list(username="anonymous", with_messages=True, total=total)
+            assert (result.meta["total"], result.meta["total_kind"]) == (5, "exact")
+
+        monkeypatch.setattr("harp_apps.sqlalchemy_storage.storage.TOTAL_COUNT_CAP", 3)
+        result = await storage.get_transaction_list(username="anonymous", with_messages=True, total="capped")
+        assert (result.meta["total"], result.meta["total_kind"]) == (3, "capped")
+
+        result = await storage.get_transaction_list(username="anonymous", with_messages=True, total="estimated")
+        if storage.engine.dialect.name == "postgresql":
+            assert result.meta["total_kind"] in ("estimated", "capped")
+        else:
+            assert (result.meta["total"], result.meta["total_kind"]) == (3, "capped")
+
+        with pytest.raises(ValueError):
+            await storage.get_transaction_list(username="anonymous", total="approximately")
+
+    async def test_get_facet_counts(self, storage: SqlAlchemyStorage):
+        now = datetime.now(UTC).replace(minute=30, second=0, microsecond=0)
+        for i, (endpoint, status) in enumerate((("foo", "2xx"), ("foo", "5xx"), ("bar", "2xx"), ("bar", None))):
+            transaction = TransactionModel(
+                id=f"t{i}",
+                type="http",
+                endpoint=endpoint,
+                started_at=now - timedelta(hours=i),
+                extras={"method": "GET"},
+            )
+            storage.writer.add_transaction(transaction)
+            if status:
+                transaction.extras["status_class"] = status
+                transaction.finished_at, transaction.elapsed = now, 1.0
+                storage.writer.add_transaction_update(transaction)
+        await storage.writer.flush()
+        await storage.create_users(["alice"])
+        await storage.set_user_flag(transaction_id="t0", username="alice", flag=FLAGS_BY_NAME["favorite"])
+
+        def _totals(rows):
+            totals = {}
+            for row in rows:
+                assert row["datetime"].minute == 0
+                totals[row["value"]] = totals.get(row["value"], 0) + row["count"]
+            return totals
+
+        # on an hour boundary, as endpoint counts are read from hour rollups
+        since = now - timedelta(hours=2, minutes=30)
+        assert _totals(await storage.get_facet_counts("endpoint", since=since)) == {"foo": 2, "bar": 1}
+        assert _totals(await storage.get_facet_counts("method", since=since)) == {"GET": 3}
+        assert _totals(await storage.get_facet_counts("status", since=since)) == {"2xx": 2, "5xx": 1}
+        assert _totals(await storage.get_facet_counts("flag", since=since, username="alice")) == {"favorite": 1}
+        assert await storage.get_facet_counts("flag", since=since) == []
+
+        with pytest.raises(NotImplementedError):
+            await storage.get_facet_counts("tpdex", since=since)
@@ -0,0 +1,457 @@
+import asyncio
+import struct
+import zlib
+from contextlib import asynccontextmanager
+from datetime import UTC, datetime
+
+import pytest
+from sqlalchemy.exc import NoResultFound
+
+from harp.http import HttpResponse
+from harp.models import Blob as BlobModel
+from harp.models import Transaction as TransactionModel
+from harp.utils.guids import generate_transaction_id_ksuid
+from harp_apps.sqlalchemy_storage.spill import MAGIC, SpillLog
+from harp_apps.sqlalchemy_storage.storage import SqlAlchemyStorage
+from harp_apps.sqlalchemy_storage.utils.testing.mixins import SqlalchemyStorageTestFixtureMixin
+from harp_apps.sqlalchemy_storage.writer import BatchWriter, Shedding
+
+
+def _transaction(**kwargs):
+    return TransactionModel(
+        id=generate_transaction_id_ksuid(),
+        type="http",
+        endpoint="api",
+        started_at=datetime.now(UTC),
+        **kwargs,
+    )
+
+
+def _end(transaction: TransactionModel):
+    transaction.finished_at = datetime.now(UTC)
+    transaction.elapsed = 42.0
+    transaction.tpdex = 100
+    transaction.extras["status_class"] = "2xx"
+    return transaction
+
+
+class TestBatchWriter(SqlalchemyStorageTestFixtureMixin):
+    @pytest.fixture(autouse=True)
+    async def writers(self):
+        writers = []
+        yield writers
+        for writer in writers:
+            await writer.close()
+
+    def create_writer(self, storage: SqlAlchemyStorage, writers, **kwargs):
+        if storage.engine.dialect.name == "sqlite":
+            kwargs.setdefault("max_concurrent_writes", 1)
+        writer = BatchWriter(storage.begin, **kwargs)
+        writers.append(writer)
+        return writer
+
+    async def test_flush(self, storage: SqlAlchemyStorage, writers):
+        writer = self.create_writer(storage, writers, batch_size=1000, flush_interval=60000)
+
+        transaction = _transaction(tags={"env": "tests"})
+        response = HttpResponse(b"Hello.")
+        headers, body = BlobModel.from_data(b"", content_type="__headers__"), BlobModel.from_data(b"Hello.")
+
+        writer.add_transaction(transaction)
+        writer.add_blob(headers)
+        writer.add_blob(body)
+        writer.add_blob(body)
+        writer.add_message(transaction, response, headers, body)
+        writer.add_transaction_update(_end(transaction))
+
+        # the update is merged in the pending insert, and duplicate blobs are only written once
+        assert len(writer) == 4
+
+        await writer.flush()
+        assert len(writer) == 0
+
+        db_transaction = await storage.transactions.find_one_by_id(transaction.id, with_tags=True, with_messages=True)
+        assert db_transaction.x_status_class == "2xx"
+        assert db_transaction.tpdex == 100
+        assert db_transaction.tags == {"env": "tests"}
+        assert [message.body for message in db_transaction.messages] == [body.id]
+        assert (await storage.get_blob(body.id)).data == b"Hello."
+
+    async def test_storage_writer_is_kept_when_empty(self, storage: SqlAlchemyStorage):
+        writer = storage.writer
+        assert len(writer) == 0
+        assert storage.writer is writer
+
+    async def test_update_already_written_transaction(self, storage: SqlAlchemyStorage, writers):
+        writer = self.create_writer(storage, writers, batch_size=1000, flush_interval=60000)
+
+        transaction = _transaction()
+        writer.add_transaction(transaction)
+        await writer.flush()
+
+        writer.add_transaction_update(_end(transaction))
+        assert len(writer) == 1
+        await writer.flush()
+
+        db_transaction = await storage.transactions.find_one_by_id(transaction.id)
+        assert db_transaction.x_status_class == "2xx"
+        assert db_transaction.elapsed == 42.0
+
+    async def test_tags_are_shared(self, storage: SqlAlchemyStorage, writers):
+        writer = self.create_writer(storage, writers, batch_size=1000, flush_interval=60000)
+
+        t1, t2 = _transaction(tags={"env": "tests", "v": "1"}), _transaction(tags={"env": "tests"})
+        writer.add_transaction(t1)
+        await writer.flush()
+        writer.add_transaction(t2)
+        await writer.flush()
+
+        assert (await storage.transactions.find_one_by_id(t1.id, with_tags=True)).tags == {"env": "tests", "v": "1"}
+        assert (await storage.transactions.find_one_by_id(t2.id, with_tags=True)).tags == {"env": "tests"}
+
+    async def test_tag_ids_are_shared_with_storage(self, storage: SqlAlchemyStorage, writers):
+        writer = self.create_writer(
+            storage, writers, batch_size=1000, flush_interval=60000, tags=storage.tags, tag_values=storage.tag_values
+        )
+
+        transaction = _transaction(tags={"env": "tests"})
+        writer.add_transaction(transaction)
+        await writer.flush()
+        assert list(storage.tags.ids) == ["env"]
+
+        t2 = await self.create_transaction(storage)
+        await storage.transactions.set_tags(t2, {"env": "tests"})
+        assert (await storage.transactions.find_one_by_id(t2.id, with_tags=True)).tags == {"env": "tests"}
+
+    async def test_flush_when_batch_is_full(self, storage: SqlAlchemyStorage, writers):
+        writer = self.create_writer(storage, writers, batch_size=2, flush_interval=60000)
+
+        writer.add_transaction(_transaction())
+        await asyncio.sleep(0.05)
+        assert len(writer) == 1
+
+        writer.add_transaction(_transaction())
+        await asyncio.wait_for(self._wait_until_written(writer), 1)
+
+    async def test_flush_after_interval(self, storage: SqlAlchemyStorage, writers):
+        writer = self.create_writer(storage, writers, batch_size=1000, flush_interval=10)
+
+        writer.add_transaction(_transaction())
+        await asyncio.wait_for(self._wait_until_written(writer), 1)
+
+    async def test_existing_blobs_are_ignored(self, storage: SqlAlchemyStorage, writers):
+        writer = self.create_writer(storage, writers, batch_size=1000, flush_interval=60000)
+
+        blob = await self.create_blob(storage, b"Hello.")
+        writer.add_blob(BlobModel.from_data(b"Hello."))
+        writer.add_blob(BlobModel.from_data(b"World."))
+        assert len(writer) == 2
+
+        await writer.flush()
+        assert (await storage.get_blob(blob.id)).data == b"Hello."
+        assert (await storage.get_blob(BlobModel.from_data(b"World.").id)).data == b"World."
+
+    async def test_written_blobs_are_cached(self, storage: SqlAlchemyStorage, writers):
+        writer = self.create_writer(storage, writers, batch_size=1000, flush_interval=60000, blob_cache_size=1)
+
+        hello, world = BlobModel.from_data(b"Hello."), BlobModel.from_data(b"World.")
+        writer.add_blob(hello)
+        await writer.flush()
+        assert list(writer.written_blobs) == [hello.id]
+
+        writer.add_blob(hello)
+        assert len(writer) == 0
+
+        writer.add_blob(world)
+        await writer.flush()
+        assert list(writer.written_blobs) == [world.id]
+
+        writer.add_blob(hello)
+        assert len(writer) == 1
+
+    async def test_blob_refs(self, storage: SqlAlchemyStorage, writers):
+        writer = self.create_writer(storage, writers, batch_size=1000, flush_interval=60000)
+
+        headers, body = BlobModel.from_data(b"", content_type="__headers__"), BlobModel.from_data(b"Hello.")
+        for _ in range(2):
+            transaction = _transaction()
+            writer.add_transaction(transaction)
+            writer.add_message(transaction, HttpResponse(b"Hello."), headers, body)
+        await writer.flush()
+
+        # blobs already written (and cached) are referenced too
+        transaction = _transaction()
+        writer.add_transaction(transaction)
+        writer.add_message(transaction, HttpResponse(b"Hello."), body, body)
+        await writer.flush()
+
+        async with storage.begin() as session:
+            assert (await storage.blobs.find_one_by_id(headers.id, session=session)).refs == 2
+            assert (await storage.blobs.find_one_by_id(body.id, session=session)).refs == 4
+            assert (await session.execute(storage.blobs.count_orphans())).scalar() == 0
+
+    async def test_multiple_workers(self, storage: SqlAlchemyStorage, writers):
+        writer = self.create_writer(storage, writers, batch_size=1000, flush_interval=60000, workers=4)
+
+        transactions = [_transaction(tags={"env": "tests"}) for _ in range(20)]
+        for transaction in transactions:
+            writer.add_transaction(transaction)
+            writer.add_message(
+                transaction,
+                HttpResponse(b"Hello."),
+                BlobModel.from_data(b"", content_type="__headers__"),
+                BlobModel.from_data(b"Hello."),
+            )
+            writer.add_transaction_update(_end(transaction))
+
+        # transactions are spread between workers, and everything related to one transaction stays on one worker
+        assert sum(1 for worker in writer.workers if worker.busy) > 1
+        for worker in writer.workers:
+            assert {message["transaction_id"] for message in worker.batch.messages} == set(worker.batch.transactions)
+
+        await writer.flush()
+        assert len(writer) == 0
+
+        for transaction in transactions:
+            db_transaction = await storage.transactions.find_one_by_id(
+                transaction.id, with_tags=True, with_messages=True
+            )
+            assert db_transaction.x_status_class == "2xx"
+            assert db_transaction.tags == {"env": "tests"}
+            assert len(db_transaction.messages) == 1
+
+    async def test_shedding_bodies(self, storage: SqlAlchemyStorage, writers):
+        writer = self.create_writer(
+            storage, writers, batch_size=1000, flush_interval=60000, max_queue_size=10, high_water_mark=2
+        )
+
+        transaction = _transaction()
+        writer.add_transaction(transaction)
+        writer.add_transaction(_transaction())
+        assert writer.shedding == Shedding.BODIES
+
+        headers, body = BlobModel.from_data(b"", content_type="__headers__"), BlobModel.from_data(b"Hello.")
+        writer.add_message(transaction, HttpResponse(b"Hello."), headers, body)
+        assert writer.dropped == {"body": 1, "message": 0, "transaction": 0}
+
+        await writer.flush()
+
+        db_transaction = await storage.transactions.find_one_by_id(transaction.id, with_messages=True)
+        (message,) = db_transaction.messages
+        assert message.body != body.id
+        blob = await storage.get_blob(message.body)
+        assert blob.data == b""
+        assert blob.original_size == 6
+        assert await storage.get_blob(body.id) is None
+
+    async def test_shedding_messages_and_transactions(self, storage: SqlAlchemyStorage, writers):
+        writer = self.create_writer(
+            storage, writers, batch_size=1000, flush_interval=60000, max_queue_size=4, high_water_mark=2
+        )
+
+        kept = [_transaction() for _ in range(3)]
+        for transaction in kept:
+            writer.add_transaction(transaction)
+        assert writer.shedding == Shedding.MESSAGES
+
+        writer.add_message(
+            kept[0],
+            HttpResponse(b"Hello."),
+            BlobModel.from_data(b"", content_type="__headers__"),
+            BlobModel.from_data(b"Hello."),
+        )
+        assert writer.dropped == {"body": 0, "message": 1, "transaction": 0}
+
+        writer.add_transaction(_transaction())
+        assert writer.shedding == Shedding.TRANSACTIONS
+
+        dropped = _transaction()
+        writer.add_transaction(dropped)
+        writer.add_message(
+            dropped,
+            HttpResponse(b"Hello."),
+            BlobModel.from_data(b"", content_type="__headers__"),
+            BlobModel.from_data(b"Hello."),
+        )
+        writer.add_transaction_update(_end(dropped))
+        assert writer.dropped == {"body": 0, "message": 2, "transaction": 1}
+        assert len(writer) == 4
+
+        await writer.flush()
+        assert len(writer) == 0
+        assert writer.shedding == Shedding.NONE
+
+        for transaction in kept:
+            assert await storage.transactions.find_one_by_id(transaction.id) is not None
+        with pytest.raises(NoResultFound):
+            await storage.transactions.find_one_by_id(dropped.id)
+
+    async def test_dropped_transactions_are_forgotten_oldest_first(self, storage: SqlAlchemyStorage, writers):
+        writer = self.create_writer(
+            storage, writers, batch_size=1000, flush_interval=60000, max_queue_size=2, high_water_mark=2
+        )
+        for _ in range(2):
+            writer.add_transaction(_transaction())
+        assert writer.shedding == Shedding.TRANSACTIONS
+
+        dropped = [_transaction() for _ in range(3)]
+        for transaction in dropped:
+            writer.add_transaction(transaction)
+        assert writer.dropped == {"body": 0, "message": 0, "transaction": 3}
+
+        # the most recently dropped transactions are remembered, so their later rows are dropped too
+        for transaction in dropped[1:]:
+            writer.add_message(
+                transaction,
+                HttpResponse(b"Hello."),
+                BlobModel.from_data(b"", content_type="__headers__"),
+                BlobModel.from_data(b"Hello."),
+            )
+        assert writer.dropped == {"body": 0, "message": 2, "transaction": 3}
+
+    async def test_spill_past_high_water_mark(self, storage: SqlAlchemyStorage, writers, tmp_path):
+        writer = self.create_writer(
+            storage,
+            writers,
+            batch_size=1000,
+            flush_interval=60000,
+            max_queue_size=10,
+            high_water_mark=1,
+            spill=SpillLog(tmp_path),
+            replay_interval=60,
+        )
+
+        kept, spilled = _transaction(), _transaction(tags={"env": "tests"})
+        writer.add_transaction(kept)
+        writer.add_transaction(spilled)
+        writer.add_message(
+            spilled,
+            HttpResponse(b"Hello."),
+            BlobModel.from_data(b"", content_type="__headers__"),
+            BlobModel.from_data(b"Hello."),
+        )
+        writer.add_transaction_update(_end(spilled))
+
+        # nothing is dropped, everything related to the spilled transaction went to the spill log
+        assert len(writer) == 1
+        assert writer.spilled == 5
+        assert writer.dropped == {"body": 0, "message": 0, "transaction": 0}
+
+        assert await writer.replay()
+        assert len(writer) == 0
+        assert not writer.spill
+
+        db_transaction = await storage.transactions.find_one_by_id(spilled.id, with_tags=True, with_messages=True)
+        assert db_transaction.x_status_class == "2xx"
+        assert db_transaction.tags == {"env": "tests"}
+        (message,) = db_transaction.messages
+        assert (await storage.get_blob(message.body)).data == b"Hello."
+        assert await storage.transactions.find_one_by_id(kept.id) is not None
+
+    async def test_spill_failed_writes(self, storage: SqlAlchemyStorage, writers, tmp_path):
+        available = False
+
+        @asynccontextmanager
+        async def begin():
+            if not available:
+                raise ConnectionError("Database unavailable.")
+            async with storage.begin() as session:
+                yield session
+
+        writer = BatchWriter(begin, batch_size=1000, flush_interval=60000, spill=SpillLog(tmp_path), replay_interval=60)
+        writers.append(writer)
+
+        transaction = _transaction()
+        writer.add_transaction(transaction)
+        await writer.flush()
+        assert writer.spilled == 1
+
+        # later rows of the same transaction follow it to the spill log
+        writer.add_transaction_update(_end(transaction))
+        assert writer.spilled == 2
+        assert len(writer) == 0
+
+        assert not await writer.replay()
+        assert writer.spill
+
+        available = True
+        assert await writer.replay()
+        assert not writer.spill
+        assert (await storage.transactions.find_one_by_id(transaction.id)).x_status_class == "2xx"
+
+    async def test_failing_spill_segment_is_moved_aside(self, storage: SqlAlchemyStorage, writers, tmp_path):
+        spill = SpillLog(tmp_path)
+        spill.append("transaction", {"id": "broken"})
+        await spill.rotate()
+        transaction = _transaction()
+        spill.append(
+            "transaction",
+            {
+                "id": transaction.id,
+                "type": transaction.type,
+                "endpoint": transaction.endpoint,
+                "started_at": transaction.started_at,
+                "finished_at": None,
+                "elapsed": None,
+                "tpdex": None,
+                "x_method": None,
+                "x_status_class": None,
+                "x_cached": None,
+                "x_no_cache": False,
+                "tags": None,
+            },
+        )
+        await spill.rotate()
+
+        # the first segment cannot be decoded (unknown type tag, with a valid checksum)
+        broken, valid = spill.segments()
+        broken.write_bytes(MAGIC + struct.pack(">BII", 0, 1, zlib.crc32(b"\xff")) + b"\xff")
+
+        writer = self.create_writer(
+            storage, writers, batch_size=1000, flush_interval=60000, spill=spill, replay_max_attempts=2
+        )
+
+        assert not await writer.replay()
+        assert spill.segments() == [broken, valid]
+        with pytest.raises(NoResultFound):
+            await storage.transactions.find_one_by_id(transaction.id)
+
+        # the second attempt gives up on the broken segment, and the next ones are replayed
+        assert await writer.replay()
+        assert not spill
+        assert broken.with_suffix(".failed").exists()
+        await storage.transactions.find_one_by_id(transaction.id)
+
+    async def test_failing_rows_are_isolated(self, storage: SqlAlchemyStorage, writers):
+        writer = self.create_writer(storage, writers, batch_size=1000, flush_interval=60000)
+
+        # a transaction that was already written cannot be inserted again (primary key violation)
+        duplicate = await self.create_transaction(storage)
+        transactions = [_transaction() for _ in range(4)]
+        writer.add_transaction(transactions[0])
+        writer.add_transaction(transactions[1])
+        writer.add_transaction(
+            TransactionModel(id=duplicate.id, type="http", endpoint="api", started_at=datetime.now(UTC))
+        )
+        for transaction in transactions[2:]:
+            writer.add_transaction(transaction)
+            writer.add_message(
+                transaction,
+                HttpResponse(b"Hello."),
+                BlobModel.from_data(b"", content_type="__headers__"),
+                BlobModel.from_data(b"Hello."),
+            )
+
+        await writer.flush()
+
+        # only the rows of the failing transaction were dropped
+        assert writer.dropped == {"body": 0, "message": 0, "transaction": 1}
+        for transaction in transactions:
+            assert await storage.transactions.find_one_by_id(transaction.id) is not None
+        db_transaction = await storage.transactions.find_one_by_id(transactions[3].id, with_messages=True)
+        (message,) = db_transaction.messages
+        assert (await storage.get_blob(message.body)).data == b"Hello."
+
+    async def _wait_until_written(self, writer):
+        while len(writer) or any(worker.busy for worker in writer.workers):
+            await asyncio.sleep(0.001)
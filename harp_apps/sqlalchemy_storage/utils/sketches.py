@@ -0,0 +1,66 @@
+"""
+Mergeable latency sketches.
+
+A :class:`LatencySketch` is a sparse histogram with logarithmic bins (as in DDSketch), where each bin covers values
+within a fixed relative distance of each other. Any quantile computed from a sketch is within RELATIVE_ACCURACY of the
+exact value, whatever the distribution, and merging two sketches is adding their bin counts, so sketches can be stored
+in the database as (bin, count) rows and merged using ``SUM(count) GROUP BY bin``.
+
+"""
+
+import math
+from typing import Iterable, Mapping, Optional
+
+#: Relative accuracy of quantiles. Changing it changes the meaning of stored bins.
+RELATIVE_ACCURACY = 0.02
+
+#: Smaller values (including zero) are counted as this value.
+MIN_VALUE = 0.01
+
+_GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+
+
+def get_bin(value: float) -> int:
+    """Returns the bin of a value."""
+    return math.ceil(math.log(max(value, MIN_VALUE)) / _LOG_GAMMA)
+
+
+def get_bin_value(index: int) -> float:
+    """Returns the value representing a bin (the one with the same relative distance to the bin bounds)."""
+    return 2 * _GAMMA**index / (_GAMMA + 1)
+
+
+class LatencySketch:
+    def __init__(self, bins: Optional[Mapping[int, int]] = None):
+        #: Number of values, by bin.
+        self.bins: dict[int, int] = dict(bins or {})
+
+    def __len__(self):
+        return sum(self.bins.values())
+
+    def add(self, value: float, count=1):
+        index = get_bin(value)
+        self.bins[index] = self.bins.get(index, 0) + count
+
+    def add_bins(self, bins: Iterable[tuple[int, int]]):
+        """Adds (bin, count) pairs, for example as loaded from the database."""
+        for index, count in bins:
+            self.bins[index] = self.bins.get(index, 0) + count
+
+    def merge(self, other: "LatencySketch"):
+        self.add_bins(other.bins.items())
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Returns the estimated value at quantile `q` (between 0 and 1), or None for an empty sketch."""
+        total = len(self)
+        if not total:
+            return None
+
+        rank = q * (total - 1)
+        seen = 0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                return get_bin_value(index)
+        return get_bin_value(max(self.bins))
@@ -1,6 +1,9 @@
 from operator import itemgetter
+from typing import Optional
 
-from sqlalchemy import text
+from sqlalchemy import insert, inspect, text
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.orm import Session
 
 
 async def run_sql(engine, sql, *, autocommit=True):
@@ -13,6 +16,124 @@ async def run_sql(engine, sql, *, autocommit=True):
     return result
 
 
+async def has_table(conn, name: str) -> bool:
+    """Checks if a table exists, using an async connection or session."""
+
+    def _has_table(sync_conn):
+        if isinstance(sync_conn, Session):
+            sync_conn = sync_conn.connection()
+        return inspect(sync_conn).has_table(name)
+
+    return await conn.run_sync(_has_table)
+
+
+def insert_ignore(table, /, *, dialect_name: str):
+    """
+    Creates a multi-row friendly insert statement that silently skips rows conflicting with existing ones (on primary
+    key or unique constraints), using the dialect specific syntax.
+
+    """
+    if dialect_name == "postgresql":
+        return postgresql.insert(table).on_conflict_do_nothing()
+    if dialect_name == "sqlite":
+        return sqlite.insert(table).on_conflict_do_nothing()
+    if dialect_name == "mysql":
+        return insert(table).prefix_with("IGNORE")
+    raise NotImplementedError(f"Unsupported dialect «{dialect_name}».")
+
+
+def upsert_increment(table, /, *, columns, dialect_name: str):
+    """
+    Creates a multi-row friendly insert statement that, for rows conflicting with existing ones (on primary key), adds
+    the given columns' values to the existing values instead, using the dialect specific syntax.
+
+    """
+    if dialect_name in ("postgresql", "sqlite"):
+        statement = (postgresql if dialect_name == "postgresql" else sqlite).insert(table)
+        return statement.on_conflict_do_update(
+            index_elements=[column.name for column in table.__table__.primary_key],
+            set_={name: getattr(table, name) + statement.excluded[name] for name in columns},
+        )
+    if dialect_name == "mysql":
+        statement = mysql.insert(table)
+        return statement.on_duplicate_key_update(
+            {name: getattr(table, name) + statement.inserted[name] for name in columns}
+        )
+    raise NotImplementedError(f"Unsupported dialect «{dialect_name}».")
+
+
+async def estimate_row_count(conn, table: str, /, *, dialect_name: str) -> Optional[int]:
+    """
+    Estimates the number of rows of a table from the database statistics, without scanning it (live tuples on
+    postgresql, including partitions, ``information_schema`` on mysql, ``sqlite_stat1`` on sqlite once analyzed).
+    Returns None if no estimate is available, so that the caller can count the rows instead.
+
+    """
+    if dialect_name == "postgresql":
+        query = text(
+            "SELECT sum(s.n_live_tup) FROM pg_stat_user_tables s "
+            "WHERE s.relid IN (SELECT relid FROM pg_partition_tree(to_regclass(:table)))"
+        )
+    elif dialect_name == "mysql":
+        query = text(
+            "SELECT table_rows FROM information_schema.tables WHERE table_schema = database() AND table_name = :table"
+        )
+    elif dialect_name == "sqlite":
+        if not await has_table(conn, "sqlite_stat1"):
+            return None
+        # the first number of an index statistics is the number of rows of the table
+        query = text("SELECT stat FROM sqlite_stat1 WHERE tbl = :table ORDER BY idx IS NOT NULL LIMIT 1")
+    else:
+        raise NotImplementedError(f"Unsupported dialect «{dialect_name}».")
+
+    value = (await conn.execute(query.bindparams(table=table))).scalar()
+    if value is None:
+        return None
+    return int(str(value).split(" ", 1)[0])
+
+
+async def estimate_data_size(conn, table: str, column: str, /, *, dialect_name: str) -> Optional[int]:
+    """
+    Estimates the number of bytes used by a table, without scanning it. Space freed by deletes is usually reused by the
+    databases rather than returned to the system, so this is an estimate of the live data:
+
+    - postgresql: live tuples times the average size of `column`, measured on a 1% sample of the table pages (or on
+      the whole table, if the sample is empty),
+    - mysql: data and index length from ``information_schema``,
+    - sqlite: used pages of the whole database file (free pages excluded), the data of all tables being stored in one
+      file.
+
+    """
+    if dialect_name == "postgresql":
+        rows = await estimate_row_count(conn, table, dialect_name=dialect_name)
+        sample, total = (
+            await conn.execute(
+                text(f"SELECT count(*), coalesce(sum(octet_length({column})), 0) FROM {table} TABLESAMPLE SYSTEM (1)")
+            )
+        ).one()
+        if not sample:
+            sample, total = (
+                await conn.execute(text(f"SELECT count(*), coalesce(sum(octet_length({column})), 0) FROM {table}"))
+            ).one()
+            rows = sample
+        return int(total * (rows or 0) / sample) if sample else 0
+
+    if dialect_name == "mysql":
+        query = text(
+            "SELECT data_length + index_length FROM information_schema.tables "
+            "WHERE table_schema = database() AND table_name = :table"
+        ).bindparams(table=table)
+        return int((await conn.execute(query)).scalar() or 0)
+
+    if dialect_name == "sqlite":
+        page_count = (await conn.execute(text("PRAGMA page_count"))).scalar()
+        freelist_count = (await conn.execute(text("PRAGMA freelist_count"))).scalar()
+        page_size = (await conn.execute(text("PRAGMA page_size"))).scalar()
+        return (page_count - freelist_count) * page_size
+
+    raise NotImplementedError(f"Unsupported dialect «{dialect_name}».")
+
+
 _get0 = itemgetter(0)
 
 
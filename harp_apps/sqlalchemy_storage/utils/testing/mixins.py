@@ -78,7 +78,7 @@ class SqlalchemyStorageTestFixtureMixin:
             try:
                 yield storage
             finally:
-                await storage.engine.dispose()
+                await storage.finalize()
 
     async def create_transaction(self, storage: SqlAlchemyStorage, **kwargs):
         return await storage.transactions.create(
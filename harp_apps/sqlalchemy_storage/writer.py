@@ -0,0 +1,701 @@
+import asyncio
+import time
+import zlib
+from datetime import UTC
+from enum import IntEnum
+from typing import Optional
+
+from sqlalchemy import insert, update
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from harp import get_logger
+from harp.http import BaseMessage, get_serializer_for
+from harp.models import Blob as BlobModel
+from harp.models.transactions import Transaction as TransactionModel
+from harp.settings import USE_PROMETHEUS
+from harp.utils.collections import LRUCache
+
+from .blob_backends import DatabaseBlobBackend
+from .compression import BlobCompressor
+from .indexer import BodyIndexer
+from .models import (
+    Blob,
+    BlobsRepository,
+    Message,
+    TagsRepository,
+    TagValuesRepository,
+    Transaction,
+    TransactionRollupsRepository,
+)
+from .models.blobs import count_refs
+from .models.transactions import transaction_tag_values_association_table
+from .spill import SpillLog
+from .utils.sql import insert_ignore
+
+logger = get_logger(__name__)
+
+_prometheus = None
+if USE_PROMETHEUS:
+    from prometheus_client import Counter, Gauge, Histogram
+
+    _prometheus = {
+        "depth": Gauge("storage_writer_queue_depth", "Items waiting to be written to storage."),
+        "lag": Histogram("storage_writer_lag", "Delay between an item being queued and written to storage."),
+        "dropped": Counter("storage_writer_dropped", "Items dropped by the storage writer.", ["kind"]),
+        "spilled": Counter("storage_writer_spilled", "Items written to the spill log by the storage writer."),
+    }
+
+
+def _get_blob_row(blob: BlobModel, endpoint=None):
+    return {
+        "id": blob.id,
+        "data": blob.data,
+        "content_type": blob.content_type,
+        "original_size": blob.original_size,
+        # only used to choose a compression dictionary
+        "endpoint": endpoint,
+    }
+
+
+#: Keys of update rows that are not written, but used to update the rollups.
+_ROLLUP_ONLY_KEYS = ("started_at", "endpoint")
+
+
+def _is_transient(exc: Exception) -> bool:
+    """Tells if a write error is not caused by the written rows (database unavailable, locked ...), so that writing the
+    same rows later may succeed."""
+    if isinstance(exc, DBAPIError) and exc.connection_invalidated:
+        return True
+    return isinstance(exc, (OperationalError, InterfaceError, PoolTimeoutError, OSError, TimeoutError))
+
+
+class Shedding(IntEnum):
+    """What the writer drops, depending on how full its queue is. Each level includes the previous ones."""
+
+    NONE = 0
+    BODIES = 1
+    MESSAGES = 2
+    TRANSACTIONS = 3
+
+
+class WriterBatch:
+    """Rows waiting to be written by the next flush, grouped by table."""
+
+    def __init__(self):
+        self.transactions = {}
+        self.tags = {}
+        self.blobs = {}
+        self.messages = []
+        self.updates = {}
+        self.created_at = None
+
+    def __len__(self):
+        return len(self.transactions) + len(self.blobs) + len(self.messages) + len(self.updates)
+
+    def add(self, kind: str, row: dict) -> int:
+        """Adds a row of the given kind (transaction, blob, message or update), and returns the number of new items
+        (zero if the row was merged into, or already in, the batch)."""
+        if kind == "transaction":
+            row = dict(row)
+            tags = row.pop("tags", None)
+            self.transactions[row["id"]] = row
+            if tags:
+                self.tags[row["id"]] = tags
+            return 1
+
+        if kind == "blob":
+            if row["id"] in self.blobs:
+                return 0
+            self.blobs[row["id"]] = row
+            return 1
+
+        if kind == "message":
+            self.messages.append(row)
+            return 1
+
+        if kind == "update":
+            # if the transaction is not written yet, there is no need for a separate update
+            if row["id"] in self.transactions:
+                self.transactions[row["id"]].update({k: v for k, v in row.items() if k != "id"})
+                return 0
+            self.updates[row["id"]] = row
+            return 1
+
+        raise ValueError(f"Unknown row kind «{kind}».")
+
+    def get_transaction_ids(self) -> set[str]:
+        """Returns the ids of the transactions having rows in this batch."""
+        return set(self.transactions) | {message["transaction_id"] for message in self.messages} | set(self.updates)
+
+    def split(self) -> tuple["WriterBatch", "WriterBatch"]:
+        """Splits this batch in two, by transaction. All the rows of a transaction stay together, with the blobs
+        referenced by its messages (in both halves, if shared)."""
+        transaction_ids = sorted(self.get_transaction_ids())
+        first = set(transaction_ids[: len(transaction_ids) // 2])
+        halves = WriterBatch(), WriterBatch()
+        for half in halves:
+            half.created_at = self.created_at
+
+        for transaction_id, row in self.transactions.items():
+            half = halves[transaction_id not in first]
+            half.transactions[transaction_id] = row
+            if transaction_id in self.tags:
+                half.tags[transaction_id] = self.tags[transaction_id]
+
+        referenced = set()
+        for message in self.messages:
+            half = halves[message["transaction_id"] not in first]
+            half.messages.append(message)
+            for blob_id in (message["headers"], message["body"]):
+                if blob_id in self.blobs:
+                    half.blobs[blob_id] = self.blobs[blob_id]
+                    referenced.add(blob_id)
+
+        for blob_id, row in self.blobs.items():
+            if blob_id not in referenced:
+                halves[0].blobs[blob_id] = row
+
+        for transaction_id, row in self.updates.items():
+            halves[transaction_id not in first].updates[transaction_id] = row
+
+        return halves
+
+    def records(self):
+        """Yields the (kind, row) pairs of this batch, in an order that can be added again to another batch."""
+        for transaction_id, row in self.transactions.items():
+            yield "transaction", {**row, "tags": self.tags.get(transaction_id)}
+        for row in self.blobs.values():
+            yield "blob", row
+        for row in self.messages:
+            yield "message", row
+        for row in self.updates.values():
+            yield "update", row
+
+
+class BatchWriterWorker:
+    """
+    One consumer of a :class:`BatchWriter`. Each worker owns the pending rows of a subset of the transactions, and
+    writes them in order, one batch at a time.
+
+    """
+
+    def __init__(self, writer: "BatchWriter"):
+        self.writer = writer
+        self.batch = WriterBatch()
+
+        self._lock = asyncio.Lock()
+        self._has_pending = asyncio.Event()
+        self._is_full = asyncio.Event()
+        self._task = None
+
+    @property
+    def busy(self):
+        return len(self.batch) > 0 or self._lock.locked()
+
+    def touch(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self())
+        if self.batch.created_at is None:
+            self.batch.created_at = time.monotonic()
+        self._has_pending.set()
+        if len(self.batch) >= self.writer.batch_size:
+            self._is_full.set()
+
+    async def flush(self):
+        """Writes all pending rows. Concurrent flushes are serialized, so once this returns, everything that was added
+        before the call is written (or failed to be)."""
+        async with self._lock:
+            batch, self.batch = self.batch, WriterBatch()
+            self._has_pending.clear()
+            self._is_full.clear()
+
+            if not len(batch):
+                return
+
+            try:
+                await self.writer.write(batch)
+            finally:
+                self.writer.done(batch)
+
+    async def close(self):
+        """Writes the pending rows, and stops the background flushing task."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def __call__(self):
+        while True:
+            await self._has_pending.wait()
+            try:
+                await asyncio.wait_for(self._is_full.wait(), self.writer.flush_interval / 1000)
+            except TimeoutError:
+                pass
+            await self.flush()
+
+
+class BatchWriter:
+    """
+    Collects the rows to write to the database (transactions, messages, blobs and transaction updates), and writes
+    them in batches, using one multi-row statement per table and one database transaction per flush.
+
+    Rows are dispatched between `workers` concurrent workers, by transaction, so that everything related to one
+    transaction is written in order. Each worker flushes once `batch_size` items are pending, or `flush_interval`
+    milliseconds after its first pending item was added, whichever comes first.
+
+    The queue is bounded: once more than `high_water_mark` items are waiting, bodies are dropped (the message is kept,
+    with an empty body that records the original size). Halfway between the high-water mark and `max_queue_size`,
+    messages are dropped too, and past `max_queue_size`, whole transactions.
+
+    With a `spill` log, nothing is dropped while the log has room: past the high-water mark (and when writing a batch
+    fails because the database is unavailable), rows are appended to the log instead, and replayed in the background
+    once the database keeps up again. Batches failing because of some of their rows are split, so that only the rows of
+    the failing transactions are dropped (see `write()`).
+
+    The ids of the last `blob_cache_size` written blobs are remembered, so that frequent identical blobs (common
+    headers, error bodies ...) are not sent to the database over and over.
+
+    """
+
+    def __init__(
+        self,
+        begin,
+        /,
+        *,
+        batch_size=100,
+        flush_interval=50,
+        workers=1,
+        max_queue_size=10000,
+        high_water_mark=5000,
+        max_concurrent_writes=None,
+        blob_cache_size=10000,
+        tags: TagsRepository = None,
+        tag_values: TagValuesRepository = None,
+        blob_backend: DatabaseBlobBackend = None,
+        compressor: BlobCompressor = None,
+        spill: SpillLog = None,
+        replay_interval=5.0,
+        replay_max_attempts=5,
+        indexer: BodyIndexer = None,
+    ):
+        #: Callable returning an async context manager that yields a session within a database transaction.
+        self.begin = begin
+
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue_size = max_queue_size
+        self.high_water_mark = min(high_water_mark, max_queue_size)
+
+        self.workers = [BatchWriterWorker(self) for _ in range(max(workers, 1))]
+
+        # some databases (sqlite) only support one writer at a time, batches are still collected concurrently.
+        self._write_semaphore = asyncio.Semaphore(max_concurrent_writes) if max_concurrent_writes else None
+
+        #: Number of items waiting to be written (pending or being written).
+        self.depth = 0
+
+        #: Delay (in seconds) between the first item of the last written batch being queued, and the batch written.
+        self.lag = 0.0
+
+        #: Number of items dropped, by kind (body, message, transaction).
+        self.dropped = {"body": 0, "message": 0, "transaction": 0}
+
+        #: Tags repositories, used to find or create tag (and tag value) ids, using their in-memory id caches.
+        self.tags = tags or TagsRepository(None)
+        self.tag_values = tag_values or TagValuesRepository(None)
+
+        #: Where blob data goes (database rows, by default).
+        self.blob_backend = blob_backend or DatabaseBlobBackend()
+
+        #: Compression of blob data (none, by default).
+        self.compressor = compressor or BlobCompressor()
+
+        #: Time bucket rollups, incremented in the same database transaction as the rows they are computed from.
+        self.rollups = TransactionRollupsRepository(None)
+
+        #: Blob reference counts are incremented in the same database transaction as the messages referencing them.
+        self.blobs = BlobsRepository(None)
+
+        #: Ids of recently written blobs, that do not need to be written again.
+        self.written_blobs = LRUCache(blob_cache_size)
+
+        #: Optional local log, used to store rows that cannot be written right away.
+        self.spill = spill
+        self.replay_interval = replay_interval
+        self.replay_max_attempts = replay_max_attempts
+
+        #: Number of items written to the spill log.
+        self.spilled = 0
+
+        #: Optional body search indexer, fed with the written blobs.
+        self.indexer = indexer
+
+        # ids of the transactions whose later rows must be dropped (or spilled) too, bounded (forgetting the oldest
+        # ones only means a few more rows written, as their transaction is most probably over).
+        self._dropped_transactions = LRUCache(max_queue_size)
+        self._spilled_transactions = LRUCache(max_queue_size)
+        self._replay_lock = asyncio.Lock()
+        self._replay_failures = {}
+        self._replayer = None
+
+    def __len__(self):
+        return self.depth
+
+    @property
+    def shedding(self) -> Shedding:
+        if self.depth >= self.max_queue_size:
+            return Shedding.TRANSACTIONS
+        if self.depth >= (self.high_water_mark + self.max_queue_size) / 2:
+            return Shedding.MESSAGES
+        if self.depth >= self.high_water_mark:
+            return Shedding.BODIES
+        return Shedding.NONE
+
+    def add_transaction(self, transaction: TransactionModel):
+        row = {
+            "id": transaction.id,
+            "type": transaction.type,
+            "endpoint": transaction.endpoint,
+            "started_at": transaction.started_at,
+            "finished_at": None,
+            "elapsed": None,
+            "tpdex": None,
+            "x_method": transaction.extras.get("method"),
+            "x_status_class": None,
+            "x_cached": None,
+            "x_no_cache": bool(transaction.extras.get("no_cache")),
+            "tags": dict(transaction.tags) if transaction.tags else None,
+        }
+
+        if self._should_spill(transaction.id) and self._spill("transaction", row):
+            # keep track of the spilled transaction, so its messages and updates are spilled too
+            self._spilled_transactions[transaction.id] = True
+            return
+
+        if self.shedding >= Shedding.TRANSACTIONS:
+            # keep track of the dropped transaction, so its messages and updates are dropped too
+            self._dropped_transactions[transaction.id] = True
+            self._drop("transaction")
+            return
+
+        self._add("transaction", transaction.id, row)
+
+    def add_blob(self, blob: BlobModel, /, *, transaction_id=None, endpoint=None):
+        if self.written_blobs.get(blob.id):
+            return
+
+        self._add("blob", transaction_id or blob.id, _get_blob_row(blob, endpoint))
+
+    def add_message(self, transaction: TransactionModel, message: BaseMessage, headers: BlobModel, body: BlobModel):
+        """Adds a message, and its headers and body blobs."""
+        if transaction.id in self._dropped_transactions:
+            self._drop("message")
+            return
+
+        row = {
+            "transaction_id": transaction.id,
+            "kind": message.kind,
+            "summary": get_serializer_for(message).summary,
+            "headers": headers.id,
+            "body": body.id,
+            "created_at": message.created_at.astimezone(UTC),
+        }
+
+        if self._should_spill(transaction.id):
+            for blob in (headers, body):
+                if not self.written_blobs.get(blob.id):
+                    self._spill("blob", _get_blob_row(blob, transaction.endpoint))
+            if not self._spill("message", row):
+                self._drop("message")
+            return
+
+        shedding = self.shedding
+        if shedding >= Shedding.MESSAGES:
+            self._drop("message")
+            return
+
+        if shedding >= Shedding.BODIES and len(body):
+            body = BlobModel.from_data(
+                b"", content_type=body.content_type, original_size=body.original_size or len(body)
+            )
+            row["body"] = body.id
+            self._drop("body")
+
+        self.add_blob(headers, transaction_id=transaction.id, endpoint=transaction.endpoint)
+        self.add_blob(body, transaction_id=transaction.id, endpoint=transaction.endpoint)
+        self._add("message", transaction.id, row)
+
+    def add_transaction_update(self, transaction: TransactionModel):
+        if transaction.id in self._dropped_transactions:
+            self._dropped_transactions.pop(transaction.id, None)
+            return
+
+        row = {
+            "id": transaction.id,
+            "finished_at": transaction.finished_at.astimezone(UTC),
+            "elapsed": transaction.elapsed,
+            "tpdex": transaction.tpdex,
+            "x_status_class": transaction.extras.get("status_class"),
+            "x_cached": transaction.extras.get("cached"),
+            # not updated, only used to find the rollups to update
+            "started_at": transaction.started_at,
+            "endpoint": transaction.endpoint,
+        }
+
+        if self._should_spill(transaction.id):
+            self._spilled_transactions.pop(transaction.id, None)
+            if self._spill("update", row):
+                return
+
+        self._add("update", transaction.id, row)
+
+    async def flush(self):
+        """Writes all pending rows, using all workers concurrently."""
+        await asyncio.gather(*(worker.flush() for worker in self.workers))
+
+    async def wait_until_empty(self):
+        await self.flush()
+
+    async def close(self):
+        """Writes the pending rows, and stops the background flushing (and replaying) tasks. Rows still in the spill
+        log stay there, to be replayed by the next writer using it."""
+        if self._replayer is not None:
+            self._replayer.cancel()
+            try:
+                await self._replayer
+            except asyncio.CancelledError:
+                pass
+            self._replayer = None
+
+        await asyncio.gather(*(worker.close() for worker in self.workers))
+
+        if self.spill is not None:
+            await self.spill.close()
+
+    async def write(self, batch: WriterBatch, /, *, spill=True) -> bool:
+        """
+        Writes a batch to the database, and returns whether it succeeded.
+
+        If writing fails because of some rows (constraint violation, invalid value ...), the batch is split in halves
+        by transaction and each half is written separately, recursively, so that only the rows of the failing
+        transactions are dropped. If it fails otherwise (database unavailable ...), and `spill` is true, the rows are
+        appended to the spill log (if any).
+        """
+        if self._write_semaphore is None:
+            error = await self._write_or_log(batch)
+        else:
+            async with self._write_semaphore:
+                error = await self._write_or_log(batch)
+
+        if error is None:
+            return True
+
+        if not _is_transient(error):
+            if len(batch.get_transaction_ids()) > 1:
+                logger.warning(f"🛢 Error while writing a batch of {len(batch)} items, splitting it: {error}")
+                results = [await self.write(half, spill=spill) for half in batch.split()]
+                return all(results)
+            self._drop_batch(batch, error)
+            return True
+
+        logger.error(f"🛢 Error while writing a batch of {len(batch)} items: {error}", exc_info=error)
+        if spill and self.spill is not None:
+            for kind, row in batch.records():
+                self._spill(kind, row)
+            for transaction_id in batch.transactions:
+                self._spilled_transactions[transaction_id] = True
+
+        return False
+
+    async def replay(self) -> bool:
+        """Writes the spilled rows to the database, oldest first, one segment per database transaction. Stops at the
+        first failure, and returns whether everything was replayed. A segment failing `replay_max_attempts` times in a
+        row is moved aside (see :meth:`SpillLog.quarantine`), so that it does not block the next ones forever."""
+        if self.spill is None:
+            return True
+
+        async with self._replay_lock:
+            await self.spill.rotate()
+            for segment in self.spill.segments():
+                # rows still in memory may be referenced by the spilled ones (or the other way around).
+                await self.flush()
+
+                batch = WriterBatch()
+                try:
+                    for kind, row in await asyncio.to_thread(list, self.spill.read(segment)):
+                        batch.add(kind, row)
+                    replayed = not len(batch) or await self.write(batch, spill=False)
+                except Exception as exc:
+                    logger.error(f"🛢 Error while replaying spill segment {segment.name}: {exc}", exc_info=exc)
+                    replayed = False
+
+                if not replayed:
+                    attempts = self._replay_failures.pop(segment.name, 0) + 1
+                    if attempts < self.replay_max_attempts:
+                        self._replay_failures[segment.name] = attempts
+                        return False
+                    target = self.spill.quarantine(segment)
+                    logger.error(
+                        f"🛢 Could not replay spill segment {segment.name} after {attempts} attempts, moved to "
+                        f"{target.name}."
+                    )
+                    continue
+
+                self._replay_failures.pop(segment.name, None)
+                self.spill.remove(segment)
+                logger.info(f"🛢 Replayed {len(batch)} spilled items ({segment.name}).")
+
+        return True
+
+    def start_replayer(self):
+        """Starts the background task replaying the spill log (if any) when the database keeps up."""
+        if self.spill is not None and self._replayer is None:
+            self._replayer = asyncio.create_task(self._replay_forever())
+
+    async def _replay_forever(self):
+        while True:
+            await asyncio.sleep(self.replay_interval)
+            if self.spill and self.depth < self.high_water_mark:
+                try:
+                    await self.replay()
+                except Exception as exc:
+                    logger.exception(f"Error while replaying the spill log: {exc}")
+
+    async def _write_or_log(self, batch: WriterBatch) -> Optional[Exception]:
+        """Writes a batch in one database transaction, and returns the error if it failed."""
+        try:
+            async with self.begin() as session:
+                await self._write(session, batch)
+        except Exception as exc:
+            # tags (or compression dictionaries) created in the rolled back transaction may have been cached
+            self.tags.ids.clear()
+            self.tag_values.ids.clear()
+            self.compressor.forget()
+            return exc
+
+        for blob_id in batch.blobs:
+            self.written_blobs[blob_id] = True
+        if self.indexer is not None:
+            self.indexer.add_many(batch.blobs.values())
+        return None
+
+    def _drop_batch(self, batch: WriterBatch, error: Exception):
+        """Drops the rows of a batch that cannot be written (they would fail again)."""
+        transaction_ids = ", ".join(sorted(batch.get_transaction_ids())) or "none"
+        logger.error(f"🛢 Dropped {len(batch)} items that cannot be written (transactions: {transaction_ids}): {error}")
+        for kind, row in batch.records():
+            if kind in self.dropped:
+                self._drop(kind)
+
+    def done(self, batch: WriterBatch):
+        """Accounts for a batch that went through (successfully or not)."""
+        self.depth -= len(batch)
+        self.lag = time.monotonic() - batch.created_at if batch.created_at else 0.0
+
+        if _prometheus:
+            _prometheus["depth"].set(self.depth)
+            _prometheus["lag"].observe(self.lag)
+
+    def _get_worker(self, key: str) -> BatchWriterWorker:
+        if len(self.workers) == 1:
+            return self.workers[0]
+        return self.workers[zlib.crc32(key.encode()) % len(self.workers)]
+
+    def _add(self, kind: str, transaction_id: str, row: dict):
+        worker = self._get_worker(transaction_id)
+        count = worker.batch.add(kind, row)
+        if count:
+            self._queued(worker, count)
+
+    def _should_spill(self, transaction_id: str) -> bool:
+        if self.spill is None:
+            return False
+        return transaction_id in self._spilled_transactions or (
+            self.depth >= self.high_water_mark and not self.spill.full
+        )
+
+    def _spill(self, kind: str, row: dict) -> bool:
+        if not self.spill.append(kind, row):
+            return False
+
+        self.spilled += 1
+        self.start_replayer()
+
+        if _prometheus:
+            _prometheus["spilled"].inc()
+        return True
+
+    def _queued(self, worker: BatchWriterWorker, count: int):
+        self.depth += count
+        worker.touch()
+
+        if _prometheus:
+            _prometheus["depth"].set(self.depth)
+
+    def _drop(self, kind):
+        self.dropped[kind] += 1
+
+        if _prometheus:
+            _prometheus["dropped"].labels(kind).inc()
+
+    async def _write(self, session, batch: WriterBatch):
+        # order matters, messages reference transactions.
+        if batch.transactions:
+            await session.execute(insert(Transaction), list(batch.transactions.values()))
+
+        if batch.tags:
+            await self._write_tags(
+                session,
+                batch.tags,
+                started_at={
+                    transaction_id: batch.transactions[transaction_id]["started_at"] for transaction_id in batch.tags
+                },
+            )
+
+        if batch.blobs:
+            # blobs are content-addressed, an existing row with the same id is the same blob.
+            rows = await self.compressor.compress_rows(session, batch.blobs.values())
+            rows = await self.blob_backend.put_many(rows)
+            await session.execute(insert_ignore(Blob, dialect_name=session.bind.dialect.name), rows)
+
+        if batch.messages:
+            await session.execute(insert(Message), batch.messages)
+
+        if batch.updates:
+            await session.execute(
+                update(Transaction),
+                [{k: v for k, v in row.items() if k not in _ROLLUP_ONLY_KEYS} for row in batch.updates.values()],
+            )
+
+        if batch.transactions or batch.updates:
+            await self.rollups.add(batch.transactions.values(), batch.updates.values(), session=session)
+
+        # blob reference counts are updated last, as the rows of frequent blobs are locked until the commit
+        refs = count_refs((message["headers"], message["body"]) for message in batch.messages)
+        if refs:
+            await session.execute(self.blobs.update_refs(), refs)
+
+    async def _write_tags(self, session, tags_by_transaction: dict[str, dict], *, started_at: dict):
+        names = {name for tags in tags_by_transaction.values() for name in tags}
+        tag_ids = await self.tags.find_or_create_ids(names, session=session)
+
+        pairs = {(tag_ids[name], value) for tags in tags_by_transaction.values() for name, value in tags.items()}
+        value_ids = await self.tag_values.find_or_create_ids(pairs, session=session)
+
+        await session.execute(
+            insert(transaction_tag_values_association_table),
+            [
+                {
+                    "transaction_id": transaction_id,
+                    "value_id": value_ids[(tag_ids[name], value)],
+                    "started_at": started_at[transaction_id],
+                }
+                for transaction_id, tags in tags_by_transaction.items()
+                for name, value in tags.items()
+            ],
+        )
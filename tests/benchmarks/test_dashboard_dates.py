@@ -0,0 +1,24 @@
+from datetime import UTC, datetime, timedelta
+
+import pytest
+
+from harp_apps.dashboard.utils.dates import generate_continuous_time_range
+
+BUCKETS = 500_000
+
+
+@pytest.mark.benchmark(group="dashboard")
+@pytest.mark.parametrize("buckets", [BUCKETS // 100, BUCKETS])
+def test_generate_continuous_time_range(benchmark, buckets):
+    """Filling gaps must be linear in the number of buckets (time per bucket should be flat between both sizes)."""
+    start_datetime = datetime.now(UTC).replace(second=0, microsecond=0) - timedelta(minutes=buckets - 1)
+    # one data point every ten buckets
+    discontinuous_transactions = [
+        {"datetime": start_datetime + timedelta(minutes=i), "count": 1, "errors": 0, "meanDuration": 1.0}
+        for i in range(0, buckets, 10)
+    ]
+
+    result = benchmark(generate_continuous_time_range, discontinuous_transactions, start_datetime, "minute")
+
+    assert len(result) in (buckets, buckets + 1)
+    assert result[0]["count"] == 1 and result[1]["count"] is None
@@ -48,7 +48,14 @@ async def test_api(event_loop):
         loop=event_loop,
     )
     # wait for the server to be accepting connections
-    await asyncio.open_connection(host, port)
+    for _ in range(100):
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+        except OSError:
+            await asyncio.sleep(0.05)
+        else:
+            writer.close()
+            break
 
     try:
         yield StubServerDescription(host, port)